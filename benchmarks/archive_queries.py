@@ -0,0 +1,187 @@
+#!/usr/bin/env python
+"""
+Archive search benchmark
+
+Fills a temporary database with a synthetic archive (100k recordings by
+default, spread over ten years with names, templates, states, durations,
+channel counts and channel files), then times the recordings list with
+the archive filters and the ``stats`` endpoint through the API. Every
+query runs with the archive indexes of ``Recording`` and again after
+dropping them, so the report shows what the indexes buy; the SQLite query
+plan of each filter is included.
+
+    python benchmarks/archive_queries.py --recordings 100000 --repeat 20 --output archive.json
+"""
+import argparse
+import datetime
+import json
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+DJANGO_DIR = PROJECT_ROOT / "x32recorder"
+
+NAMES = ["Gottesdienst", "Ostern", "Karfreitag", "Pfingsten", "Weihnachten", "Probe", "Konzert", "Jugendgottesdienst"]
+BATCH = 5000
+
+QUERIES = {
+    'page': {},
+    'name_substring': {'name': 'ostern'},
+    'name_prefix': {'name_prefix': 'ostern'},
+    'date_range': {'date_from': '2024-03-01', 'date_to': '2024-04-30'},
+    'state': {'state': '0,1,2'},
+    'template': {'template': '3'},
+    'duration': {'min_duration': 5400},
+    'channels': {'min_channels': 30},
+    'combined': {'name_prefix': 'ostern', 'date_from': '2020-01-01', 'min_channels': 16},
+    'order_by_duration': {'ordering': '-duration'},
+    'stats': {},
+    'stats_filtered': {'date_from': '2024-01-01', 'date_to': '2024-12-31'},
+}
+
+
+def populate(count, seed):
+    from recorder.models import Recording, RecordingFile, RecordingTemplate
+
+    rng = random.Random(seed)
+    # Keep the synthetic dates instead of stamping every row with now
+    Recording._meta.get_field('date').auto_now_add = False
+    templates = [RecordingTemplate.objects.create(name=f"Template {n}", channel_count=16) for n in range(1, 6)]
+    now = datetime.datetime(2026, 1, 1, tzinfo=datetime.timezone.utc)
+    span = datetime.timedelta(days=3650).total_seconds()
+    for start in range(0, count, BATCH):
+        recordings = []
+        for n in range(start, min(start + BATCH, count)):
+            channels = list(range(rng.choice([2, 8, 16, 24, 32])))
+            recordings.append(Recording(
+                name=f"{rng.choice(NAMES)} {n}",
+                date=now - datetime.timedelta(seconds=rng.uniform(0, span)),
+                channels=channels,
+                channel_count=len(channels),
+                duration=datetime.timedelta(seconds=rng.uniform(600, 3 * 3600)),
+                # Almost all recordings are finished; a few are in progress
+                state=Recording.STOPPED if n % 1000 else Recording.RECORD,
+                template=rng.choice(templates + [None]),
+            ))
+        Recording.objects.bulk_create(recordings)
+    files = []
+    for recording_id, duration, channel_count in Recording.objects.values_list('pk', 'duration', 'channel_count'):
+        frames = int(duration.total_seconds() * 48000)
+        for channel in range(1, min(channel_count, 2) + 1):
+            files.append(RecordingFile(
+                recording_id=recording_id, channel_no=channel, filename=f"ch{channel:02d}.wav",
+                size=frames * 3 + 44, frames=frames, duration=duration, sample_rate=48000, sample_width=3,
+            ))
+            if len(files) >= BATCH:
+                RecordingFile.objects.bulk_create(files)
+                files = []
+    RecordingFile.objects.bulk_create(files)
+
+
+def timed(client, params, repeat):
+    url = '/api/recordings/stats/' if 'stats' in params['_name'] else '/api/recordings/'
+    query = {key: value for key, value in params.items() if key != '_name'}
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        response = client.get(url, query)
+        times.append(1000 * (time.perf_counter() - started))
+        assert response.status_code == 200, response.content[:200]
+    data = response.json()
+    times.sort()
+    return {
+        'p50_ms': statistics.median(times),
+        'max_ms': times[-1],
+        'results': data['count'] if 'count' in data else data['recordings'],
+    }
+
+
+def query_plan(params):
+    from django.db import connection
+    from recorder.models import Recording
+    from recorder.search import filter_recordings
+
+    queryset = filter_recordings(Recording.objects.all(), params)
+    sql, sql_params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f"EXPLAIN QUERY PLAN {sql}", sql_params)
+        return [row[-1] for row in cursor.fetchall()]
+
+
+def run_all(client, repeat, plans):
+    results = {}
+    for name, params in QUERIES.items():
+        results[name] = timed(client, dict(params, _name=name), repeat)
+        if plans and 'stats' not in name:
+            results[name]['plan'] = query_plan(params)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time archive search and statistics queries")
+    parser.add_argument('--recordings', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=10, help="Requests per query")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help="Write the JSON report to this file instead of stdout")
+    args = parser.parse_args()
+
+    workdir = Path(tempfile.mkdtemp(prefix="x32-archive-"))
+    os.environ['X32RECORDER_DB'] = str(workdir / "db.sqlite3")
+    os.environ['X32RECORDER_RECORDING_PATH'] = str(workdir / "recordings")
+    os.chdir(DJANGO_DIR)
+    sys.path.insert(0, str(DJANGO_DIR))
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'x32recorder.settings')
+
+    try:
+        import django
+        django.setup()
+        from django.core.management import call_command
+        from django.db import connection
+        from django.test import Client
+        from recorder.models import Recording
+
+        call_command('migrate', verbosity=0)
+        started = time.perf_counter()
+        populate(args.recordings, args.seed)
+        populate_seconds = time.perf_counter() - started
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+
+        client = Client()
+        indexed = run_all(client, args.repeat, plans=True)
+        with connection.schema_editor() as schema_editor:
+            for index in Recording._meta.indexes:
+                schema_editor.remove_index(Recording, index)
+        unindexed = run_all(client, args.repeat, plans=False)
+
+        report = {
+            'recordings': args.recordings,
+            'populate_seconds': populate_seconds,
+            'queries': {
+                name: {
+                    'params': QUERIES[name],
+                    'indexed': indexed[name],
+                    'unindexed': unindexed[name],
+                    'speedup': unindexed[name]['p50_ms'] / indexed[name]['p50_ms'],
+                }
+                for name in QUERIES
+            },
+        }
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(output)
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
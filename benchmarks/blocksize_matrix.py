@@ -0,0 +1,190 @@
+#!/usr/bin/env python
+"""
+Block size x channel count benchmark for the capture path
+
+Records with the controller's MultiChannelRecorder once for every
+combination of block size and channel count and measures, per run, the
+time spent in the capture callback, the share of real time it takes
+(capture load), the process CPU usage and how often callbacks arrive late.
+A callback taking longer than its block period, or arriving more than one
+period late, is where a real interface overflows its input buffer; the
+late fraction is reported as an estimate of that probability next to the
+overflows the backend reports itself and the blocks the writers dropped.
+
+For each channel count the smallest block size without overflows or
+dropped blocks, with a p99.9 callback duration below half the block
+period and less than 0.1 % late callbacks is recommended. The report is
+JSON.
+
+The fake backend is used by default. Pass ``--backend sounddevice
+--device N`` to measure a real interface.
+
+    python benchmarks/blocksize_matrix.py --block-sizes 128 256 512 1024 --channels 8 16 32 --duration 10
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+DJANGO_DIR = PROJECT_ROOT / "x32recorder"
+
+# Thresholds for a block size to count as safe
+MAX_DURATION_SHARE = 0.5
+MAX_LATE_FRACTION = 0.001
+
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile of an already sorted list"""
+    index = max(0, int(round(p / 100 * len(sorted_values))) - 1)
+    return sorted_values[min(index, len(sorted_values) - 1)]
+
+
+def summarize(values_ms):
+    values = sorted(values_ms)
+    if not values:
+        return {}
+    return {
+        'p50': percentile(values, 50),
+        'p99': percentile(values, 99),
+        'p999': percentile(values, 99.9),
+        'max': values[-1],
+    }
+
+
+def run(controller, args, block_size, channels):
+    from recorder.models import Recording
+
+    max_calls = int(args.duration * args.sample_rate / block_size * 2) + 100
+    arrivals = [0.0] * max_calls
+    durations = [0.0] * max_calls
+    calls = [0]
+
+    class TimedRecorder(controller.MultiChannelRecorder):
+        def _capture_block(self, indata):
+            started = time.perf_counter()
+            super()._capture_block(indata)
+            n = calls[0]
+            if n < max_calls:
+                arrivals[n] = started
+                durations[n] = time.perf_counter() - started
+                calls[0] = n + 1
+
+    recording = Recording.objects.create(
+        channels=list(range(channels)),
+        audiodevice_index=args.device,
+        sample_rate=args.sample_rate,
+        block_size=block_size,
+        latency=args.latency,
+        state=Recording.NEW,
+    )
+    recorder = TimedRecorder(sample_rate=recording.sample_rate, recording_path=controller.RECORDING_PATH)
+    recorder.channels = recording.channels
+    recorder.audiodevice_index = recording.audiodevice_index
+    recorder.block_size = recording.block_size
+    recorder.latency = recording.latency
+
+    cpu_started = time.process_time()
+    wall_started = time.monotonic()
+    recorder.start_recording(recording.uuid)
+    time.sleep(args.duration)
+    recorder.stop_recording()
+    wall = time.monotonic() - wall_started
+    cpu = time.process_time() - cpu_started
+
+    n = calls[0]
+    period = block_size / args.sample_rate
+    # Skip the first callbacks: stream start-up
+    skip = min(10, n)
+    intervals = [arrivals[i] - arrivals[i - 1] for i in range(skip + 1, n)]
+    measured = durations[skip:n]
+    duration_ms = summarize([1000 * d for d in measured])
+    late = sum(1 for interval in intervals if interval > 2 * period)
+    late_fraction = late / len(intervals) if intervals else 0.0
+    dropped_blocks = sum(target.dropped_blocks for target in recorder.targets)
+    safe = (
+        recorder.input_overflows == 0
+        and dropped_blocks == 0
+        and bool(duration_ms)
+        and duration_ms['p999'] < 1000 * period * MAX_DURATION_SHARE
+        and late_fraction < MAX_LATE_FRACTION
+    )
+    return {
+        'block_size': block_size,
+        'channels': channels,
+        'period_ms': 1000 * period,
+        'callbacks': n,
+        'callback_duration_ms': duration_ms,
+        'capture_load': sum(measured) / wall if wall else 0.0,
+        'process_cpu_percent': 100 * cpu / wall if wall else 0.0,
+        'late_callbacks': late,
+        'overflow_probability': late_fraction,
+        'input_overflows': recorder.input_overflows,
+        'dropped_blocks': dropped_blocks,
+        'safe': safe,
+    }
+
+
+def recommend(runs, channel_counts):
+    """Smallest safe block size per channel count, ``None`` if none was safe"""
+    recommended = {}
+    for channels in channel_counts:
+        safe = [run['block_size'] for run in runs if run['channels'] == channels and run['safe']]
+        recommended[str(channels)] = min(safe) if safe else None
+    return recommended
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the capture path over block sizes and channel counts")
+    parser.add_argument('--block-sizes', type=int, nargs='+', default=[128, 256, 512, 1024, 2048])
+    parser.add_argument('--channels', type=int, nargs='+', default=[8, 16, 32], help="Channel counts to record")
+    parser.add_argument('--duration', type=float, default=10, help="Seconds per run")
+    parser.add_argument('--sample-rate', type=int, default=48000)
+    parser.add_argument('--latency', type=float, help="PortAudio input latency in seconds (default: device default)")
+    parser.add_argument('--backend', default='fake', help="fake or sounddevice")
+    parser.add_argument('--device', type=int, default=0, help="Input device index")
+    parser.add_argument('--output', help="Write the JSON report to this file instead of stdout")
+    args = parser.parse_args()
+
+    workdir = Path(tempfile.mkdtemp(prefix="x32-blocksize-"))
+    os.environ['X32RECORDER_DB'] = str(workdir / "db.sqlite3")
+    os.environ['X32RECORDER_RECORDING_PATH'] = str(workdir / "recordings")
+    os.environ['X32RECORDER_AUDIO_BACKEND'] = args.backend
+    os.chdir(DJANGO_DIR)
+    sys.path.insert(0, str(DJANGO_DIR))
+
+    try:
+        import controller
+        from django.core.management import call_command
+
+        call_command('migrate', verbosity=0)
+        runs = []
+        for channels in args.channels:
+            for block_size in sorted(args.block_sizes):
+                runs.append(run(controller, args, block_size, channels))
+                # Finished recordings are not needed; keep the disk footprint flat
+                shutil.rmtree(controller.RECORDING_PATH, ignore_errors=True)
+        report = {
+            'backend': args.backend,
+            'sample_rate': args.sample_rate,
+            'latency': args.latency,
+            'duration': args.duration,
+            'runs': runs,
+            'recommended_block_size': recommend(runs, args.channels),
+        }
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(output)
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
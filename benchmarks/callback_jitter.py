@@ -0,0 +1,185 @@
+#!/usr/bin/env python
+"""
+Audio callback jitter benchmark for the controller
+
+Records with the controller's MultiChannelRecorder twice - once normally
+and once in realtime hardened mode (REALTIME_HARDENED) - while background
+threads produce the kind of load the controller sees in practice: ORM
+polling, cyclic garbage and CPU-bound Python work. For every capture
+callback the arrival time and the time spent in the capture path are
+recorded; the report compares interval jitter (deviation from the nominal
+block period) and callback duration percentiles of both runs as JSON.
+
+The fake backend is used by default. Pass ``--backend sounddevice
+--device N`` to measure a real interface.
+
+    python benchmarks/callback_jitter.py --duration 30 --capture-cpus 2 --writer-cpus 3
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+DJANGO_DIR = PROJECT_ROOT / "x32recorder"
+
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile of an already sorted list"""
+    index = max(0, int(round(p / 100 * len(sorted_values))) - 1)
+    return sorted_values[min(index, len(sorted_values) - 1)]
+
+
+def summarize(values_ms):
+    values = sorted(values_ms)
+    if not values:
+        return {}
+    return {
+        'p50': percentile(values, 50),
+        'p90': percentile(values, 90),
+        'p99': percentile(values, 99),
+        'p999': percentile(values, 99.9),
+        'max': values[-1],
+    }
+
+
+def background_load(stop_event, Recording, cpu_threads):
+    """Start threads that stress the GIL, the allocator and the cyclic GC"""
+
+    def garbage():
+        while not stop_event.is_set():
+            for _ in range(2000):
+                node = {'payload': list(range(20))}
+                node['self'] = node
+            Recording.objects.count()
+            time.sleep(0.001)
+
+    def spin():
+        while not stop_event.is_set():
+            sum(i * i for i in range(20000))
+
+    threads = [threading.Thread(target=garbage, daemon=True)]
+    threads += [threading.Thread(target=spin, daemon=True) for _ in range(cpu_threads)]
+    for thread in threads:
+        thread.start()
+    return threads
+
+
+def run(controller, args, hardened):
+    from django.conf import settings
+    from recorder.models import Recording
+
+    settings.REALTIME_HARDENED = hardened
+    settings.REALTIME_CAPTURE_CPUS = args.capture_cpus
+    settings.REALTIME_WRITER_CPUS = args.writer_cpus
+
+    max_calls = int(args.duration * args.sample_rate / args.block_size * 2) + 100
+    arrivals = [0.0] * max_calls
+    durations = [0.0] * max_calls
+    calls = [0]
+
+    class TimedRecorder(controller.MultiChannelRecorder):
+        def _capture_block(self, indata):
+            started = time.perf_counter()
+            super()._capture_block(indata)
+            n = calls[0]
+            if n < max_calls:
+                arrivals[n] = started
+                durations[n] = time.perf_counter() - started
+                calls[0] = n + 1
+
+    recording = Recording.objects.create(
+        channels=list(range(args.channels)),
+        audiodevice_index=args.device,
+        sample_rate=args.sample_rate,
+        block_size=args.block_size,
+        state=Recording.NEW,
+    )
+    recorder = TimedRecorder(sample_rate=args.sample_rate, recording_path=controller.RECORDING_PATH)
+    recorder.channels = recording.channels
+    recorder.audiodevice_index = recording.audiodevice_index
+    recorder.block_size = recording.block_size
+
+    stop_event = threading.Event()
+    load = background_load(stop_event, Recording, args.cpu_threads)
+    recorder.start_recording(recording.uuid)
+    deadline = time.monotonic() + args.duration
+    while time.monotonic() < deadline:
+        time.sleep(1)
+        if recorder.hardened:
+            controller.realtime.collect_young()
+    recorder.stop_recording()
+    stop_event.set()
+    for thread in load:
+        thread.join()
+
+    n = calls[0]
+    period = args.block_size / args.sample_rate
+    # Skip the first callbacks: stream start-up and thread tuning
+    skip = min(10, n)
+    intervals = [arrivals[i] - arrivals[i - 1] for i in range(skip + 1, n)]
+    jitter_ms = [1000 * abs(interval - period) for interval in intervals]
+    return {
+        'hardened': hardened,
+        'callbacks': n,
+        'late_callbacks': sum(1 for interval in intervals if interval > 2 * period),
+        'ring_overflows': sum(target.dropped_blocks for target in recorder.targets),
+        'capture_thread': recorder.capture_thread_report if hardened else None,
+        'interval_jitter_ms': summarize(jitter_ms),
+        'callback_duration_ms': summarize([1000 * d for d in durations[skip:n]]),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure capture callback jitter with and without realtime hardening")
+    parser.add_argument('--duration', type=float, default=20, help="Seconds per run")
+    parser.add_argument('--channels', type=int, default=32, help="Channels to record")
+    parser.add_argument('--sample-rate', type=int, default=48000)
+    parser.add_argument('--block-size', type=int, default=1024, help="Frames per capture callback")
+    parser.add_argument('--backend', default='fake', help="fake or sounddevice")
+    parser.add_argument('--device', type=int, default=0, help="Input device index")
+    parser.add_argument('--capture-cpus', type=int, nargs='*', help="CPUs for the capture thread")
+    parser.add_argument('--writer-cpus', type=int, nargs='*', help="CPUs for the writer thread")
+    parser.add_argument('--cpu-threads', type=int, default=2, help="CPU-bound background threads")
+    parser.add_argument('--only', choices=['off', 'on'], help="Run only one mode")
+    parser.add_argument('--output', help="Write the JSON report to this file instead of stdout")
+    args = parser.parse_args()
+
+    workdir = Path(tempfile.mkdtemp(prefix="x32-jitter-"))
+    os.environ['X32RECORDER_DB'] = str(workdir / "db.sqlite3")
+    os.environ['X32RECORDER_RECORDING_PATH'] = str(workdir / "recordings")
+    os.environ['X32RECORDER_AUDIO_BACKEND'] = args.backend
+    os.chdir(DJANGO_DIR)
+    sys.path.insert(0, str(DJANGO_DIR))
+
+    try:
+        import controller
+        from django.core.management import call_command
+
+        call_command('migrate', verbosity=0)
+        modes = [args.only == 'on'] if args.only else [False, True]
+        report = {
+            'backend': args.backend,
+            'channels': args.channels,
+            'block_size': args.block_size,
+            'duration': args.duration,
+            'period_ms': 1000 * args.block_size / args.sample_rate,
+            'runs': [run(controller, args, hardened) for hardened in modes],
+        }
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(output)
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
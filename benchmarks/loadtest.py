@@ -0,0 +1,295 @@
+#!/usr/bin/env python
+"""
+API load test for X32 Recorder
+
+Starts the real waitress app (x32recorder.wsgi:application) and the
+controller against a temporary database with the fake audio backend, then
+simulates many web clients:
+
+- every client polls the recordings list like the web app (default every 2 s)
+  and now and then downloads a finished recording
+- one operator client starts takes, sets markers and stops them again
+
+Throughput, latency percentiles and error rates per endpoint are printed
+as JSON, so runs against different revisions can be compared.
+
+    python benchmarks/loadtest.py --clients 50 --duration 120 --output before.json
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+DJANGO_DIR = PROJECT_ROOT / "x32recorder"
+
+
+class Stats:
+    """Thread-safe latency and error bookkeeping per endpoint"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = {}
+        self.errors = {}
+
+    def record(self, endpoint, latency, ok):
+        with self.lock:
+            self.latencies.setdefault(endpoint, []).append(latency)
+            if not ok:
+                self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+
+    def report(self, elapsed):
+        endpoints = {}
+        for endpoint, latencies in sorted(self.latencies.items()):
+            latencies = sorted(latencies)
+            errors = self.errors.get(endpoint, 0)
+            endpoints[endpoint] = {
+                'requests': len(latencies),
+                'errors': errors,
+                'error_rate': errors / len(latencies),
+                'throughput_rps': len(latencies) / elapsed,
+                'latency_ms': {
+                    'mean': 1000 * sum(latencies) / len(latencies),
+                    'p50': 1000 * percentile(latencies, 50),
+                    'p90': 1000 * percentile(latencies, 90),
+                    'p95': 1000 * percentile(latencies, 95),
+                    'p99': 1000 * percentile(latencies, 99),
+                    'max': 1000 * latencies[-1],
+                },
+            }
+        return endpoints
+
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile of an already sorted list"""
+    index = max(0, int(round(p / 100 * len(sorted_values))) - 1)
+    return sorted_values[min(index, len(sorted_values) - 1)]
+
+
+class Client:
+    """One browser tab: a keep-alive connection issuing timed requests"""
+
+    def __init__(self, port, stats):
+        self.port = port
+        self.stats = stats
+        self.connection = None
+
+    def request(self, endpoint, method, path, body=None):
+        if self.connection is None:
+            self.connection = http.client.HTTPConnection("127.0.0.1", self.port, timeout=60)
+
+        headers = {'Content-Type': 'application/json'} if body is not None else {}
+        payload = json.dumps(body) if body is not None else None
+        start = time.perf_counter()
+        try:
+            self.connection.request(method, path, body=payload, headers=headers)
+            response = self.connection.getresponse()
+            data = response.read()
+            ok = response.status < 500
+            status = response.status
+        except (OSError, http.client.HTTPException):
+            self.connection.close()
+            self.connection = None
+            data, ok, status = b'', False, None
+        self.stats.record(endpoint, time.perf_counter() - start, ok)
+        return status, data
+
+
+def poller(port, stats, stop_event, args):
+    """List polling client that occasionally downloads a stopped recording"""
+    client = Client(port, stats)
+    stop_event.wait(random.uniform(0, args.poll_interval))
+    next_download = time.monotonic() + random.expovariate(1 / args.download_interval)
+
+    while not stop_event.is_set():
+        status, data = client.request('recordings-list', 'GET', '/api/recordings/')
+
+        if time.monotonic() >= next_download and status == 200:
+            stopped = [r for r in json.loads(data)['results'] if r['state'] == 3 and r['files']]
+            if stopped:
+                recording = random.choice(stopped)
+                client.request('recordings-download', 'GET', f"/api/recordings/{recording['id']}/download/")
+            next_download = time.monotonic() + random.expovariate(1 / args.download_interval)
+
+        stop_event.wait(args.poll_interval)
+
+
+def operator(port, stats, stop_event, args):
+    """Starts a take, sets markers, stops it and waits for the controller"""
+    client = Client(port, stats)
+    channels = list(range(1, args.channels + 1))
+
+    while not stop_event.is_set():
+        status, data = client.request('recordings-start', 'POST', '/api/recordings/start/', {
+            'name': 'loadtest', 'channels': channels, 'audiodevice_index': 0,
+        })
+        if status != 201:
+            stop_event.wait(1)
+            continue
+        recording_id = json.loads(data)['id']
+
+        take_end = time.monotonic() + args.take_length
+        while not stop_event.is_set() and time.monotonic() < take_end:
+            stop_event.wait(args.marker_interval)
+            client.request('recordings-set_marker', 'POST', f'/api/recordings/{recording_id}/set_marker/', {})
+
+        client.request('recordings-stop', 'POST', f'/api/recordings/{recording_id}/stop/', {})
+
+        # The controller finalizes files on its own schedule; wait for it
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            status, data = client.request('recordings-retrieve', 'GET', f'/api/recordings/{recording_id}/')
+            if status == 200 and json.loads(data)['state'] == 3:
+                break
+            time.sleep(0.5)
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_for_server(port, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            connection = http.client.HTTPConnection("127.0.0.1", port, timeout=2)
+            connection.request('GET', '/api/')
+            if connection.getresponse().status == 200:
+                return True
+        except OSError:
+            pass
+        time.sleep(0.2)
+    return False
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=PROJECT_ROOT,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the X32 Recorder API with simulated clients")
+    parser.add_argument('--clients', type=int, default=20, help="Number of polling clients")
+    parser.add_argument('--duration', type=float, default=60, help="Test duration in seconds")
+    parser.add_argument('--poll-interval', type=float, default=2.0, help="List polling interval per client")
+    parser.add_argument('--download-interval', type=float, default=60.0,
+                        help="Mean seconds between downloads per client")
+    parser.add_argument('--take-length', type=float, default=15.0, help="Length of each operator take")
+    parser.add_argument('--marker-interval', type=float, default=5.0, help="Seconds between markers")
+    parser.add_argument('--channels', type=int, default=2, help="Channels per take")
+    parser.add_argument('--threads', type=int, default=6, help="Waitress worker threads")
+    parser.add_argument('--no-operator', action='store_true', help="Only poll, never start recordings")
+    parser.add_argument('--output', help="Write the JSON report to this file instead of stdout")
+    args = parser.parse_args()
+
+    workdir = Path(tempfile.mkdtemp(prefix="x32recorder-loadtest-"))
+    port = free_port()
+    env = dict(
+        os.environ,
+        X32RECORDER_DB=str(workdir / "db.sqlite3"),
+        X32RECORDER_RECORDING_PATH=str(workdir / "recordings"),
+        X32RECORDER_ARCHIVE_CACHE_PATH=str(workdir / "archive-cache"),
+        X32RECORDER_ARCHIVE_PATH=str(workdir / "archive"),
+        X32RECORDER_REHYDRATE_CACHE_PATH=str(workdir / "rehydrate-cache"),
+        X32RECORDER_LOG_DIR=str(workdir / "logs"),
+        X32RECORDER_READY_FILE=str(workdir / "controller.ready"),
+        X32RECORDER_AUDIO_BACKEND="fake",
+        # Keep clear of the ports and second copies of a controller running on this machine
+        X32RECORDER_CONTROLLER_METRICS_PORT="0",
+        X32RECORDER_OSC="0",
+        X32RECORDER_LISTEN="0",
+        X32RECORDER_MIRROR_PATH="",
+        X32RECORDER_REPLICATE_TO="",
+        X32RECORDER_REPLICATION_LISTEN="",
+        PYTHONUNBUFFERED="1",
+    )
+    processes = []
+
+    try:
+        subprocess.run([sys.executable, "manage.py", "migrate", "--noinput"],
+                       cwd=DJANGO_DIR, env=env, check=True, stdout=subprocess.DEVNULL)
+
+        log = open(workdir / "server.log", "w")
+        processes.append(subprocess.Popen(
+            [sys.executable, "-m", "waitress", "--host=127.0.0.1", f"--port={port}",
+             f"--threads={args.threads}", "x32recorder.wsgi:application"],
+            cwd=DJANGO_DIR, env=env, stdout=log, stderr=subprocess.STDOUT,
+        ))
+        processes.append(subprocess.Popen(
+            [sys.executable, "controller.py"],
+            cwd=DJANGO_DIR, env=env, stdout=log, stderr=subprocess.STDOUT,
+        ))
+
+        if not wait_for_server(port, timeout=30):
+            print(f"Server did not come up, see {workdir / 'server.log'}", file=sys.stderr)
+            sys.exit(1)
+
+        stats = Stats()
+        stop_event = threading.Event()
+        threads = [
+            threading.Thread(target=poller, args=(port, stats, stop_event, args), daemon=True)
+            for _ in range(args.clients)
+        ]
+        if not args.no_operator:
+            threads.append(threading.Thread(target=operator, args=(port, stats, stop_event, args), daemon=True))
+
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        time.sleep(args.duration)
+        stop_event.set()
+        for thread in threads:
+            thread.join(timeout=60)
+        elapsed = time.perf_counter() - started
+
+        endpoints = stats.report(elapsed)
+        total_requests = sum(e['requests'] for e in endpoints.values())
+        total_errors = sum(e['errors'] for e in endpoints.values())
+        report = {
+            'revision': git_revision(),
+            'config': vars(args),
+            'elapsed_s': elapsed,
+            'total': {
+                'requests': total_requests,
+                'errors': total_errors,
+                'error_rate': total_errors / total_requests if total_requests else 0.0,
+                'throughput_rps': total_requests / elapsed,
+            },
+            'endpoints': endpoints,
+        }
+
+        output = json.dumps(report, indent=2)
+        if args.output:
+            Path(args.output).write_text(output + "\n")
+        else:
+            print(output)
+
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+"""
+Loudness analysis benchmark
+
+Writes a synthetic session - one 24-bit file per channel, noise shaped by
+a random level envelope so level and peak statistics vary like program
+material - indexes it as a recording in a temporary database and runs the
+``analyse_loudness`` job on it with each of the given worker counts. The
+report gives wall time and throughput per run and projects the time for a
+session of ``--project-hours`` with ``--project-channels`` channels.
+
+Files are read through the page cache after they were written, so this
+measures CPU cost; reading a real session from disk adds its I/O time.
+
+    python benchmarks/loudness.py --channels 32 --duration 300 --workers 1 2 4
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import wave
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+DJANGO_DIR = PROJECT_ROOT / "x32recorder"
+
+SEGMENT_SECONDS = 0.5
+PATTERN_SECONDS = 10
+
+
+def write_channel(path, seed, duration, sample_rate):
+    import numpy as np
+    from recorder.wavfile import int32_to_pcm24
+
+    rng = np.random.default_rng(seed)
+    segment = int(SEGMENT_SECONDS * sample_rate)
+    pattern = rng.standard_normal(PATTERN_SECONDS * sample_rate).astype(np.float32) * 0.3
+    with wave.open(str(path), 'wb') as wave_file:
+        wave_file.setnchannels(1)
+        wave_file.setsampwidth(3)
+        wave_file.setframerate(sample_rate)
+        for _ in range(int(duration / PATTERN_SECONDS)):
+            levels = 10 ** (rng.uniform(-40, -3, len(pattern) // segment) / 20)
+            block = np.clip(pattern * np.repeat(levels, segment).astype(np.float32), -1.0, 1.0)
+            samples = (block * (2**23 - 1)).astype(np.int32)
+            wave_file.writeframesraw(int32_to_pcm24(samples[None, :])[0].tobytes())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the loudness analysis of a synthetic session")
+    parser.add_argument('--channels', type=int, default=32)
+    parser.add_argument('--duration', type=float, default=120, help="Seconds per channel")
+    parser.add_argument('--sample-rate', type=int, default=48000)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, os.cpu_count()],
+                        help="Worker counts to compare")
+    parser.add_argument('--project-hours', type=float, default=2)
+    parser.add_argument('--project-channels', type=int, default=32)
+    parser.add_argument('--output', help="Write the JSON report to this file instead of stdout")
+    args = parser.parse_args()
+
+    workdir = Path(tempfile.mkdtemp(prefix="x32-loudness-"))
+    os.environ['X32RECORDER_DB'] = str(workdir / "db.sqlite3")
+    os.environ['X32RECORDER_RECORDING_PATH'] = str(workdir / "recordings")
+    os.chdir(DJANGO_DIR)
+    sys.path.insert(0, str(DJANGO_DIR))
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'x32recorder.settings')
+
+    try:
+        import django
+        django.setup()
+        from django.conf import settings
+        from django.core.management import call_command
+        from recorder.analysis import analyse_loudness
+        from recorder.files import index_recording_files
+        from recorder.models import Recording
+
+        call_command('migrate', verbosity=0)
+        recording = Recording.objects.create(
+            channels=list(range(args.channels)), sample_rate=args.sample_rate, state=Recording.STOPPED
+        )
+        directory = Path(settings.RECORDING_PATH) / str(recording.uuid)
+        directory.mkdir(parents=True)
+        channel_files = []
+        for channel in range(args.channels):
+            path = directory / f"ch{channel + 1:02d}.wav"
+            write_channel(path, channel, args.duration, args.sample_rate)
+            channel_files.append((channel + 1, str(path)))
+        index_recording_files(recording, channel_files)
+
+        samples = sum(f.frames for f in recording.files.all())
+        projected_samples = args.project_hours * 3600 * args.sample_rate * args.project_channels
+        runs = []
+        for workers in args.workers:
+            started = time.perf_counter()
+            analyse_loudness(recording, workers=workers)
+            seconds = time.perf_counter() - started
+            runs.append({
+                'workers': workers,
+                'seconds': seconds,
+                'samples_per_second': samples / seconds,
+                'projected_seconds': projected_samples / (samples / seconds),
+            })
+        report = {
+            'channels': args.channels,
+            'duration': args.duration,
+            'sample_rate': args.sample_rate,
+            'cpus': os.cpu_count(),
+            'projection': f"{args.project_hours:g} h x {args.project_channels} channels",
+            'runs': runs,
+            'results': list(recording.files.values('channel_no', 'loudness', 'true_peak', 'clip_count', 'dc_offset')),
+        }
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(output)
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
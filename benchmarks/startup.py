@@ -0,0 +1,163 @@
+#!/usr/bin/env python
+"""
+Cold start benchmark for the web app and the controller
+
+For both entry points this reports
+
+- an import profile (``python -X importtime``): total import time and the
+  modules with the highest self and cumulative times, for the WSGI app
+  including its URL configuration and for ``controller.py``
+- time to ready: from spawning the process until waitress answers
+  ``/api/`` and until the controller has written its ready file
+
+Runs use a temporary database; the audio backend defaults to the fake one,
+pass ``--backend sounddevice`` on the target machine to include PortAudio.
+
+    python benchmarks/startup.py --repeat 5 --output startup.json
+"""
+import argparse
+import http.client
+import json
+import os
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+DJANGO_DIR = PROJECT_ROOT / "x32recorder"
+
+ENTRY_POINTS = {
+    'wsgi': "import x32recorder.wsgi; from django.urls import resolve; resolve('/api/')",
+    'controller': "import controller",
+}
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def parse_importtime(stderr):
+    """``(module, self_us, cumulative_us, depth)`` rows of an -X importtime report"""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip())) // 2
+        rows.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return rows
+
+
+def import_profile(name, env, top):
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", ENTRY_POINTS[name]],
+        cwd=DJANGO_DIR, env=env, capture_output=True, text=True,
+    )
+    wall = time.perf_counter() - started
+    if result.returncode != 0:
+        raise RuntimeError(f"{name} failed to import:\n{result.stderr[-2000:]}")
+
+    rows = parse_importtime(result.stderr)
+    top_level = [row for row in rows if row[3] == 0]
+    return {
+        'wall_ms': 1000 * wall,
+        'import_ms': sum(row[2] for row in top_level) / 1000,
+        'modules': len(rows),
+        'top_self_ms': {row[0]: row[1] / 1000 for row in sorted(rows, key=lambda r: -r[1])[:top]},
+        'top_cumulative_ms': {row[0]: row[2] / 1000 for row in sorted(rows, key=lambda r: -r[2])[:top]},
+    }
+
+
+def time_to_ready(cmd, is_ready, env, timeout=60):
+    started = time.perf_counter()
+    process = subprocess.Popen(cmd, cwd=DJANGO_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while time.perf_counter() - started < timeout:
+            if process.poll() is not None:
+                raise RuntimeError(f"{cmd} exited with {process.returncode}")
+            if is_ready():
+                return 1000 * (time.perf_counter() - started)
+            time.sleep(0.01)
+        raise RuntimeError(f"{cmd} not ready after {timeout}s")
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def api_answers(port):
+    try:
+        connection = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+        connection.request('GET', '/api/')
+        return connection.getresponse().status < 500
+    except OSError:
+        return False
+
+
+def summarize(values):
+    return {'median': statistics.median(values), 'min': min(values), 'max': max(values), 'runs': values}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure import time and time to ready of the web app and the controller")
+    parser.add_argument('--repeat', type=int, default=3, help="Runs per measurement")
+    parser.add_argument('--top', type=int, default=15, help="Modules listed per import profile")
+    parser.add_argument('--backend', default='fake', help="Audio backend: fake or sounddevice")
+    parser.add_argument('--output', help="Write the JSON report to this file instead of stdout")
+    args = parser.parse_args()
+
+    workdir = Path(tempfile.mkdtemp(prefix="x32recorder-startup-"))
+    ready_file = workdir / "controller.ready"
+    env = dict(
+        os.environ,
+        X32RECORDER_DB=str(workdir / "db.sqlite3"),
+        X32RECORDER_RECORDING_PATH=str(workdir / "recordings"),
+        X32RECORDER_READY_FILE=str(ready_file),
+        X32RECORDER_AUDIO_BACKEND=args.backend,
+        PYTHONUNBUFFERED="1",
+    )
+
+    try:
+        subprocess.run([sys.executable, "manage.py", "migrate", "--noinput"],
+                       cwd=DJANGO_DIR, env=env, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+        report = {'backend': args.backend, 'imports': {}, 'ready_ms': {}}
+        for name in ENTRY_POINTS:
+            profiles = [import_profile(name, env, args.top) for _ in range(args.repeat)]
+            profile = min(profiles, key=lambda p: p['import_ms'])
+            profile['import_ms_runs'] = [p['import_ms'] for p in profiles]
+            report['imports'][name] = profile
+
+        waitress_runs = []
+        for _ in range(args.repeat):
+            port = free_port()
+            waitress_runs.append(time_to_ready(
+                [sys.executable, "-m", "waitress", "--host=127.0.0.1", f"--port={port}", "x32recorder.wsgi:application"],
+                lambda: api_answers(port), env,
+            ))
+        report['ready_ms']['waitress'] = summarize(waitress_runs)
+
+        controller_runs = []
+        for _ in range(args.repeat):
+            ready_file.unlink(missing_ok=True)
+            controller_runs.append(time_to_ready([sys.executable, "controller.py"], ready_file.exists, env))
+        report['ready_ms']['controller'] = summarize(controller_runs)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(output)
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
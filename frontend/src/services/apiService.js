@@ -11,18 +11,24 @@ const apiClient = axios.create({
 })
 
 const apiService = {
-  // Get all audio devices
-  async getAudioDevices() {
-    const response = await apiClient.get('/audiodevice/')
+  // Get all audio devices; refresh probes them again instead of using the cache
+  async getAudioDevices(refresh = false) {
+    const response = await apiClient.get('/audiodevice/', { params: refresh ? { refresh: 1 } : {} })
     return response.data
   },
 
-  // Get all recordings
-  async getRecordings() {
-    const response = await apiClient.get('/recordings/')
+  // Get recordings, filtered by the archive search parameters
+  async getRecordings(params = {}) {
+    const response = await apiClient.get('/recordings/', { params })
     return response.data.results
   },
 
+  // Get recording counts, hours and bytes per month
+  async getRecordingStats(params = {}) {
+    const response = await apiClient.get('/recordings/stats/', { params })
+    return response.data
+  },
+
   // Get a specific recording
   async getRecording(id) {
     const response = await apiClient.get(`/recordings/${id}/`)
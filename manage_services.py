@@ -1,7 +1,8 @@
 #!/usr/bin/env python3
 """
 X32 Recorder Service Management Script
-Cross-platform service manager for both Django web server (waitress) and controller process
+Cross-platform service manager for the Django web server (waitress), the controller
+process and the background job worker
 Works on Windows, Linux, and macOS
 """
 
@@ -12,9 +13,26 @@ import subprocess
 import signal
 import platform
 import argparse
+import json
+import urllib.error
+import urllib.request
 from pathlib import Path
 
 
+def format_log_line(line):
+    """Render a JSON log line like the controller's console output; other lines as they are"""
+    try:
+        entry = json.loads(line)
+        text = f"{entry['time']} {entry['level']:<7} {entry['thread']}: {entry['message']}"
+    except (ValueError, TypeError, KeyError):
+        return line.rstrip()
+    if entry.get('suppressed'):
+        text += f" ({entry['suppressed']} similar messages suppressed)"
+    if entry.get('exception'):
+        text += "\n" + entry['exception']
+    return text
+
+
 class ServiceManager:
     def __init__(self):
         self.script_dir = Path(__file__).parent.absolute()
@@ -27,13 +45,25 @@ class ServiceManager:
         if self.is_windows:
             self.waitress_pid = self.pid_dir / "waitress.pid"
             self.controller_pid = self.pid_dir / "controller.pid"
+            self.worker_pid = self.pid_dir / "worker.pid"
             self.waitress_log = self.log_dir / "waitress.log"
-            self.controller_log = self.log_dir / "controller.log"
+            self.controller_output = self.log_dir / "controller.log"
+            self.worker_log = self.log_dir / "worker.log"
         else:
             self.waitress_pid = self.pid_dir / "waitress.pid"
             self.controller_pid = self.pid_dir / "controller.pid"
+            self.worker_pid = self.pid_dir / "worker.pid"
             self.waitress_log = self.log_dir / "waitress.log"
-            self.controller_log = self.log_dir / "controller.log"
+            self.controller_output = self.log_dir / "controller.log"
+            self.worker_log = self.log_dir / "worker.log"
+        
+        # Structured log the controller writes itself (CONTROLLER_LOG_FILE);
+        # controller.log above only catches its console output
+        self.controller_log = Path(os.environ.get("X32RECORDER_LOG_DIR", self.log_dir)) / "controller.jsonl"
+        
+        # Written by the controller once its main loop runs (CONTROLLER_READY_FILE)
+        self.controller_ready = Path(os.environ.get("X32RECORDER_READY_FILE", self.pid_dir / "controller.ready"))
+        self.waitress_url = "http://127.0.0.1:8000/api/"
         
         # Create directories if they don't exist
         self.pid_dir.mkdir(exist_ok=True)
@@ -94,10 +124,12 @@ class ServiceManager:
                              capture_output=True)
             else:
                 os.kill(pid, signal.SIGTERM)
-                # Give it a moment to terminate gracefully
-                time.sleep(1)
+                # Give it up to 5 seconds to terminate gracefully
+                deadline = time.monotonic() + 5
                 try:
-                    os.kill(pid, 0)  # Check if still running
+                    while time.monotonic() < deadline:
+                        os.kill(pid, 0)  # Check if still running
+                        time.sleep(0.1)
                     os.kill(pid, signal.SIGKILL)  # Force kill if necessary
                 except ProcessLookupError:
                     pass  # Already terminated
@@ -176,19 +208,21 @@ class ServiceManager:
         os.chdir(self.script_dir / "x32recorder")
         
         cmd = ["uv", "run", "python", "controller.py"]
+        if self.controller_ready.exists():
+            self.controller_ready.unlink()
         
         try:
             if self.is_windows:
                 process = subprocess.Popen(
                     cmd,
-                    stdout=open(self.controller_log, 'w'),
+                    stdout=open(self.controller_output, 'w'),
                     stderr=subprocess.STDOUT,
                     creationflags=subprocess.CREATE_NEW_PROCESS_GROUP
                 )
             else:
                 process = subprocess.Popen(
                     cmd,
-                    stdout=open(self.controller_log, 'w'),
+                    stdout=open(self.controller_output, 'w'),
                     stderr=subprocess.STDOUT,
                     preexec_fn=os.setsid
                 )
@@ -204,8 +238,83 @@ class ServiceManager:
             print(f"Failed to start controller: {e}")
             return False
     
-    def start_services(self):
-        """Start both services"""
+    def start_worker(self):
+        """Start background job worker process"""
+        if self.is_process_running(self.worker_pid):
+            with open(self.worker_pid, 'r') as f:
+                pid = f.read().strip()
+            print(f"Job worker is already running (PID: {pid})")
+            return True
+        
+        print("Starting Job worker...")
+        
+        # Change to project directory
+        os.chdir(self.script_dir / "x32recorder")
+        
+        # The worker lowers its own CPU and I/O priority and pauses while recording
+        cmd = ["uv", "run", "python", "manage.py", "run_jobs"]
+        
+        try:
+            if self.is_windows:
+                process = subprocess.Popen(
+                    cmd,
+                    stdout=open(self.worker_log, 'w'),
+                    stderr=subprocess.STDOUT,
+                    creationflags=subprocess.CREATE_NEW_PROCESS_GROUP
+                )
+            else:
+                process = subprocess.Popen(
+                    cmd,
+                    stdout=open(self.worker_log, 'w'),
+                    stderr=subprocess.STDOUT,
+                    preexec_fn=os.setsid
+                )
+            
+            # Save PID
+            with open(self.worker_pid, 'w') as f:
+                f.write(str(process.pid))
+            
+            print(f"Job worker started (PID: {process.pid})")
+            return True
+            
+        except Exception as e:
+            print(f"Failed to start job worker: {e}")
+            return False
+    
+    def waitress_ready(self):
+        """The API answers (the first request also loads the URL configuration)"""
+        try:
+            with urllib.request.urlopen(self.waitress_url, timeout=2) as response:
+                return response.status < 500
+        except urllib.error.HTTPError as e:
+            return e.code < 500
+        except (urllib.error.URLError, OSError):
+            return False
+    
+    def wait_until_ready(self, timeout=60):
+        """Wait for the readiness signals of Waitress and the Controller"""
+        print("Waiting for services to become ready...")
+        started = time.monotonic()
+        pending = {
+            "Waitress": (self.waitress_pid, self.waitress_ready),
+            "Controller": (self.controller_pid, self.controller_ready.exists),
+        }
+        while pending and time.monotonic() - started < timeout:
+            for name, (pid_file, is_ready) in list(pending.items()):
+                if is_ready():
+                    print(f"{name} ready after {time.monotonic() - started:.1f}s")
+                    del pending[name]
+                elif not self.is_process_running(pid_file):
+                    print(f"{name} exited during startup, check its log")
+                    return False
+            time.sleep(0.1)
+        
+        for name in pending:
+            print(f"{name} not ready after {timeout}s, check its log")
+        return not pending
+    
+    def start_services(self, timeout=60):
+        """Start all services"""
         if not self.check_uv():
             return False
         
@@ -213,8 +322,9 @@ class ServiceManager:
         
         waitress_ok = self.start_waitress()
         controller_ok = self.start_controller()
+        worker_ok = self.start_worker()
         
-        if waitress_ok and controller_ok:
+        if waitress_ok and controller_ok and worker_ok and self.wait_until_ready(timeout):
             print("Services started successfully!")
             print("Web interface: http://localhost:8000")
             print(f"Logs: {self.log_dir}")
@@ -245,14 +355,25 @@ class ServiceManager:
         else:
             print("Controller is not running")
         
+        if self.is_process_running(self.worker_pid):
+            print("Stopping Job worker...")
+            if self.kill_process(self.worker_pid):
+                print("Job worker stopped")
+            else:
+                print("Failed to stop Job worker")
+        else:
+            print("Job worker is not running")
+        
+        if self.controller_ready.exists():
+            self.controller_ready.unlink()
+        
         print("Services stopped")
     
-    def restart_services(self):
+    def restart_services(self, timeout=60):
         """Restart both services"""
         print("Restarting X32 Recorder services...")
         self.stop_services()
-        time.sleep(2)
-        self.start_services()
+        return self.start_services(timeout)
     
     def show_status(self):
         """Show status of both services"""
@@ -274,10 +395,19 @@ class ServiceManager:
         else:
             print("✗ Controller: Not running")
         
+        if self.is_process_running(self.worker_pid):
+            with open(self.worker_pid, 'r') as f:
+                pid = f.read().strip()
+            print(f"✓ Job worker: Running (PID: {pid})")
+        else:
+            print("✗ Job worker: Not running")
+        
         print()
         print("Log files:")
         print(f"  Waitress: {self.waitress_log}")
         print(f"  Controller: {self.controller_log}")
+        print(f"  Controller output: {self.controller_output}")
+        print(f"  Job worker: {self.worker_log}")
     
     def show_logs(self):
         """Show recent logs from both services"""
@@ -300,11 +430,24 @@ class ServiceManager:
                 with open(self.controller_log, 'r') as f:
                     lines = f.readlines()
                     for line in lines[-20:]:
-                        print(line.rstrip())
+                        print(format_log_line(line))
             except Exception as e:
                 print(f"Error reading controller log: {e}")
         else:
             print("No controller log file found")
+        
+        print()
+        print("=== Job worker Logs (last 20 lines) ===")
+        if self.worker_log.exists():
+            try:
+                with open(self.worker_log, 'r') as f:
+                    lines = f.readlines()
+                    for line in lines[-20:]:
+                        print(line.rstrip())
+            except Exception as e:
+                print(f"Error reading worker log: {e}")
+        else:
+            print("No worker log file found")
 
 
 def main():
@@ -313,11 +456,11 @@ def main():
         formatter_class=argparse.RawDescriptionHelpFormatter,
         epilog="""
 Commands:
-  start   - Start both Waitress and Controller services
-  stop    - Stop both services
-  restart - Restart both services
-  status  - Show status of both services
-  logs    - Show recent logs from both services
+  start   - Start Waitress, Controller and Job worker services
+  stop    - Stop all services
+  restart - Restart all services
+  status  - Show status of all services
+  logs    - Show recent logs from all services
         """
     )
     parser.add_argument(
@@ -325,6 +468,10 @@ Commands:
         choices=['start', 'stop', 'restart', 'status', 'logs'],
         help='Command to execute'
     )
+    parser.add_argument(
+        '--timeout', type=float, default=60,
+        help='Seconds to wait for the services to become ready (start/restart)'
+    )
     
     args = parser.parse_args()
     
@@ -332,12 +479,13 @@ Commands:
     
     try:
         if args.command == 'start':
-            success = manager.start_services()
+            success = manager.start_services(args.timeout)
             sys.exit(0 if success else 1)
         elif args.command == 'stop':
             manager.stop_services()
         elif args.command == 'restart':
-            manager.restart_services()
+            success = manager.restart_services(args.timeout)
+            sys.exit(0 if success else 1)
         elif args.command == 'status':
             manager.show_status()
         elif args.command == 'logs':
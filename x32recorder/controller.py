@@ -1,10 +1,15 @@
+import atexit
+import collections
+import logging
+import math
 import os
+import queue
+import shutil
+import signal
 import time
 import threading
-import wave
 from datetime import datetime
 import numpy as np
-import sounddevice as sd
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "x32recorder.settings")
 import django
@@ -12,32 +17,74 @@ import django
 django.setup()
 
 from django.conf import settings
-from recorder.models import Recording
+from django.db import connection
+from recorder.models import MIRROR, PRIMARY, Recording
+from recorder.agent import AgentServer
+from recorder.audio import get_backend, rescan_devices
+from recorder.devices import cache_devices, probe_devices
+from recorder.listen import ListenTap
+from recorder.metrics import Counter, Gauge, MetricsServer
+from recorder.osc import OscControlServer
+from recorder.playback import MultiChannelPlayer
+from recorder.profiling import SamplingProfiler
+from recorder.replication import ReplicationReceiver, ReplicationTarget, parse_address
+from recorder import realtime
+from recorder.rtlog import RealtimeLog, setup_logging
+from recorder.store import DatabaseStore, get_store
+from recorder.targets import WriterTarget, best_target
 
-print("Using sounddevice backend (cross-platform)")
+log = logging.getLogger("controller")
+# The audio callback logs through this ring only, never through ``log`` directly
+rt_log = RealtimeLog(log)
+CALLBACK_STATUS = rt_log.message("Audio callback status: input overflow={0}, input underflow={1}")
 
 RECORDING_PATH = settings.RECORDING_PATH
-SAMPLE_RATE = 48000
-PERIOD_SIZE = 1024
-BUFFER_SIZE = 8192
+WRITER_BUFFER_SECONDS = 2.0
+WRITER_FINISH_TIMEOUT = 10.0
+# Device-loss recovery: a stream without callbacks for STALL_TIMEOUT counts as lost,
+# reopening is retried after REOPEN_INTERVAL, doubling up to MAX_REOPEN_INTERVAL
+STALL_TIMEOUT = 1.0
+REOPEN_INTERVAL = 0.5
+MAX_REOPEN_INTERVAL = 10.0
 
 
 class MultiChannelRecorder:
-    def __init__(self, sample_rate, recording_path):
+    def __init__(self, sample_rate, recording_path, mirror_path=None, replicate_to=None,
+                 block_size=Recording.DEFAULT_BLOCK_SIZE, latency=None):
+        # Stream settings; the main loop sets them from each recording like channels and device
         self.sample_rate = sample_rate
+        self.block_size = block_size
+        self.latency = latency
         self.recording_path = recording_path
+        self.mirror_path = mirror_path
+        # "host:port" of a standby recorder receiving every block
+        self.replicate_to = replicate_to
         self.recording = False
-        self.wave_files = []
-        self.wave_writers = []
+        self.targets = []
         self.audio_data_queue = []
         self.stream = None
+        self.listen_tap = None
+        self.frames_recorded = 0
+        self.digests = {}
+        # Lifetime totals for the metrics endpoint
+        self.blocks_captured = 0
+        self.input_overflows = 0
+        self.capture_thread_ident = None
+        self.hardened = settings.REALTIME_HARDENED
+        self.capture_thread_tuned = False
+        self.locked_buffers = []
+        # Gaps waiting to be stored by the main loop: keyword arguments of ``store.add_gap``
+        self.gaps = collections.deque()
+        self.device_lost = False
+        self.device_gaps = 0
             
     def setup_audio_device(self):
         """Setup sounddevice for recording"""
+        sd = get_backend()
 
         device_info = sd.query_devices(self.audiodevice_index, 'input')
         device_channels = device_info['max_input_channels']
-        print(f"Using {self.channels} input channels from device {device_info['name']}")
+        log.info("Using input channels %s from device %s", self.channels, device_info['name'])
 
         sd.check_input_settings(
             device=self.audiodevice_index,
@@ -46,57 +93,116 @@ class MultiChannelRecorder:
             dtype=np.float32
         )
         
-        print(f"sounddevice configured: device={self.audiodevice_index}, {self.channels} channels, {self.sample_rate}Hz")
+        log.info("Audio device %s configured for %s Hz, %d frames per block, latency %s",
+                 self.audiodevice_index, self.sample_rate, self.block_size, self.latency or "default")
         
     
-    def setup_wave_files(self, uuid):
-        """Setup wave files for each channel"""
-        self.wave_files = []
-        self.wave_writers = []
-        
+    def setup_wave_files(self, uuid, channel_names):
+        """Setup wave files for each channel, named after ``{channel_no: name}``, on every target"""
         # scheme: uuid/ch01.wav - later uuid/ch01_guitar.wav
-        uuid_path = os.path.join(self.recording_path, str(uuid))
-        os.makedirs(uuid_path)
-
-        recording = Recording.objects.get(uuid=uuid)
-
+        filenames = []
         for channel in self.channels:
             
-            if recording.template:
-                template_channel = recording.template.channels.filter(channel_no=channel + 1).first()
-                if template_channel:
-                    filename = f"ch{channel + 1:02d}_{template_channel.name.replace(' ', '_')}.wav"
-                else:
-                    filename = f"ch{channel + 1:02d}.wav"
+            name = channel_names.get(channel + 1)
+            if name:
+                filenames.append(f"ch{channel + 1:02d}_{name.replace(' ', '_')}.wav")
             else:
-                filename = f"ch{channel + 1:02d}.wav"
+                filenames.append(f"ch{channel + 1:02d}.wav")
 
-            filepath = os.path.join(uuid_path, filename)
-            
-            wave_file = wave.open(filepath, 'wb')
-            wave_file.setnchannels(1)  # Mono file per channel
-            wave_file.setsampwidth(3)  # 24-bit = 3 bytes
-            wave_file.setframerate(self.sample_rate)
-            
-            self.wave_files.append(wave_file)
-            self.wave_writers.append(filepath)
-            
-        print(f"Created {len(self.wave_files)} wave files for channels")
+        self.targets = [WriterTarget(role, path) for role, path in self.target_paths()]
+        if self.replicate_to:
+            self.targets.append(ReplicationTarget(
+                self.replicate_to,
+                settings.REPLICATION_TOKEN,
+                {'channels': self.channels, 'audiodevice_index': self.audiodevice_index},
+                settings.REPLICATION_BACKLOG_SECONDS,
+                settings.REPLICATION_TIMEOUT,
+            ))
+        for target in self.targets:
+            target.open(uuid, filenames, self.sample_rate)
+
+        local_targets = [target for target in self.targets if target.local]
+        if not any(target.writing for target in local_targets):
+            raise OSError(f"No storage target could be opened: {self.targets[0].error}")
+        log.info("Created %d wave files on %d targets", len(filenames),
+                 sum(target.writing for target in local_targets), extra={'recording': str(uuid)})
     
-    def start_recording(self, uuid):
-        """Start multi-channel recording"""
+    def setup_writer(self):
+        """Preallocate the capture buffers and start one writer thread per target"""
+        slots = math.ceil(WRITER_BUFFER_SECONDS * self.sample_rate / self.block_size)
+        self.channel_index = np.array(self.channels, dtype=np.intp)
+        self.capture_scratch = np.zeros((self.block_size, len(self.channels)), dtype=np.float32)
+        channel_numbers = [channel + 1 for channel in self.channels]
+        pin = (lambda: realtime.pin_current_thread(settings.REALTIME_WRITER_CPUS)) if self.hardened else None
+        for target in self.targets:
+            if target.writing:
+                target.start(slots, self.block_size, channel_numbers, pin)
+
+        if self.hardened:
+            self.harden_buffers()
+
+    def harden_buffers(self):
+        """Lock the capture buffers in RAM and pause the cyclic GC"""
+        buffers = [self.capture_scratch, self.channel_index]
+        buffers += [target.ring.blocks for target in self.targets if target.ring is not None]
+        self.locked_buffers = [array for array in buffers if realtime.lock_memory(array)]
+        if len(self.locked_buffers) < len(buffers):
+            log.warning("Realtime: could not mlock all capture buffers (check RLIMIT_MEMLOCK)")
+        realtime.pause_gc()
+
+    def release_buffers(self):
+        for array in self.locked_buffers:
+            realtime.unlock_memory(array)
+        self.locked_buffers = []
+        realtime.resume_gc()
+
+    def _tune_capture_thread(self):
+        """Runs once, inside the first audio callback of a stream"""
+        self.capture_thread_tuned = True
+        self.capture_thread_report = (
+            realtime.pin_current_thread(settings.REALTIME_CAPTURE_CPUS),
+            realtime.set_realtime_priority(settings.REALTIME_PRIORITY),
+        )
+
+    def start_recording(self, uuid, channel_names=None):
+        """
+        Start multi-channel recording. Raises if the device, the stream
+        settings or the storage targets cannot be set up; nothing is left
+        running then.
+        """
+        self.targets = []
         self.setup_audio_device()
-            
-        self.setup_wave_files(uuid)
-        self.recording = True
-        self.audio_data_queue = []
-        
-        # Start recording with sounddevice
-        self.record_thread = threading.Thread(target=self._sounddevice_record_loop)
+        # Opened here rather than in the recording thread, so bad stream settings fail the start
+        self.device_name = get_backend().query_devices(self.audiodevice_index, 'input')['name']
+        self.stream = self._open_stream(self._audio_callback)
+        try:
+            self.setup_wave_files(uuid, channel_names or {})
+            if self.listen_tap:
+                self.listen_tap.set_sample_rate(self.sample_rate)
+            self.frames_recorded = 0
+            self.setup_writer()
+            self.capture_thread_tuned = False
+            self.capture_thread_report = None
+            self.capture_thread_ident = None
+            self.recording = True
+            self.audio_data_queue = []
+            self.gaps.clear()
+            self.last_callback = time.monotonic()
+            self.stream.start()
+        except Exception:
+            self.recording = False
+            self._close_stream()
+            for target in self.targets:
+                target.fail("recording could not be started")
+            if self.hardened and self.locked_buffers:
+                self.release_buffers()
+            raise
+
+        # Watches the stream and reopens the device when it is lost
+        self.record_thread = threading.Thread(target=self._sounddevice_record_loop, name="record")
         self.record_thread.start()
         
-        print(f"Multi-channel recording started using sounddevice")
-        return True
+        log.info("Multi-channel recording started", extra={'recording': str(uuid)})
     
     def stop_recording(self):
         """Stop recording and close files"""
@@ -105,141 +211,576 @@ class MultiChannelRecorder:
             
         self.recording = False
         
-        # Stop sounddevice stream if running
-        if hasattr(self, 'stream') and self.stream:
-            self.stream.stop()
-            self.stream.close()
-        
-        # Wait for recording thread to finish
+        # The recording thread closes the stream; it may be reopening a lost device
         if hasattr(self, 'record_thread'):
             self.record_thread.join()
+
+        # Let the writers drain what is still buffered
+        for target in self.targets:
+            target.finish(WRITER_FINISH_TIMEOUT)
         
-        # Close wave files
-        for wave_file in self.wave_files:
-            wave_file.close()
-            
-        print("Recording stopped and files closed")
-        return self.wave_writers
+        if self.hardened:
+            self.release_buffers()
+            if self.capture_thread_report:
+                pinned, fifo = self.capture_thread_report
+                log.info("Realtime: capture thread pinned=%s SCHED_FIFO=%s", pinned, fifo)
+
+        for target in self.targets:
+            if target.dropped_blocks:
+                log.warning("%d blocks dropped because the %s writer fell behind, filled with silence", target.dropped_blocks, target.role)
+
+        self.indexed_target = best_target(self.targets)
+        self.digests = self.indexed_target.digests()
+        for position, length in self.indexed_target.overruns:
+            self.gaps.append({
+                'position': position / self.sample_rate, 'length': length / self.sample_rate,
+                'padded': True, 'reason': 'writer overrun',
+            })
+        log.info("Recording stopped and files closed, indexing the %s target", self.indexed_target.role)
+        return self.indexed_target.paths
+
+    def channel_files(self):
+        """(channel_no, path) pairs of the files written by the last recording"""
+        return [(channel + 1, path) for channel, path in zip(self.channels, self.indexed_target.paths)]
+
+    def storage_health(self):
+        """Health of every storage target, as stored on the recording"""
+        return [target.health() for target in self.targets]
+
+    def target_paths(self):
+        """(role, directory) of the primary and, if configured, the mirror"""
+        return [(PRIMARY, self.recording_path)] + ([(MIRROR, self.mirror_path)] if self.mirror_path else [])
     
+    def _audio_callback(self, indata, frames, time_info, status):
+        self.last_callback = time.monotonic()
+        if self.capture_thread_ident is None:
+            # The audio callback runs on a thread unknown to ``threading``; name it for the profiler
+            self.capture_thread_ident = threading.get_ident()
+        if self.hardened and not self.capture_thread_tuned:
+            self._tune_capture_thread()
+        if status:
+            if status.input_overflow:
+                self.input_overflows += 1
+            rt_log.log(logging.WARNING, CALLBACK_STATUS, status.input_overflow, status.input_underflow)
+        if self.listen_tap:
+            self.listen_tap.feed(indata)
+        if self.recording:
+            self._capture_block(indata)
+
     def _sounddevice_record_loop(self):
-        """sounddevice recording loop"""
-        def audio_callback(indata, frames, time, status):
-            if status:
-                print(f"Audio callback status: {status}")
-            if self.recording:
-                # Convert float32 to int32 for 24-bit processing
-                audio_int32 = (indata * (2**23 - 1)).astype(np.int32)
-                self._process_sounddevice_data(audio_int32)
-        
+        """Watchdog of the running stream, reopening the device when the stream dies or stalls"""
+        # A USB glitch either stops the stream or just starves its callbacks
+        while self.recording:
+            time.sleep(0.1)
+            if not self.stream.active or time.monotonic() - self.last_callback > STALL_TIMEOUT:
+                self._recover_stream(self._audio_callback)
+
+        self._close_stream()
+
+    def _open_stream(self, callback):
+        sd = get_backend()
         # get number of channels for sounddevice
         device_info = sd.query_devices(self.audiodevice_index, 'input')
-        device_channels = device_info['max_input_channels']
-        print(f"Using {self.channels} input channels from device {device_info['name']}")
-
-        # Start stream
-        self.stream = sd.InputStream(
+        return sd.InputStream(
             device=self.audiodevice_index,
-            channels=device_channels,
+            channels=device_info['max_input_channels'],
             samplerate=self.sample_rate,
-            callback=audio_callback,
-            blocksize=PERIOD_SIZE,
+            callback=callback,
+            blocksize=self.block_size,
+            latency=self.latency,
             dtype=np.float32
         )
-        
-        self.stream.start()
-        
-        # Keep thread alive while recording
+
+    def _close_stream(self):
+        if self.stream is None:
+            return
+        try:
+            self.stream.abort()
+            self.stream.close()
+        except Exception as e:
+            # A stream of an unplugged device may fail to close
+            log.warning("Could not close the audio stream: %s", e)
+        self.stream = None
+
+    def _find_device(self):
+        """Index of the recording device after a rescan, matched by name"""
+        sd = get_backend()
+        for device in sd.query_devices():
+            if device['name'] == self.device_name and device['max_input_channels'] > 0:
+                return device['index']
+        raise ValueError(f"Input device {self.device_name!r} not found")
+
+    def _recover_stream(self, callback):
+        """
+        Reopen the device with exponential backoff and continue the same
+        recording: the frames lost in between are padded with silence so
+        the files stay aligned with wall-clock time, and the gap is queued
+        for the main loop to store.
+        """
+        lost_at = self.last_callback
+        position = self.frames_recorded / self.sample_rate
+        reason = 'stream stopped' if not self.stream.active else 'stream stalled'
+        self.device_lost = True
+        self.device_gaps += 1
+        log.error("Audio %s, reopening %s", reason, self.device_name)
+        self._close_stream()
+
+        interval = REOPEN_INTERVAL
         while self.recording:
-            time.sleep(0.1)
+            try:
+                rescan_devices(get_backend())
+                self.audiodevice_index = self._find_device()
+                stream = self._open_stream(callback)
+                break
+            except Exception as e:
+                # PortAudioError while the device is gone, ValueError if it is not listed
+                log.warning("Reopening the audio device failed, retrying in %.1f s: %s", interval, e)
+                deadline = time.monotonic() + interval
+                while self.recording and time.monotonic() < deadline:
+                    time.sleep(0.05)
+                interval = min(interval * 2, MAX_REOPEN_INTERVAL)
+        else:
+            # Stopped before the device came back; the files end where the audio did
+            self.gaps.append({
+                'position': position, 'length': time.monotonic() - lost_at, 'padded': False, 'reason': reason,
+            })
+            self.device_lost = False
+            return
+
+        missing = round((time.monotonic() - lost_at) * self.sample_rate)
+        self._pad_silence(missing)
+        self.gaps.append({
+            'position': position, 'length': missing / self.sample_rate, 'padded': True, 'reason': reason,
+        })
+        # The new stream calls back on a new thread
+        self.capture_thread_tuned = False
+        self.capture_thread_ident = None
+        self.last_callback = time.monotonic()
+        self.stream = stream
+        self.stream.start()
+        self.device_lost = False
+        log.warning("Audio device back after %.2f s, gap padded with silence", missing / self.sample_rate)
+
+    def _pad_silence(self, frames):
+        """Queue ``frames`` of silence on every target; runs while no stream feeds the rings"""
+        for start in range(0, frames, self.block_size):
+            length = min(self.block_size, frames - start)
+            for target in self.targets:
+                if not target.writing:
+                    continue
+                deadline = time.monotonic() + WRITER_FINISH_TIMEOUT
+                # Unlike the callback, this thread can wait for the writer to free a slot
+                while not target.ring.free and target.writing and time.monotonic() < deadline:
+                    time.sleep(0.005)
+                slot = target.ring.acquire()
+                if slot is None:
+                    target.ring.skip(length)
+                    continue
+                target.ring.blocks[slot, :length] = 0
+                target.ring.commit(slot, length)
+            self.frames_recorded += length
 
     
-    def _process_sounddevice_data(self, audio_data):
-        """Process sounddevice audio data (convert int32 to 24-bit)"""
-        frames, channels = audio_data.shape
-        
-        for idx, channel in enumerate(self.channels):
-            # Extract channel data and convert to 24-bit
-            channel_data = audio_data[:, channel]
-            
-            # Convert int32 to 24-bit bytes
-            channel_24bit = bytearray()
-            for sample in channel_data:
-                # Clamp to 24-bit range
-                sample_24 = max(-2**23, min(2**23 - 1, sample))
-                # Convert to 3 bytes (little endian)
-                sample_bytes = int(sample_24).to_bytes(4, byteorder='little', signed=True)[:3]
-                channel_24bit.extend(sample_bytes)
-            
-            # Write to wave file
-            self.wave_files[idx].writeframes(bytes(channel_24bit))
+    def _capture_block(self, indata):
+        """
+        Copy the recorded channels of a device block into the ring of every
+        target still writing. Runs in the audio callback, so it only fills
+        preallocated buffers; a target whose ring is full misses the block,
+        and its writer puts silence in its place.
+        """
+        for start in range(0, len(indata), self.block_size):
+            part = indata[start:start + self.block_size]
+            frames = len(part)
+            self.frames_recorded += frames
 
+            scratch = self.capture_scratch[:frames]
+            converted = None
+            for target in self.targets:
+                if not target.writing:
+                    continue
+                slot = target.ring.acquire()
+                if slot is None:
+                    target.ring.skip(frames)
+                    continue
+                block = target.ring.blocks[slot, :frames]
+                if converted is None:
+                    np.take(part, self.channel_index, axis=1, out=scratch)
+                    np.clip(scratch, -1.0, 1.0, out=scratch)
+                    # Convert float32 to 24-bit values held in int32
+                    np.multiply(scratch, 2**23 - 1, out=block, casting='unsafe')
+                    converted = block
+                else:
+                    # Slots are only reused after the callback acquires them again
+                    np.copyto(block, converted)
+                target.ring.commit(slot, frames)
+            if converted is not None:
+                self.blocks_captured += 1
 
-def list_audio_devices():
-    """List available audio devices"""
-    print("\nAvailable sounddevice audio devices:")
-    print(sd.query_devices())
+
+def register_metrics(recorder):
+    """Export the recorder state on the controller metrics endpoint"""
+    def per_target(value):
+        return lambda: {(target.role,): value(target) for target in list(recorder.targets)}
+
+    Gauge('x32recorder_recording', "1 while a recording is running").set_function(
+        lambda: int(recorder.recording)
+    )
+    Counter('x32recorder_capture_blocks_total', "Audio blocks copied into the writer ring").set_function(
+        lambda: recorder.blocks_captured
+    )
+    Counter('x32recorder_bytes_written_total', "Sample bytes written in the current recording per target and channel", ['target', 'channel']).set_function(
+        lambda: {
+            (target.role, str(channel)): count
+            for target in list(recorder.targets)
+            for channel, count in list(target.bytes_written.items())
+        }
+    )
+    Gauge('x32recorder_writer_queue_depth', "Blocks waiting for the writer thread of each target", ['target']).set_function(
+        per_target(lambda target: target.ring.depth if target.ring is not None else 0)
+    )
+    Gauge('x32recorder_writer_dropped_blocks', "Blocks dropped in the current recording because a target's writer fell behind", ['target']).set_function(
+        per_target(lambda target: target.dropped_blocks)
+    )
+    Gauge('x32recorder_seconds_since_last_write', "Time since each target's writer last wrote to its channel files", ['target']).set_function(
+        per_target(lambda target: time.time() - target.last_write if target.last_write else float('nan'))
+    )
+    Gauge('x32recorder_target_failed', "1 if a storage target stopped writing after an error", ['target']).set_function(
+        per_target(lambda target: int(not target.writing))
+    )
+    Counter('x32recorder_input_overflows_total', "Capture callbacks reporting that the device dropped input; try a larger block size").set_function(
+        lambda: recorder.input_overflows
+    )
+    Gauge('x32recorder_device_lost', "1 while the input device is being reopened after a failure").set_function(
+        lambda: int(recorder.device_lost)
+    )
+    Counter('x32recorder_device_gaps_total', "Input device failures recovered from or ended by a stop").set_function(
+        lambda: recorder.device_gaps
+    )
+    Gauge('x32recorder_replication_connected', "1 while the standby recorder is connected").set_function(
+        lambda: int(any(getattr(target, 'connected', False) for target in list(recorder.targets)))
+    )
+    Gauge('x32recorder_disk_free_bytes', "Free space on the recording volumes", ['target']).set_function(
+        lambda: {(role,): disk_free(path) for role, path in recorder.target_paths()}
+    )
+
+
+def disk_free(path):
+    try:
+        return shutil.disk_usage(path).free
+    except OSError:
+        # Unplugged mirror drive
+        return float('nan')
+
+
+def start_standby_receiver(store):
+    """Receive the recordings a primary replicates to this controller"""
+    if not isinstance(store, DatabaseStore):
+        log.error("The standby receiver needs the database; not started on a capture agent")
+        return None
+
+    def closed(session):
+        store.import_replica(session.hello, session.channel_files(), session.digests())
+
+    def take_over(session):
+        if not settings.REPLICATION_TAKEOVER or store.active():
+            return
+        # Same channels and device as the replicated recording, which is now the latest
+        recording = store.create_recording()
+        # Picked up by the main loop's next poll
+        log.warning("Taking over from the lost primary with recording %s", recording.uuid,
+                    extra={'recording': str(recording.uuid)})
+
+    host, port = parse_address(settings.REPLICATION_LISTEN)
+    receiver = ReplicationReceiver(
+        host, port, settings.REPLICATION_TOKEN, RECORDING_PATH,
+        on_closed=closed,
+        on_takeover=take_over,
+        takeover_seconds=settings.REPLICATION_TAKEOVER_SECONDS,
+    )
+    receiver.start()
+    log.info("Standby: receiving replicated recordings on %s:%s", host, port)
+    return receiver
+
+
+def list_audio_devices(store):
+    """List available audio devices and cache their capabilities for the API"""
+    sd = get_backend()
+    log.info("Available %s audio devices:\n%s", settings.AUDIO_BACKEND, sd.query_devices())
+    if isinstance(store, DatabaseStore):
+        cache_devices(probe_devices(sd), sd.query_hostapis())
+
+
+def mark_ready():
+    """Create the ready file that manage_services.py waits for"""
+    ready_file = settings.CONTROLLER_READY_FILE
+    ready_file.parent.mkdir(parents=True, exist_ok=True)
+    ready_file.write_text(str(os.getpid()))
+    atexit.register(ready_file.unlink, missing_ok=True)
+
+
+def handle_command(action, received_at, recorder, store):
+    """Apply a start/stop/marker trigger received over OSC"""
+    active = store.active()
+
+    if action == "start":
+        if active:
+            log.info("OSC start ignored: there is already an active recording")
+            return
+        store.create_recording()
+
+    elif action == "stop":
+        if not active or active.state not in [Recording.NEW, Recording.RECORD]:
+            log.info("OSC stop ignored: no active recording")
+            return
+        store.update(active, state=Recording.STOP)
+
+    elif action == "marker":
+        if not active or active.state != Recording.RECORD or not recorder.recording:
+            log.info("OSC marker ignored: not recording")
+            return
+        # Position in the captured audio when the trigger arrived
+        seconds = recorder.frames_recorded / recorder.sample_rate - (time.monotonic() - received_at)
+        store.add_marker(active, max(0.0, seconds))
+
+    latency_ms = (time.monotonic() - received_at) * 1000
+    log.info("OSC %s handled after %.1f ms", action, latency_ms, extra={'osc_action': action, 'latency_ms': latency_ms})
+
+
+def start_playback(recording, store):
+    """
+    Start playing the files of a recording back to its device outputs;
+    raises if there is nothing to play or the files or device cannot be opened
+    """
+    device_info = get_backend().query_devices(recording.audiodevice_index, 'output')
+    output_channels = device_info['max_output_channels']
+
+    playback_files = store.playback_files(recording)
+    if not playback_files:
+        raise ValueError("the recording has no indexed files")
+    channel_files = [
+        (channel_no - 1, path)
+        for channel_no, path, _ in playback_files
+        if channel_no <= output_channels
+    ]
+    if not channel_files:
+        raise ValueError(f"device {device_info['name']!r} has no outputs for the recorded channels")
+    player = MultiChannelPlayer(
+        channel_files,
+        sample_rate=playback_files[0][2],
+        device=recording.audiodevice_index,
+        blocksize=recording.block_size,
+        loop=recording.playback_request.get('loop', False),
+    )
+    player.seek(recording.playback_request.get('seek') or 0)
+    try:
+        player.start()
+    except Exception:
+        # Stops the prefetch thread that was already running
+        player.stop()
+        raise
+    log.info("Playing %d channels to device %s", len(channel_files), device_info['name'], extra={'recording': str(recording.uuid)})
+    return player
 
 
 def main():
-    print(f"X32 Recorder Controller started")
-    print(f"Audio backend: sounddevice")
-    print(f"Sample Rate: {SAMPLE_RATE}Hz")
-    print(f"Recording path: {RECORDING_PATH}")
-    
-    # List available devices for debugging
-    list_audio_devices()
+    setup_logging(
+        settings.CONTROLLER_LOG_FILE,
+        json_format=settings.LOG_FORMAT == "json",
+        max_bytes=settings.LOG_MAX_BYTES,
+        backup_count=settings.LOG_BACKUP_COUNT,
+        rate_limit_interval=settings.LOG_RATE_LIMIT_SECONDS,
+    )
+    rt_log.start()
+
+    log.info("X32 Recorder Controller started")
+    log.info("Audio backend: %s", settings.AUDIO_BACKEND)
+    log.info("Recording path: %s", RECORDING_PATH)
+    if settings.MIRROR_RECORDING_PATH:
+        log.info("Mirroring recordings to %s", settings.MIRROR_RECORDING_PATH)
+    if settings.REPLICATION_TARGET:
+        log.info("Replicating recordings to the standby at %s", settings.REPLICATION_TARGET)
+
+    store = get_store()
+    if not isinstance(store, DatabaseStore):
+        # Capture agent: the web app fetches the recordings from this node
+        AgentServer(
+            settings.AGENT_HOST, settings.AGENT_PORT, settings.CONTROLLER_NODE_TOKEN,
+            RECORDING_PATH, settings.MIRROR_RECORDING_PATH,
+        ).start()
+        log.info("Capture agent of %s, serving recordings on %s:%s",
+                 settings.CONTROLLER_SERVER_URL, settings.AGENT_HOST, settings.AGENT_PORT)
+    if settings.REALTIME_HARDENED:
+        log.info("Realtime hardened mode: capture CPUs %s, writer CPUs %s, priority %s",
+                 settings.REALTIME_CAPTURE_CPUS, settings.REALTIME_WRITER_CPUS, settings.REALTIME_PRIORITY)
     
     recorder = MultiChannelRecorder(
-        sample_rate=SAMPLE_RATE,
-        recording_path=RECORDING_PATH
+        sample_rate=Recording.DEFAULT_SAMPLE_RATE,
+        recording_path=RECORDING_PATH,
+        mirror_path=settings.MIRROR_RECORDING_PATH,
+        replicate_to=settings.REPLICATION_TARGET or None
     )
     
+    if settings.LISTEN_ENABLED:
+        recorder.listen_tap = ListenTap(Recording.DEFAULT_SAMPLE_RATE)
+        recorder.listen_tap.start()
+        log.info("Listen-in tap publishing on udp://%s:%s", settings.LISTEN_HOST, settings.LISTEN_PORT)
+
+    # kill -USR2 <pid> samples all threads for PROFILE_SECONDS into LOG_DIR
+    profiler = SamplingProfiler(
+        settings.LOG_DIR,
+        duration=settings.PROFILE_SECONDS,
+        interval=settings.PROFILE_INTERVAL,
+        thread_names=lambda: {recorder.capture_thread_ident: "capture"},
+        prefix="controller",
+    )
+    if hasattr(signal, 'SIGUSR2'):
+        signal.signal(signal.SIGUSR2, lambda signum, frame: profiler.start())
+
+    if settings.CONTROLLER_METRICS_PORT:
+        register_metrics(recorder)
+        MetricsServer(settings.CONTROLLER_METRICS_HOST, settings.CONTROLLER_METRICS_PORT).start()
+        log.info("Metrics on http://%s:%s/metrics", settings.CONTROLLER_METRICS_HOST, settings.CONTROLLER_METRICS_PORT)
+
+    # Commands from the OSC server wake the main loop immediately
+    commands = queue.Queue()
+    if settings.OSC_ENABLED:
+        osc_server = OscControlServer(commands, save_channel_name=store.save_channel_name)
+        osc_server.start()
+        log.info("OSC control listening on udp://%s:%s", settings.OSC_HOST, settings.OSC_PORT)
+
+    if settings.REPLICATION_LISTEN:
+        start_standby_receiver(store)
+
+    def wait_for_command(timeout):
+        try:
+            action, received_at = commands.get(timeout=timeout)
+        except queue.Empty:
+            return
+        handle_command(action, received_at, recorder, store)
+
     current_recorder_instance = None
+    reported_storage_states = None
+    player = None
+
+    if isinstance(store, DatabaseStore):
+        connection.ensure_connection()
+    mark_ready()
+    # Importing the audio backend initialises PortAudio and scans the devices;
+    # list them in the background instead of delaying readiness
+    threading.Thread(target=list_audio_devices, args=(store,), name="audio-init", daemon=True).start()
     
-    print("Starting main loop to monitor recordings...")
+    log.info("Starting main loop to monitor recordings")
 
     while True:
-        recording = Recording.get_active()
-        print(recording)
+        recording = store.active()
         if not recording:
-            time.sleep(1)
-            print("No active recording found, waiting...")
+            wait_for_command(1)
             continue
 
         if recording.state == Recording.NEW:
-            print(f"Starting new recording: {recording.uuid}")
+            log.info("Starting new recording %s", recording.uuid, extra={'recording': str(recording.uuid)})
             recorder.channels = recording.channels
             recorder.audiodevice_index = recording.audiodevice_index
+            recorder.sample_rate = recording.sample_rate
+            recorder.block_size = recording.block_size
+            recorder.latency = recording.latency
             
-            # Start recording
-            success = recorder.start_recording(recording.uuid)
-            if success:
-                recording.started_at = datetime.now()
-                recording.state = Recording.RECORD
-                recording.save()
-                current_recorder_instance = recorder
-            else:
-                print("Failed to start recording")
-                recording.state = Recording.STOPPED
-                recording.save()
+            try:
+                recorder.start_recording(recording.uuid, store.channel_names(recording))
+            except Exception as e:
+                # PortAudioError, ValueError for unsupported settings, OSError from the targets;
+                # stopping the recording keeps the controller from retrying it forever
+                log.error("Failed to start recording %s: %s", recording.uuid, e, extra={'recording': str(recording.uuid)})
+                store.update(recording, state=Recording.STOPPED)
                 continue
+            store.update(recording, started_at=datetime.now(), state=Recording.RECORD)
+            current_recorder_instance = recorder
 
         elif recording.state == Recording.RECORD:
-            print("Recording in progress...")
-            # Recording is ongoing, just wait
-            time.sleep(1)
-            recording.refresh_from_db()
+            # Recording is ongoing, wait for the next poll or OSC command
+            wait_for_command(1)
+            if recorder.hardened:
+                # Automatic GC is paused; sweep the young generation here, off the audio path
+                realtime.collect_young()
+            while recorder.gaps:
+                store.add_gap(recording, **recorder.gaps.popleft())
+            health = recorder.storage_health()
+            states = [(target['role'], target['state']) for target in health]
+            if states != reported_storage_states:
+                # Reported on change only; byte counters are in the Prometheus metrics
+                store.update(recording, storage_targets=health)
+                reported_storage_states = states
+
+        elif recording.state == Recording.PLAYING:
+            if player is None:
+                log.info("Starting playback of %s", recording.uuid, extra={'recording': str(recording.uuid)})
+                try:
+                    player = start_playback(recording, store)
+                except Exception as e:
+                    # Missing or unreadable files, no outputs, PortAudioError opening the stream
+                    log.error("Playback of %s failed: %s", recording.uuid, e, extra={'recording': str(recording.uuid)})
+                    store.update(recording, state=Recording.STOPPED, playback_status={'error': str(e)})
+                    continue
+
+            # playback_request belongs to the API; only an applied seek is cleared,
+            # and only if no newer request was stored since this poll read it
+            playback_request = recording.playback_request
+            player.loop = playback_request.get('loop', False)
+            if playback_request.get('seek') is not None:
+                player.seek(playback_request['seek'])
+                store.seek_applied(recording, playback_request)
+            store.update(
+                recording,
+                playback_status={'position': player.position, 'underruns': player.underruns, 'loop': player.loop},
+            )
+
+            if player.finished:
+                log.info("Playback finished", extra={'recording': str(recording.uuid)})
+                player.stop()
+                player = None
+                store.update(recording, state=Recording.STOPPED)
+                continue
+
+            wait_for_command(1)
 
         elif recording.state == Recording.STOP:
-            print("Stopping recording")
+            log.info("Stopping %s", recording.uuid, extra={'recording': str(recording.uuid)})
+
+            if player:
+                player.stop()
+                log.info("Playback stopped after %d underruns", player.underruns, extra={'recording': str(recording.uuid)})
+                store.update(
+                    recording,
+                    playback_status={'position': player.position, 'underruns': player.underruns},
+                )
+                player = None
             
             if current_recorder_instance:
                 files_created = current_recorder_instance.stop_recording()
-                print(f"Recording stopped. Files created: {files_created}")
+                log.info("Recording stopped, %d files written", len(files_created), extra={'recording': str(recording.uuid)})
+                while current_recorder_instance.gaps:
+                    store.add_gap(recording, **current_recorder_instance.gaps.popleft())
+                indexed_target = current_recorder_instance.indexed_target
+                if indexed_target.role != PRIMARY:
+                    log.warning(
+                        "Indexing the %s copy, the primary was %s",
+                        indexed_target.role, current_recorder_instance.targets[0].state,
+                        extra={'recording': str(recording.uuid)},
+                    )
+                store.update(
+                    recording,
+                    storage_targets=current_recorder_instance.storage_health(),
+                    indexed_target=indexed_target.role,
+                )
+                store.recording_stopped(
+                    recording,
+                    current_recorder_instance.channel_files(),
+                    current_recorder_instance.digests,
+                )
             
-            recording.state = Recording.STOPPED
-            recording.save()
+            store.update(recording, state=Recording.STOPPED)
             current_recorder_instance = None
+            reported_storage_states = None
                 
 
 
@@ -1,9 +1,15 @@
 from django.contrib import admin
 
-from .models import Recording, RecordingTemplate, RecordingTemplateChannel, RecordingMarker
+from .models import Recording, RecordingTemplate, RecordingTemplateChannel, RecordingMarker, RecordingGap, RecordingFile, MixerChannelName, Job, RecordingNode, AudioDevice
 
 admin.site.register(Recording)
 admin.site.register(RecordingTemplate)
 admin.site.register(RecordingTemplateChannel)
 admin.site.register(RecordingMarker)
+admin.site.register(RecordingGap)
+admin.site.register(RecordingFile)
 
+admin.site.register(MixerChannelName)
+admin.site.register(Job)
+admin.site.register(RecordingNode)
+admin.site.register(AudioDevice)
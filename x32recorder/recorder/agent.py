@@ -0,0 +1,120 @@
+"""
+File server of a capture agent
+
+A controller running as capture agent (``CONTROLLER_SERVER_URL`` set)
+keeps its recordings on its own disk. ``AgentServer`` makes them, and the
+agent's audio devices, available to the web app, which proxies them to
+the browser:
+
+- ``GET /recordings/<uuid>/<filename>``: a channel file; ``?target=mirror``
+  reads it from the mirror directory
+- ``GET /devices``: ``query_devices()`` with the supported sample rates and
+  ``query_hostapis()`` of the backend
+
+Every request must carry the node's token (``Authorization: Token ...``).
+"""
+import hmac
+import json
+import shutil
+import threading
+import urllib.parse
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+from .audio import get_backend
+from .devices import probe_devices
+from .models import MIRROR, PRIMARY
+
+
+COPY_CHUNK_SIZE = 1024 * 1024
+
+
+class _AgentHandler(BaseHTTPRequestHandler):
+    token = ''
+    recording_path = None
+    mirror_path = None
+
+    def _authorized(self):
+        header = self.headers.get('Authorization', '')
+        return bool(self.token) and hmac.compare_digest(header, f'Token {self.token}')
+
+    def do_GET(self):
+        if not self._authorized():
+            self.send_error(401)
+            return
+
+        path, _, query = self.path.partition('?')
+        parts = path.strip('/').split('/')
+        if parts == ['devices']:
+            self.send_devices()
+        elif len(parts) == 3 and parts[0] == 'recordings':
+            target = urllib.parse.parse_qs(query).get('target', [PRIMARY])[0]
+            self.send_recording_file(parts[1], urllib.parse.unquote(parts[2]), target)
+        else:
+            self.send_error(404)
+
+    def send_devices(self):
+        sd = get_backend()
+        body = json.dumps({
+            'devices': probe_devices(sd),
+            'hostapis': [dict(hostapi) for hostapi in sd.query_hostapis()],
+        }).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_recording_file(self, recording_uuid, filename, target=PRIMARY):
+        root = self.mirror_path if target == MIRROR else self.recording_path
+        if not root:
+            self.send_error(404)
+            return
+        try:
+            directory = Path(root) / str(uuid.UUID(recording_uuid))
+        except ValueError:
+            self.send_error(404)
+            return
+        # Only plain file names inside the recording directory
+        if filename.startswith('.') or '/' in filename or '\\' in filename:
+            self.send_error(404)
+            return
+        path = directory / filename
+        try:
+            f = open(path, 'rb')
+        except OSError:
+            self.send_error(404)
+            return
+
+        with f:
+            size = path.stat().st_size
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/octet-stream')
+            self.send_header('Content-Length', str(size))
+            self.end_headers()
+            shutil.copyfileobj(f, self.wfile, COPY_CHUNK_SIZE)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class AgentServer:
+    """Serves the agent's recordings and devices from a background thread"""
+
+    def __init__(self, host, port, token, recording_path, mirror_path=None):
+        handler = type('AgentHandler', (_AgentHandler,), {
+            'token': token,
+            'recording_path': recording_path,
+            'mirror_path': mirror_path,
+        })
+        self.server = ThreadingHTTPServer((host, port), handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, name="agent-server", daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
@@ -0,0 +1,143 @@
+"""
+API for capture agents (``/api/agent/``)
+
+A controller running on another machine (``recorder.store.RemoteStore``)
+polls its active recording here and reports state changes, file metadata,
+markers and mixer channel names. Requests are authenticated with the token
+of the agent's ``RecordingNode``; an agent only ever sees its own recordings.
+"""
+import datetime
+
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.decorators import api_view, authentication_classes, permission_classes
+from rest_framework.response import Response
+
+from .files import store_recording_files
+from .models import MixerChannelName, Recording, RecordingGap, RecordingMarker, RecordingNode
+from .nodes import IsNode, NodeTokenAuthentication
+from .serializers import AgentRecordingFileSerializer, AgentRecordingSerializer
+from .store import clear_applied_seek, create_triggered_recording
+
+
+def agent_view(methods):
+    """``api_view`` restricted to requests carrying a node token"""
+    def decorator(view):
+        view = permission_classes([IsNode])(view)
+        view = authentication_classes([NodeTokenAuthentication])(view)
+        return api_view(methods)(view)
+    return decorator
+
+
+def _node_recording(request, recording_uuid):
+    return get_object_or_404(Recording, uuid=recording_uuid, node=request.auth)
+
+
+@agent_view(['GET'])
+def active_recording(request):
+    """The recording the agent should be working on, or null"""
+    node = request.auth
+    RecordingNode.objects.filter(pk=node.pk).update(last_seen=timezone.now())
+    recording = Recording.get_active(node)
+    if recording is None:
+        return Response(None)
+    return Response(AgentRecordingSerializer(recording).data)
+
+
+@agent_view(['POST'])
+def create_recording(request):
+    """Start trigger received by the agent (OSC)"""
+    if Recording.get_active(request.auth):
+        return Response(
+            {'error': 'There is already an active recording'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    recording = create_triggered_recording(node=request.auth)
+    return Response(AgentRecordingSerializer(recording).data, status=status.HTTP_201_CREATED)
+
+
+@agent_view(['PATCH'])
+def update_recording(request, recording_uuid):
+    """State transitions and playback status reported by the agent"""
+    recording = _node_recording(request, recording_uuid)
+    serializer = AgentRecordingSerializer(recording, data=request.data, partial=True)
+    serializer.is_valid(raise_exception=True)
+    serializer.save()
+    return Response(serializer.data)
+
+
+@agent_view(['POST'])
+def recording_seek_applied(request, recording_uuid):
+    """The agent applied the seek of ``playback_request``, the request as it read it"""
+    recording = _node_recording(request, recording_uuid)
+    playback_request = request.data.get('playback_request')
+    if not isinstance(playback_request, dict):
+        return Response(
+            {'error': 'playback_request must be an object'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    clear_applied_seek(recording.pk, playback_request)
+    return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+@agent_view(['POST'])
+def recording_files(request, recording_uuid):
+    """Index the channel files the agent wrote; the files stay on the agent"""
+    recording = _node_recording(request, recording_uuid)
+    serializer = AgentRecordingFileSerializer(data=request.data.get('files', []), many=True)
+    serializer.is_valid(raise_exception=True)
+    rows = store_recording_files(recording, serializer.validated_data)
+    return Response({'indexed': len(rows)}, status=status.HTTP_201_CREATED)
+
+
+@agent_view(['POST'])
+def recording_marker(request, recording_uuid):
+    recording = _node_recording(request, recording_uuid)
+    try:
+        seconds = max(0.0, float(request.data.get('seconds')))
+    except (ValueError, TypeError):
+        return Response(
+            {'error': 'seconds must be a number'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    RecordingMarker.objects.create(recording=recording, timestamp=datetime.timedelta(seconds=seconds))
+    return Response({'seconds': seconds}, status=status.HTTP_201_CREATED)
+
+
+@agent_view(['POST'])
+def recording_gap(request, recording_uuid):
+    """Audio lost while the agent's input device was gone"""
+    recording = _node_recording(request, recording_uuid)
+    try:
+        position = max(0.0, float(request.data.get('position')))
+        length = max(0.0, float(request.data.get('length')))
+    except (ValueError, TypeError):
+        return Response(
+            {'error': 'position and length must be numbers'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    RecordingGap.objects.create(
+        recording=recording,
+        position=datetime.timedelta(seconds=position),
+        length=datetime.timedelta(seconds=length),
+        padded=bool(request.data.get('padded', True)),
+        reason=str(request.data.get('reason', ''))[:64],
+    )
+    return Response(status=status.HTTP_201_CREATED)
+
+
+@agent_view(['POST'])
+def channel_name(request):
+    """Channel name reported by the mixer connected to the agent"""
+    try:
+        channel_no = int(request.data.get('channel_no'))
+    except (ValueError, TypeError):
+        return Response(
+            {'error': 'channel_no must be an integer'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    MixerChannelName.objects.update_or_create(
+        channel_no=channel_no, defaults={'name': str(request.data.get('name', ''))}
+    )
+    return Response(status=status.HTTP_204_NO_CONTENT)
@@ -0,0 +1,354 @@
+"""
+Post-stop analysis of recorded channel files
+
+All scans work on memory-mapped files in fixed-size chunks with vectorized
+NumPy, so memory use stays flat regardless of recording length.
+"""
+import functools
+import math
+import os
+from concurrent.futures import ALL_COMPLETED, FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import numpy as np
+from django.conf import settings
+from numpy.lib.stride_tricks import sliding_window_view
+
+from .files import recording_file_path
+from .wavfile import map_wave_data, map_wave_samples, pcm24_to_int32, read_wave_info
+
+
+CHUNK_SECONDS = 10
+
+# Loudness per ITU-R BS.1770-4: 400 ms gating blocks overlapping by 75 %,
+# measured as mean squares of 100 ms steps
+STEP_SECONDS = 0.1
+BLOCK_STEPS = 4
+ABSOLUTE_GATE_LUFS = -70.0
+RELATIVE_GATE_LU = -10.0
+# The K-weighting filter runs on blocks of this many samples as matrix products
+K_WEIGHTING_BLOCK = 64
+
+# True peak: 4x oversampling with a 48 tap polyphase interpolation filter
+TRUE_PEAK_OVERSAMPLING = 4
+TRUE_PEAK_TAPS = 12  # per phase
+PEAK_BLOCK_SECONDS = 0.01
+TRUE_PEAK_BATCH = 256  # blocks interpolated at once
+
+FULL_SCALE = 2**23
+CLIP_LEVEL = 2**23 - 1  # what the controller writes for a clipped input sample
+LOUDNESS_FIELDS = ('loudness', 'true_peak', 'clip_count', 'dc_offset')
+
+
+def scan_activity(path, threshold_db=None, window_seconds=None, hold_seconds=None):
+    """
+    Find the non-silent regions of a mono 24-bit channel file
+
+    The file is split into windows; a window is active when its peak level
+    reaches ``threshold_db`` (dBFS). Active windows closer together than
+    ``hold_seconds`` are merged into one region. Returns
+    ``(regions, silent)`` where regions are ``[start, end]`` pairs in seconds.
+    """
+    threshold_db = settings.SILENCE_THRESHOLD_DB if threshold_db is None else threshold_db
+    window_seconds = window_seconds or settings.SILENCE_WINDOW_SECONDS
+    hold_seconds = settings.SILENCE_HOLD_SECONDS if hold_seconds is None else hold_seconds
+
+    info = read_wave_info(path)
+    data = map_wave_data(path, info)
+    window = max(1, int(window_seconds * info.sample_rate))
+    threshold = int(10 ** (threshold_db / 20) * 2**23)
+
+    # Whole windows per chunk, so no window straddles two chunks
+    chunk = max(1, int(CHUNK_SECONDS * info.sample_rate) // window) * window
+    active = []
+    for start in range(0, info.frames, chunk):
+        samples = np.abs(pcm24_to_int32(data[start:start + chunk]))
+        full = len(samples) - len(samples) % window
+        peaks = samples[:full].reshape(-1, window).max(axis=1)
+        if full < len(samples):
+            peaks = np.append(peaks, samples[full:].max())
+        active.append(peaks >= threshold)
+
+    if not active:
+        return [], True
+    active = np.concatenate(active)
+
+    # Rising and falling edges of the activity mask, in windows
+    edges = np.diff(np.concatenate(([0], active.astype(np.int8), [0])))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+
+    regions = []
+    hold = hold_seconds / window_seconds
+    for start, end in zip(starts, ends):
+        if regions and start - regions[-1][1] <= hold:
+            regions[-1][1] = end
+        else:
+            regions.append([start, end])
+
+    duration = info.frames / info.sample_rate
+    regions = [
+        [round(float(start) * window / info.sample_rate, 3), round(min(float(end) * window / info.sample_rate, duration), 3)]
+        for start, end in regions
+    ]
+    return regions, not regions
+
+
+def analyse_activity(recording, progress=None):
+    """Scan every channel file of a recording and store its activity map"""
+    recording_files = list(recording.files.all())
+    for index, recording_file in enumerate(recording_files):
+        if progress:
+            progress(index / len(recording_files), f"Scanning {recording_file.filename}")
+        regions, silent = scan_activity(recording_file_path(recording_file))
+        recording_file.activity = regions
+        recording_file.silent = silent
+        recording_file.save(update_fields=['activity', 'silent'])
+
+
+def _biquad_step(b, a, state, value):
+    """One sample through a biquad in transposed direct form II; returns ``(state, output)``"""
+    out = b[0] * value + state[0]
+    return [b[1] * value - a[1] * out + state[1], b[2] * value - a[2] * out], out
+
+
+@functools.lru_cache()
+def k_weighting(sample_rate):
+    """
+    ``(response, to_state, from_state, transition)`` of the K-weighting
+    filter for blocks of K_WEIGHTING_BLOCK samples
+
+    The pre-filter (high shelf) and RLB high-pass of BS.1770 are derived for
+    any sample rate from their analog prototypes, as libebur128 does, and
+    cascaded into one system with four states. For a row of block inputs
+    ``x`` and the state ``s`` before the block, the outputs are
+    ``x @ response + s @ from_state`` and the state after it is
+    ``x @ to_state + s @ transition``. Filtering then takes matrix products
+    over all blocks of a chunk instead of a recursion per sample, and unlike
+    a truncated impulse response it is exact.
+    """
+    k = math.tan(math.pi * 1681.974450955533 / sample_rate)
+    q = 0.7071752369554196
+    vh = 10 ** (3.999843853973347 / 20)
+    vb = vh ** 0.4996667741545416
+    a0 = 1 + k / q + k * k
+    shelf = (
+        [(vh + vb * k / q + k * k) / a0, 2 * (k * k - vh) / a0, (vh - vb * k / q + k * k) / a0],
+        [1.0, 2 * (k * k - 1) / a0, (1 - k / q + k * k) / a0],
+    )
+    k = math.tan(math.pi * 38.13547087602444 / sample_rate)
+    q = 0.5003270373238773
+    a0 = 1 + k / q + k * k
+    high_pass = ([1.0, -2.0, 1.0], [1.0, 2 * (k * k - 1) / a0, (1 - k / q + k * k) / a0])
+
+    def step(state, value):
+        shelf_state, shelved = _biquad_step(*shelf, state[:2], value)
+        high_pass_state, out = _biquad_step(*high_pass, state[2:], shelved)
+        return np.array(shelf_state + high_pass_state), out
+
+    # State space form x' = A x + B u, y = C x + D u, read off the linear step
+    a = np.zeros((4, 4))
+    c = np.zeros(4)
+    for index in range(4):
+        a[:, index], c[index] = step(np.eye(4)[index], 0.0)
+    b, d = step(np.zeros(4), 1.0)
+
+    length = K_WEIGHTING_BLOCK
+    powers = [np.eye(4)]
+    for _ in range(length):
+        powers.append(a @ powers[-1])
+    impulse = [d] + [c @ powers[n] @ b for n in range(length - 1)]
+    response = np.zeros((length, length))
+    for n in range(length):
+        response[n, n:] = impulse[:length - n]
+    to_state = np.stack([powers[length - 1 - n] @ b for n in range(length)])
+    from_state = np.stack([c @ powers[n] for n in range(length)], axis=1)
+    return response, to_state, from_state, powers[length].T
+
+
+def _propagate(states, transition):
+    """
+    Turn ``states[1:]``, the state each block adds, into the state after
+    every block, ``states[0]`` being the state before the first: afterwards
+    ``states[m] = states[m - 1] @ transition + added[m]``. Takes log2(blocks)
+    doubling steps over the whole array instead of a loop over the blocks.
+    """
+    power = transition
+    distance = 1
+    while distance < len(states):
+        states[distance:] += states[:-distance] @ power
+        power = power @ power
+        distance *= 2
+
+
+@functools.lru_cache()
+def true_peak_filter():
+    """
+    ``(matrix, gain)`` of the interpolation filter: ``window @ matrix`` gives
+    the oversampled values after the last of TRUE_PEAK_TAPS samples, ``gain``
+    bounds them relative to the largest sample in the window
+    """
+    length = TRUE_PEAK_OVERSAMPLING * TRUE_PEAK_TAPS
+    positions = (np.arange(length) - (length - 1) / 2) / TRUE_PEAK_OVERSAMPLING
+    prototype = np.sinc(positions) * np.kaiser(length, 6.0)
+    # phases[j, p] weights the sample j positions back for phase p; unity gain per phase
+    phases = prototype.reshape(TRUE_PEAK_TAPS, TRUE_PEAK_OVERSAMPLING)
+    phases = phases / phases.sum(axis=0)
+    matrix = phases[::-1].astype(np.float32)
+    return matrix, float(np.abs(matrix).sum(axis=0).max())
+
+
+def _loudness(power):
+    return -0.691 + 10 * math.log10(power)
+
+
+def _power(loudness):
+    return 10 ** ((loudness + 0.691) / 10)
+
+
+def gated_loudness(step_power):
+    """Integrated loudness in LUFS from the mean square of every 100 ms step, None below the gate"""
+    if len(step_power) < BLOCK_STEPS:
+        return None
+    blocks = np.convolve(step_power, np.full(BLOCK_STEPS, 1 / BLOCK_STEPS), 'valid')
+    gated = blocks[blocks > _power(ABSOLUTE_GATE_LUFS)]
+    if not len(gated):
+        return None
+    relative_gate = _loudness(gated.mean()) + RELATIVE_GATE_LU
+    gated = gated[gated > _power(relative_gate)]
+    return _loudness(gated.mean())
+
+
+def true_peak(samples, block_peaks, block, sample_peak):
+    """
+    Highest oversampled magnitude of a channel, in sample units
+
+    An interpolated value is at most ``gain`` times the largest sample it is
+    computed from, so blocks are interpolated loudest first and the search
+    stops as soon as no remaining block can beat the peak found so far.
+    Usually that is a handful of blocks instead of the whole file.
+    """
+    matrix, gain = true_peak_filter()
+    history = TRUE_PEAK_TAPS - 1
+    # Values in a block also depend on the last samples of the block before it
+    bounds = gain * np.maximum(block_peaks, np.concatenate(([0], block_peaks[:-1])))
+    order = np.argsort(bounds)[::-1]
+    best = float(sample_peak)
+    frames = len(samples)
+    offsets = np.arange(block + history)
+    for first in range(0, len(order), TRUE_PEAK_BATCH):
+        batch = order[first:first + TRUE_PEAK_BATCH]
+        batch = batch[bounds[batch] > best]
+        if not len(batch):
+            break
+        index = (batch * block - history)[:, None] + offsets
+        inside = (index >= 0) & (index < frames)
+        values = np.where(inside, samples[np.clip(index, 0, frames - 1)] >> 8, 0).astype(np.float32)
+        windows = sliding_window_view(values, TRUE_PEAK_TAPS, axis=1)
+        best = max(best, float(np.abs(windows @ matrix).max()))
+    return best
+
+
+def scan_loudness(path):
+    """
+    Loudness and level statistics of a mono 24-bit channel file
+
+    Returns ``loudness`` (integrated, LUFS; None below the absolute gate),
+    ``true_peak`` (dBTP; None for digital silence), ``clip_count``
+    (samples at full scale) and ``dc_offset`` (mean sample value as a
+    fraction of full scale).
+    """
+    info = read_wave_info(path)
+    samples = map_wave_samples(path, info)
+    step = int(STEP_SECONDS * info.sample_rate)
+    block = int(PEAK_BLOCK_SECONDS * info.sample_rate)
+    response, to_state, from_state, transition = k_weighting(info.sample_rate)
+    # The inputs are scaled to full scale by the matrices instead of a pass over every chunk
+    response = (response / FULL_SCALE).astype(np.float32)
+    to_state = to_state / FULL_SCALE
+    # Whole steps and filter blocks per chunk, so neither straddles two chunks
+    unit = step * K_WEIGHTING_BLOCK // math.gcd(step, K_WEIGHTING_BLOCK)
+    chunk = max(1, CHUNK_SECONDS * info.sample_rate // unit) * unit
+
+    # Decoded samples of a chunk, padded to whole filter blocks
+    inputs = np.zeros(chunk, dtype=np.float32)
+    state = np.zeros(4)
+    step_energy = []
+    block_peaks = []
+    clip_count = 0
+    total = 0
+    for start in range(0, info.frames, chunk):
+        values = samples[start:start + chunk] >> 8
+        frames = len(values)
+
+        total += int(values.sum(dtype=np.int64))
+        filter_blocks = -(-frames // K_WEIGHTING_BLOCK)
+        inputs[:frames] = values
+        inputs[frames:filter_blocks * K_WEIGHTING_BLOCK] = 0
+        x = inputs[:filter_blocks * K_WEIGHTING_BLOCK].reshape(filter_blocks, K_WEIGHTING_BLOCK)
+        states = np.empty((filter_blocks + 1, 4))
+        states[0] = state
+        states[1:] = x @ to_state
+        _propagate(states, transition)
+        state = states[-1]
+        weighted = x @ response
+        weighted += states[:-1] @ from_state
+        weighted = weighted.reshape(-1)[:frames]
+        steps = weighted[:frames - frames % step].reshape(-1, step)
+        step_energy.append(np.einsum('ij,ij->i', steps, steps))
+
+        magnitude = np.abs(values, out=values)
+        clip_count += int(np.count_nonzero(magnitude >= CLIP_LEVEL))
+        full = frames - frames % block
+        block_peaks.append(magnitude[:full].reshape(-1, block).max(axis=1))
+        if full < frames:
+            block_peaks.append(magnitude[full:].max(keepdims=True))
+
+    if not block_peaks:
+        return {'loudness': None, 'true_peak': None, 'clip_count': 0, 'dc_offset': 0.0}
+
+    block_peaks = np.concatenate(block_peaks)
+    loudness = gated_loudness(np.concatenate(step_energy).astype(np.float64) / step)
+    peak = true_peak(samples, block_peaks, block, block_peaks.max())
+    return {
+        'loudness': None if loudness is None else round(loudness, 2),
+        'true_peak': round(20 * math.log10(peak / FULL_SCALE), 2) if peak else None,
+        'clip_count': clip_count,
+        'dc_offset': total / info.frames / FULL_SCALE,
+    }
+
+
+def analyse_loudness(recording, progress=None, workers=None):
+    """
+    Measure every channel file of a recording and store the results
+
+    Files are scanned in parallel threads; the matrix products and array
+    operations release the GIL, so this scales with the number of cores.
+    At most ``workers`` files are in flight and ``progress`` is called
+    before each one is handed out, so a job paused while recording stops
+    scanning once the files in flight are done.
+    """
+    recording_files = list(recording.files.all())
+    workers = workers or settings.LOUDNESS_WORKERS or os.cpu_count()
+    pending = {}
+    done = 0
+
+    def collect(return_when):
+        nonlocal done
+        finished, _ = wait(pending, return_when=return_when)
+        for future in finished:
+            recording_file = pending.pop(future)
+            for name, value in future.result().items():
+                setattr(recording_file, name, value)
+            recording_file.save(update_fields=list(LOUDNESS_FIELDS))
+            done += 1
+            if progress:
+                progress(done / len(recording_files), f"Measured {recording_file.filename}")
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for recording_file in recording_files:
+            if len(pending) >= workers:
+                collect(FIRST_COMPLETED)
+            if progress:
+                progress(done / len(recording_files))
+            pending[pool.submit(scan_loudness, recording_file_path(recording_file))] = recording_file
+        collect(ALL_COMPLETED)
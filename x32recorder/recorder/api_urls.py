@@ -4,18 +4,34 @@ from .api_views import (
     RecordingViewSet,
     RecordingTemplateViewSet,
     RecordingTemplateChannelViewSet,
+    MixerChannelNameViewSet,
+    JobViewSet,
+    RecordingNodeViewSet,
     audiodevice_list,
 )
+from . import agent_api
 
 # Create a router and register our viewsets with it
 router = DefaultRouter()
 router.register(r'recordings', RecordingViewSet, basename='recording')
 router.register(r'templates', RecordingTemplateViewSet, basename='recordingtemplate')
 router.register(r'template-channels', RecordingTemplateChannelViewSet, basename='recordingtemplatechannel')
+router.register(r'mixer-channels', MixerChannelNameViewSet, basename='mixerchannelname')
+router.register(r'jobs', JobViewSet, basename='job')
+router.register(r'nodes', RecordingNodeViewSet, basename='recordingnode')
 
 # The API URLs are now determined automatically by the router
 urlpatterns = [
     path('', include(router.urls)),
     # Custom API endpoints as specified in API.md
     path('audiodevice/', audiodevice_list, name='audiodevice-list'),
+    # Capture agents (controllers on other machines), token authenticated
+    path('agent/active/', agent_api.active_recording, name='agent-active'),
+    path('agent/recordings/', agent_api.create_recording, name='agent-recording-create'),
+    path('agent/recordings/<uuid:recording_uuid>/', agent_api.update_recording, name='agent-recording'),
+    path('agent/recordings/<uuid:recording_uuid>/seek-applied/', agent_api.recording_seek_applied, name='agent-recording-seek-applied'),
+    path('agent/recordings/<uuid:recording_uuid>/files/', agent_api.recording_files, name='agent-recording-files'),
+    path('agent/recordings/<uuid:recording_uuid>/markers/', agent_api.recording_marker, name='agent-recording-markers'),
+    path('agent/recordings/<uuid:recording_uuid>/gaps/', agent_api.recording_gap, name='agent-recording-gaps'),
+    path('agent/channel-names/', agent_api.channel_name, name='agent-channel-names'),
 ]
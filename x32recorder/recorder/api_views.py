@@ -1,36 +1,97 @@
 from rest_framework import viewsets, status
 from rest_framework.decorators import action, api_view
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
 from django.http import StreamingHttpResponse
 from django.conf import settings
-from .models import Recording, RecordingTemplate, RecordingTemplateChannel, RecordingMarker
+from .models import (
+    AudioDevice,
+    Job,
+    MixerChannelName,
+    Recording,
+    RecordingTemplate,
+    RecordingTemplateChannel,
+    RecordingMarker,
+    RecordingNode,
+)
+from .audio import get_backend
+from .changes import ConditionalGetMixin, bump_version
+from .devices import cache_devices, cached_devices, probe_devices, validate_stream_settings
+from .archive import stream_zip
+from .archive_cache import archive_entries, open_cached_archive
+from .export import export_regions_to_folder, region_archive_entries
+from .files import recording_file_path
+from .http import ranged_file_response
+from .jobs import enqueue
+from .nodes import NodeUnavailable, node_devices, remote_archive_entries
+from .profiling import ServerTimingMixin
+from .search import InvalidFilter, archive_stats, filter_recordings
 from .serializers import (
+    JobSerializer,
+    MixerChannelNameSerializer,
+    RecordingNodeSerializer,
     RecordingSerializer,
     RecordingTemplateSerializer,
     RecordingTemplateChannelSerializer
 )
 import datetime
-import sounddevice as sd
+import math
 from pprint import pprint
 import os
-import zipfile
-from pathlib import Path
 
 
-class RecordingViewSet(viewsets.ModelViewSet):
+def _stream_setting(data, template, name, cast):
+    """A stream setting from the request, falling back to the template's"""
+    value = data.get(name)
+    if value is None and template is not None:
+        value = getattr(template, name)
+    return cast(value) if value is not None else None
+
+
+class RecordingViewSet(ServerTimingMixin, ConditionalGetMixin, viewsets.ModelViewSet):
     """
     ViewSet for Recording model providing full CRUD operations
     """
-    queryset = Recording.objects.all().order_by('-date')
+    queryset = Recording.objects.all().prefetch_related('files', 'gaps').order_by('-date')
     serializer_class = RecordingSerializer
 
+    def get_queryset(self):
+        """
+        Filter and order the list by the archive search parameters
+        (``recorder.search.filter_recordings``)
+        """
+        queryset = super().get_queryset()
+        if self.action not in ('list', 'stats'):
+            return queryset
+        try:
+            return filter_recordings(queryset, self.request.query_params)
+        except InvalidFilter as e:
+            raise ValidationError({'error': str(e)})
+
+    @action(detail=False, methods=['get'])
+    def stats(self, request):
+        """Recordings, hours and bytes in total and per month, for the same filters as the list"""
+        def handler(request):
+            return Response(archive_stats(self.get_queryset()))
+        return self._conditional(request, handler)
+
     @action(detail=False, methods=['post'])
     def start(self, request):
-        """Start a new recording"""
+        """Start a new recording, on a capture agent if ``node`` is given"""
+        node = None
+        if request.data.get('node') is not None:
+            try:
+                node = RecordingNode.objects.get(pk=request.data['node'])
+            except (RecordingNode.DoesNotExist, ValueError, TypeError):
+                return Response(
+                    {'error': 'Unknown node'}, 
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
         # Check if there's already an active recording
-        if Recording.get_active():
+        if Recording.get_active(node):
             return Response(
                 {'error': 'There is already an active recording'}, 
                 status=status.HTTP_400_BAD_REQUEST
@@ -57,13 +118,45 @@ class RecordingViewSet(viewsets.ModelViewSet):
                 {'error': 'All channel values must be integers'}, 
                 status=status.HTTP_400_BAD_REQUEST
             )
+
+        template = None
+        if template_id is not None:
+            try:
+                template = RecordingTemplate.objects.get(pk=template_id)
+            except (RecordingTemplate.DoesNotExist, ValueError, TypeError):
+                return Response(
+                    {'error': 'Unknown template'}, 
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+        # Request, then template, then the defaults
+        try:
+            sample_rate = _stream_setting(request.data, template, 'sample_rate', int) or Recording.DEFAULT_SAMPLE_RATE
+            block_size = _stream_setting(request.data, template, 'block_size', int) or Recording.DEFAULT_BLOCK_SIZE
+            latency = _stream_setting(request.data, template, 'latency', float)
+        except (ValueError, TypeError):
+            return Response(
+                {'error': 'sample_rate, block_size and latency must be numbers'}, 
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        device = AudioDevice.objects.filter(node=node, index=audiodevice_index).first()
+        errors = validate_stream_settings(sample_rate, block_size, latency, device, channels)
+        if errors:
+            return Response(
+                {'error': '; '.join(f'{field}: {message}' for field, message in errors.items())}, 
+                status=status.HTTP_400_BAD_REQUEST
+            )
         
         recording = Recording.objects.create(
             name=name,
             channels=channels,
             state=Recording.NEW,
             audiodevice_index=audiodevice_index,
-            template_id=template_id
+            sample_rate=sample_rate,
+            block_size=block_size,
+            latency=latency,
+            template=template,
+            node=node
         )
         
         serializer = self.get_serializer(recording)
@@ -99,12 +192,72 @@ class RecordingViewSet(viewsets.ModelViewSet):
             status=status.HTTP_201_CREATED
         )
 
+    @action(detail=True, methods=['post'])
+    def play(self, request, pk=None):
+        """Play a stopped recording back to the output channels of its device"""
+        recording = self.get_object()
+
+        if Recording.get_active(recording.node):
+            return Response(
+                {'error': 'There is already an active recording'}, 
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        if recording.state != Recording.STOPPED or not recording.files.exists():
+            return Response(
+                {'error': 'Recording has no files to play'}, 
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            position = float(request.data.get('position', 0))
+        except (ValueError, TypeError):
+            return Response(
+                {'error': 'position must be a number of seconds'}, 
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        recording.playback_request = {'loop': bool(request.data.get('loop', False)), 'seek': position}
+        recording.playback_status = {}
+        recording.state = Recording.PLAYING
+        recording.save()
+
+        serializer = self.get_serializer(recording)
+        return Response(serializer.data)
+
+    @action(detail=True, methods=['post'])
+    def seek(self, request, pk=None):
+        """Change position or looping of a recording that is playing"""
+        recording = self.get_object()
+
+        if recording.state != Recording.PLAYING:
+            return Response(
+                {'error': 'Recording is not playing'}, 
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        playback_request = dict(recording.playback_request)
+        if 'position' in request.data:
+            try:
+                playback_request['seek'] = float(request.data['position'])
+            except (ValueError, TypeError):
+                return Response(
+                    {'error': 'position must be a number of seconds'}, 
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+        if 'loop' in request.data:
+            playback_request['loop'] = bool(request.data['loop'])
+
+        Recording.objects.filter(pk=recording.pk).update(playback_request=playback_request)
+        bump_version()
+        return Response({'playback_request': playback_request})
+
     @action(detail=True, methods=['post'])
     def stop(self, request, pk=None):
-        """Stop a specific recording"""
+        """Stop a specific recording or its playback"""
         recording = self.get_object()
         
-        if recording.state not in [Recording.NEW, Recording.RECORD]:
+        if recording.state not in [Recording.NEW, Recording.RECORD, Recording.PLAYING]:
             return Response(
                 {'error': 'Recording is not active'}, 
                 status=status.HTTP_400_BAD_REQUEST
@@ -121,53 +274,43 @@ class RecordingViewSet(viewsets.ModelViewSet):
         """Download recording files as a ZIP archive"""
         recording = self.get_object()
         
-        # Get the recordings directory from settings or use default
-        recordings_dir = os.path.join(settings.RECORDING_PATH, str(recording.uuid))
-        
-        recording_dir = Path(recordings_dir)
-        
-        # Find all files that match this recording
-        matching_files = []
-        if recording_dir.exists():
-            # Look for files starting with the recording name
-            for file_path in recording_dir.iterdir():
-                if file_path.is_file():
-                    matching_files.append(file_path)
+        # Served from the file index written by the controller, no directory scan
+        recording_files = list(recording.files.all())
+        complete = True
+        if request.query_params.get('skip_silent') in ('1', 'true'):
+            complete = not any(f.silent for f in recording_files)
+            recording_files = [f for f in recording_files if not f.silent]
         
-        if not matching_files:
+        if not recording_files:
             return Response(
                 {'error': 'Recording files not found'}, 
                 status=status.HTTP_404_NOT_FOUND
             )
         
-        # Create a generator function for streaming ZIP
-        def zip_generator():
-            """Generator that yields ZIP file chunks"""
-            import io
-            
-            # Create an in-memory buffer for the ZIP
-            zip_buffer = io.BytesIO()
-            
-            with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
-                # Add all matching files
-                for file_path in matching_files:
-                    zip_file.write(file_path, file_path.name)
-            
-            # Get the ZIP data
-            zip_buffer.seek(0)
-            
-            # Yield the ZIP file in chunks
-            chunk_size = 8192
-            while True:
-                chunk = zip_buffer.read(chunk_size)
-                if not chunk:
-                    break
-                yield chunk
-        
-        # Create the streaming response
         zip_filename = f"{recording.name or recording.uuid}.zip"
+
+        if recording.node is not None:
+            # The files stay on the capture agent; pass them through without caching
+            response = StreamingHttpResponse(
+                stream_zip(remote_archive_entries(recording_files)),
+                content_type='application/zip'
+            )
+            response['Content-Disposition'] = f'attachment; filename="{zip_filename}"'
+            return response
+
+        # Prebuilt by the build_archive job after the recording stopped
+        archive, etag = open_cached_archive(recording, recording_files)
+        if archive is not None:
+            return ranged_file_response(request, archive, etag, 'application/zip', zip_filename)
+
+        if complete and recording.state == Recording.STOPPED and not recording.jobs.filter(
+            kind='build_archive', state__in=[Job.QUEUED, Job.RUNNING]
+        ).exists():
+            enqueue('build_archive', recording)
+
+        # Not cached (yet): stream the archive while it is being built
         response = StreamingHttpResponse(
-            zip_generator(),
+            stream_zip(archive_entries(recording_files)),
             content_type='application/zip'
         )
         response['Content-Disposition'] = f'attachment; filename="{zip_filename}"'
@@ -175,15 +318,132 @@ class RecordingViewSet(viewsets.ModelViewSet):
         return response
 
 
-class RecordingTemplateViewSet(viewsets.ModelViewSet):
+    @action(detail=True, methods=['get'], url_path='slice')
+    def slice_audio(self, request, pk=None):
+        """
+        Return channels and a time range of the recording as one WAV file,
+        e.g. ?channels=1-4&start=90&end=120 (seconds)
+        """
+        # NumPy-based, loaded on first use to keep the web app's startup light
+        from .slicing import RecordingSlice, parse_channel_selection
+
+        recording = self.get_object()
+        if recording.node is not None:
+            return self._files_on_node(recording)
+
+        try:
+            channels = parse_channel_selection(request.query_params.get('channels', ''))
+        except ValueError as e:
+            return Response(
+                {'error': f'channels must look like "1-4" or "1,3": {e}'}, 
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            start = float(request.query_params.get('start', 0))
+            end = request.query_params.get('end')
+            end = float(end) if end is not None else None
+            if not math.isfinite(start) or (end is not None and not math.isfinite(end)):
+                raise ValueError
+        except ValueError:
+            return Response(
+                {'error': 'start and end must be seconds'}, 
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        recording_files = {f.channel_no: f for f in recording.files.all() if f.segment == 0}
+        if not channels:
+            channels = sorted(recording_files)
+        missing = [channel for channel in channels if channel not in recording_files]
+        if missing or not channels:
+            return Response(
+                {'error': f'Channels not recorded: {missing}' if missing else 'Recording files not found'}, 
+                status=status.HTTP_404_NOT_FOUND
+            )
+
+        audio_slice = RecordingSlice([recording_files[channel] for channel in channels], start, end)
+
+        filename = f"{recording.name or recording.uuid}_{start:g}-{audio_slice.end_frame / audio_slice.sample_rate:g}.wav"
+        response = StreamingHttpResponse(audio_slice.chunks(), content_type='audio/wav')
+        response['Content-Length'] = str(audio_slice.size)
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+
+    @action(detail=True, methods=['get', 'post'])
+    def export_regions(self, request, pk=None):
+        """
+        Cut the recording into one part per region between markers.
+        GET streams a ZIP with a folder per region, POST writes the folders
+        next to the channel files.
+        """
+        recording = self.get_object()
+        if recording.node is not None:
+            return self._files_on_node(recording)
+
+        skip_silent = request.query_params.get('skip_silent') in ('1', 'true')
+        recording_files = recording.files.filter(segment=0)
+        if skip_silent:
+            recording_files = recording_files.exclude(silent=True)
+        if recording.state != Recording.STOPPED or not recording_files.exists():
+            return Response(
+                {'error': 'Recording files not found'}, 
+                status=status.HTTP_404_NOT_FOUND
+            )
+
+        if request.method == 'POST':
+            folders = export_regions_to_folder(recording, skip_silent=skip_silent)
+            return Response(
+                {'regions': [str(folder) for folder in folders]}, 
+                status=status.HTTP_201_CREATED
+            )
+
+        zip_filename = f"{recording.name or recording.uuid}_regions.zip"
+        response = StreamingHttpResponse(
+            stream_zip(region_archive_entries(recording, skip_silent)),
+            content_type='application/zip'
+        )
+        response['Content-Disposition'] = f'attachment; filename="{zip_filename}"'
+        return response
+
+    def _files_on_node(self, recording):
+        return Response(
+            {'error': f'The files of this recording are on node {recording.node}; only the download is available'}, 
+            status=status.HTTP_409_CONFLICT
+        )
+
+
+class RecordingTemplateViewSet(ServerTimingMixin, ConditionalGetMixin, viewsets.ModelViewSet):
     """
     ViewSet for RecordingTemplate model providing full CRUD operations
     """
     queryset = RecordingTemplate.objects.all().order_by('name')
     serializer_class = RecordingTemplateSerializer
 
+    @action(detail=True, methods=['post'])
+    def prefill_channels(self, request, pk=None):
+        """Fill the template's channel names from the names cached from the mixer"""
+        template = self.get_object()
+
+        names = dict(
+            MixerChannelName.objects.filter(channel_no__lte=template.channel_count)
+            .exclude(name='')
+            .values_list('channel_no', 'name')
+        )
+        if not names:
+            return Response(
+                {'error': 'No channel names received from the mixer yet'}, 
+                status=status.HTTP_404_NOT_FOUND
+            )
 
-class RecordingTemplateChannelViewSet(viewsets.ModelViewSet):
+        for channel_no, name in names.items():
+            RecordingTemplateChannel.objects.update_or_create(
+                template=template, channel_no=channel_no, defaults={'name': name}
+            )
+
+        serializer = self.get_serializer(template)
+        return Response(serializer.data)
+
+
+class RecordingTemplateChannelViewSet(ServerTimingMixin, ConditionalGetMixin, viewsets.ModelViewSet):
     """
     ViewSet for RecordingTemplateChannel model providing full CRUD operations
     """
@@ -200,20 +460,87 @@ class RecordingTemplateChannelViewSet(viewsets.ModelViewSet):
             queryset = queryset.filter(template=template_id)
         return queryset.order_by('template', 'channel_no')
 
+class MixerChannelNameViewSet(ServerTimingMixin, viewsets.ReadOnlyModelViewSet):
+    """
+    ViewSet listing the channel names the controller cached from the mixer
+    """
+    queryset = MixerChannelName.objects.all().order_by('channel_no')
+    serializer_class = MixerChannelNameSerializer
+
+
+class RecordingNodeViewSet(ServerTimingMixin, viewsets.ReadOnlyModelViewSet):
+    """
+    ViewSet listing the capture agents; nodes are added with manage.py add_node
+    """
+    queryset = RecordingNode.objects.all().order_by('name')
+    serializer_class = RecordingNodeSerializer
+
+
+class JobViewSet(ServerTimingMixin, viewsets.ReadOnlyModelViewSet):
+    """
+    ViewSet listing background jobs and their progress
+    """
+    queryset = Job.objects.all().order_by('-created_at')
+    serializer_class = JobSerializer
+
+    def get_queryset(self):
+        """
+        Optionally filter jobs by recording and state
+        """
+        queryset = Job.objects.all()
+        recording_id = self.request.query_params.get('recording', None)
+        if recording_id is not None:
+            queryset = queryset.filter(recording=recording_id)
+        state = self.request.query_params.get('state', None)
+        if state is not None:
+            queryset = queryset.filter(state=state)
+        return queryset.order_by('-created_at')
+
+
 @api_view(['GET'])
 def audiodevice_list(request):
-    """List available audio devices"""
+    """
+    List available audio devices, of a capture agent with ?node=<id>. The
+    cached devices are served unless ?refresh=1 is given or the cache is stale.
+    """
     try:
-        devices = sd.query_devices()
-        hostapis = sd.query_hostapis()
+        node_id = request.query_params.get('node')
+        node = None
+        if node_id is not None:
+            try:
+                node = RecordingNode.objects.get(pk=node_id)
+            except (RecordingNode.DoesNotExist, ValueError):
+                return Response(
+                    {'error': 'Unknown node'}, 
+                    status=status.HTTP_404_NOT_FOUND
+                )
+
+        devices = None
+        if request.query_params.get('refresh') != '1':
+            devices = cached_devices(node)
+        if devices is None:
+            if node is not None:
+                try:
+                    probed, hostapis = node_devices(node)
+                except NodeUnavailable as e:
+                    return Response(
+                        {'error': f'Node not reachable: {e}'}, 
+                        status=status.HTTP_502_BAD_GATEWAY
+                    )
+            else:
+                sd = get_backend()
+                probed = probe_devices(sd)
+                hostapis = sd.query_hostapis()
+            # Starting a recording validates its stream settings against this cache
+            cache_devices(probed, hostapis, node)
+            devices = list(AudioDevice.objects.filter(node=node))
         device_dict = {}
         
         for device in devices:
-            if device['max_input_channels'] > 0:  # Only input devices
-                device_index = device['index']
-                device_name = device['name']
-                hostapi_index = device['hostapi']
-                hostapi_name = hostapis[hostapi_index]['name']
+            if device.max_input_channels > 0:  # Only input devices
+                device_index = device.index
+                device_name = device.name
+                hostapi_name = device.hostapi
                 
                 # Normalize device name for comparison (remove extra spaces, parentheses variations)
                 base_name = device_name.split('(')[0].strip()
@@ -235,9 +562,11 @@ def audiodevice_list(request):
                     device_dict[base_name] = {
                         'name': f"{device_name} [{hostapi_name}]",
                         'identifier': f"sounddevice:{device_index}",
-                        'input_channel_count': device['max_input_channels'],
+                        'input_channel_count': device.max_input_channels,
                         'index': device_index,
                         'hostapi': hostapi_name,
+                        'sample_rates': device.sample_rates,
+                        'default_samplerate': device.default_samplerate,
                         'priority': current_priority
                     }
                 else:
@@ -246,9 +575,11 @@ def audiodevice_list(request):
                         device_dict[base_name] = {
                             'name': f"{device_name} [{hostapi_name}]",
                             'identifier': f"sounddevice:{device_index}",
-                            'input_channel_count': device['max_input_channels'],
+                            'input_channel_count': device.max_input_channels,
                             'index': device_index,
                             'hostapi': hostapi_name,
+                            'sample_rates': device.sample_rates,
+                            'default_samplerate': device.default_samplerate,
                             'priority': current_priority
                         }
         
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class RecorderConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'recorder'
+
+    def ready(self):
+        # Connects the signal handlers bumping the API change version
+        from . import changes  # noqa: F401
@@ -0,0 +1,46 @@
+"""
+Streaming ZIP archives
+
+``stream_zip`` yields the archive while it is being written, so a response
+can start sending before the last file has been read and nothing has to be
+held in memory.
+"""
+import io
+import zipfile
+
+
+class _StreamBuffer(io.RawIOBase):
+    """Write-only, unseekable sink that collects what zipfile writes"""
+
+    def __init__(self):
+        self.chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def take(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def stream_zip(entries, compression=zipfile.ZIP_STORED):
+    """
+    Yield a ZIP archive built from ``(arcname, chunks)`` entries, where
+    ``chunks`` is an iterable of bytes-like objects
+    """
+    buffer = _StreamBuffer()
+    with zipfile.ZipFile(buffer, 'w', compression, allowZip64=True) as archive:
+        for arcname, chunks in entries:
+            with archive.open(arcname, 'w', force_zip64=True) as member:
+                for chunk in chunks:
+                    member.write(chunk)
+                    data = buffer.take()
+                    if data:
+                        yield data
+            yield buffer.take()
+    yield buffer.take()
@@ -0,0 +1,113 @@
+"""
+Prebuilt download archives
+
+After a recording stops, a ``build_archive`` job writes the ZIP of all
+channel files once into ``ARCHIVE_CACHE_PATH``. The archive name carries an
+ETag derived from the file index (names, sizes, digests), so any change to
+the indexed files invalidates it without further bookkeeping. Archives are
+evicted least recently served first (by mtime) when the cache grows beyond
+``ARCHIVE_CACHE_BUDGET`` bytes.
+"""
+import hashlib
+import os
+from pathlib import Path
+
+from django.conf import settings
+
+from .archive import stream_zip
+from .files import evict_least_recently_used, recording_file_path, touch
+
+
+READ_CHUNK_SIZE = 1024 * 1024
+
+
+def cache_directory():
+    return Path(settings.ARCHIVE_CACHE_PATH)
+
+
+def archive_etag(recording_files):
+    """Fingerprint of the indexed files that make up an archive"""
+    digest = hashlib.blake2b(digest_size=16)
+    for recording_file in sorted(recording_files, key=lambda f: f.filename):
+        digest.update(
+            f"{recording_file.filename}\0{recording_file.size}\0"
+            f"{recording_file.blake2b or recording_file.frames}\n".encode()
+        )
+    return digest.hexdigest()
+
+
+def cached_archive_path(recording, etag):
+    return cache_directory() / f"{recording.uuid}-{etag}.zip"
+
+
+def file_chunks(path, chunk_size=READ_CHUNK_SIZE):
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+
+def archive_entries(recording_files):
+    """``(arcname, chunks)`` entries with one member per channel file"""
+    for recording_file in recording_files:
+        yield recording_file.filename, file_chunks(recording_file_path(recording_file))
+
+
+def open_cached_archive(recording, recording_files):
+    """
+    Return ``(file, etag)`` of a current cached archive opened for reading,
+    or ``(None, etag)``. The open file stays readable even if a concurrent
+    eviction deletes the archive while it is being served.
+    """
+    etag = archive_etag(recording_files)
+    path = cached_archive_path(recording, etag)
+    try:
+        archive = open(path, 'rb')
+    except FileNotFoundError:
+        return None, etag
+    touch(path)
+    return archive, etag
+
+
+def build_archive(recording, progress=None):
+    """Write the archive of all indexed files and return its path"""
+    recording_files = list(recording.files.all())
+    etag = archive_etag(recording_files)
+    path = cached_archive_path(recording, etag)
+    if path.exists():
+        return path
+
+    cache_directory().mkdir(parents=True, exist_ok=True)
+    total = sum(f.size for f in recording_files) or 1
+    written = 0
+    tmp_path = path.with_suffix('.tmp')
+    try:
+        with open(tmp_path, 'wb') as f:
+            for chunk in stream_zip(archive_entries(recording_files)):
+                f.write(chunk)
+                written += len(chunk)
+                if progress:
+                    progress(written / total, f"{written // (1024 * 1024)} MiB written")
+        os.replace(tmp_path, path)
+    finally:
+        if tmp_path.exists():
+            tmp_path.unlink()
+
+    discard_archives(recording, keep=path)
+    evict_archives(keep=path)
+    return path
+
+
+def discard_archives(recording, keep=None):
+    """Remove outdated archives of a recording"""
+    for path in cache_directory().glob(f"{recording.uuid}-*.zip"):
+        if path != keep:
+            path.unlink(missing_ok=True)
+
+
+def evict_archives(budget=None, keep=None):
+    """Delete least recently used archives until the cache fits the budget"""
+    budget = settings.ARCHIVE_CACHE_BUDGET if budget is None else budget
+    return evict_least_recently_used(cache_directory().glob('*.zip'), budget, keep=keep)
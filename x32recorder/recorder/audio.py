@@ -0,0 +1,35 @@
+"""
+Audio backend selection
+
+The API and the controller talk to the audio hardware through the object
+returned by ``get_backend()``. With ``AUDIO_BACKEND = "sounddevice"`` that is
+the sounddevice module itself; ``"fake"`` returns an in-process stand-in
+that generates test tones, so the whole stack can run without PortAudio or
+an X32 attached (load tests, CI, development laptops).
+
+Both are imported on first use only: importing sounddevice initialises
+PortAudio and scans the devices, which web requests serving JSON and the
+controller's startup should not wait for.
+"""
+from django.conf import settings
+
+
+def get_backend():
+    """Return the configured audio backend"""
+    if settings.AUDIO_BACKEND == 'fake':
+        from .fake_audio import fake_backend
+        return fake_backend
+
+    import sounddevice as sd
+    return sd
+
+
+def rescan_devices(backend):
+    """
+    Make PortAudio scan the devices again, e.g. after a USB interface
+    dropped off the bus; sounddevice only offers this through its private
+    terminate/initialize pair. Device indexes may change afterwards.
+    """
+    if hasattr(backend, '_terminate'):
+        backend._terminate()
+        backend._initialize()
@@ -0,0 +1,94 @@
+"""
+Change version and conditional GET for the API
+
+Every write to a recording, its files, markers and gaps, or a template bumps a
+single ``ChangeVersion`` row: through ``post_save``/``post_delete`` signals
+for model writes, and through an explicit ``bump_version()`` next to
+``QuerySet.update()`` calls, which send no signals. The row lives in the
+database, so writes by the controller and the job worker count as well.
+
+``ConditionalGetMixin`` derives ETag and Last-Modified of list and detail
+responses from that version. A poll with a matching ``If-None-Match`` is
+answered with 304 after one primary-key lookup, without querying or
+serializing the recordings.
+"""
+import hashlib
+
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
+
+from .models import (
+    ChangeVersion,
+    Recording,
+    RecordingFile,
+    RecordingGap,
+    RecordingMarker,
+    RecordingTemplate,
+    RecordingTemplateChannel,
+)
+
+
+VERSIONED_MODELS = (
+    Recording,
+    RecordingFile,
+    RecordingGap,
+    RecordingMarker,
+    RecordingTemplate,
+    RecordingTemplateChannel,
+)
+
+
+def bump_version():
+    """Invalidate the ETags of all versioned API responses"""
+    if not ChangeVersion.objects.filter(pk=1).update(version=F('version') + 1, changed_at=timezone.now()):
+        ChangeVersion.objects.get_or_create(pk=1, defaults={'version': 1})
+
+
+def current_version():
+    """``(version, changed_at)``; changed_at is None before the first write"""
+    row = ChangeVersion.objects.filter(pk=1).values_list('version', 'changed_at').first()
+    return row or (0, None)
+
+
+@receiver(post_save)
+@receiver(post_delete)
+def bump_version_on_write(sender, **kwargs):
+    if sender in VERSIONED_MODELS:
+        bump_version()
+
+
+class ConditionalGetMixin:
+    """ViewSet mixin answering unchanged list and detail requests with 304"""
+
+    def _validators(self, request):
+        version, changed_at = current_version()
+        # Query string and Accept select different representations of the same version
+        variant = hashlib.blake2b(
+            f"{request.get_full_path()}|{request.headers.get('Accept', '')}".encode(), digest_size=8
+        ).hexdigest()
+        return f'W/"{version}-{variant}"', changed_at
+
+    def _conditional(self, request, handler, *args, **kwargs):
+        etag, last_modified = self._validators(request)
+        last_modified = int(last_modified.timestamp()) if last_modified else None
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = handler(request, *args, **kwargs)
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+            if last_modified is not None:
+                response['Last-Modified'] = http_date(last_modified)
+            # Cacheable, but revalidated on every poll
+            patch_cache_control(response, no_cache=True)
+            patch_vary_headers(response, ('Accept',))
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self._conditional(request, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self._conditional(request, super().retrieve, *args, **kwargs)
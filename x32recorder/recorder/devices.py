@@ -0,0 +1,93 @@
+"""
+Input device capabilities and stream settings
+
+Sample rate, block size and PortAudio latency are chosen per recording
+(or template). The controller at startup, a capture agent's ``/devices``
+and the API probe the devices and cache their capabilities in
+``AudioDevice``, so starting a recording can validate its settings without
+touching PortAudio in the web process. The API only probes again on an
+explicit refresh or once the cache is older than ``AUDIO_DEVICE_CACHE_SECONDS``.
+"""
+import datetime
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import AudioDevice
+
+
+SAMPLE_RATES = (44100, 48000, 88200, 96000)
+# Powers of two PortAudio handles on every host API
+BLOCK_SIZES = (64, 128, 256, 512, 1024, 2048, 4096)
+MAX_LATENCY = 1.0  # seconds
+
+
+def probe_devices(backend):
+    """``query_devices()`` with the supported sample rates of every input device"""
+    devices = []
+    for device in backend.query_devices():
+        device = dict(device)
+        device['sample_rates'] = []
+        if device['max_input_channels'] > 0:
+            for sample_rate in SAMPLE_RATES:
+                try:
+                    backend.check_input_settings(device=device['index'], samplerate=sample_rate)
+                except Exception:
+                    # PortAudioError or ValueError: not supported by this device
+                    continue
+                device['sample_rates'].append(sample_rate)
+        devices.append(device)
+    return devices
+
+
+def cache_devices(devices, hostapis, node=None):
+    """Store the capabilities of the input devices of the controller or a node"""
+    seen = []
+    for device in devices:
+        if device['max_input_channels'] <= 0:
+            continue
+        AudioDevice.objects.update_or_create(
+            node=node,
+            index=device['index'],
+            defaults={
+                'name': device['name'],
+                'hostapi': hostapis[device['hostapi']]['name'],
+                'max_input_channels': device['max_input_channels'],
+                'default_samplerate': device['default_samplerate'],
+                'default_low_input_latency': device['default_low_input_latency'],
+                'default_high_input_latency': device['default_high_input_latency'],
+                # Absent when an agent of an older version reported them
+                'sample_rates': device.get('sample_rates', []),
+            },
+        )
+        seen.append(device['index'])
+    # Indexes shift when interfaces are plugged in or out
+    AudioDevice.objects.filter(node=node).exclude(index__in=seen).delete()
+
+
+def cached_devices(node=None):
+    """Cached ``AudioDevice`` rows of the controller or a node, None if missing or stale"""
+    devices = list(AudioDevice.objects.filter(node=node))
+    cutoff = timezone.now() - datetime.timedelta(seconds=settings.AUDIO_DEVICE_CACHE_SECONDS)
+    if not devices or min(device.updated_at for device in devices) < cutoff:
+        return None
+    return devices
+
+
+def validate_stream_settings(sample_rate, block_size, latency, device=None, channels=()):
+    """
+    Errors per field for the given settings, empty if they are usable.
+    ``device`` is the cached ``AudioDevice`` to check against, if known.
+    """
+    errors = {}
+    if sample_rate is not None:
+        supported = (device.sample_rates if device is not None and device.sample_rates else SAMPLE_RATES)
+        if sample_rate not in supported:
+            errors['sample_rate'] = f"Must be one of {', '.join(map(str, supported))}"
+    if block_size is not None and block_size not in BLOCK_SIZES:
+        errors['block_size'] = f"Must be one of {', '.join(map(str, BLOCK_SIZES))}"
+    if latency is not None and not 0 < latency <= MAX_LATENCY:
+        errors['latency'] = f"Must be between 0 and {MAX_LATENCY:g} seconds"
+    if device is not None and channels and max(channels) >= device.max_input_channels:
+        errors['channels'] = f"{device.name} has {device.max_input_channels} input channels"
+    return errors
@@ -0,0 +1,140 @@
+"""
+Export of marker regions as separate files
+
+The regions between consecutive ``RecordingMarker`` timestamps are cut out
+of every channel file by byte offset. Samples are never decoded: each region
+file is a synthesized WAV header followed by a byte range of the source, so
+copying uses ``copy_file_range``/``sendfile`` where the OS provides them.
+"""
+import mmap
+import os
+
+from .files import recording_file_path, regions_directory
+from .wavfile import wave_header
+
+
+COPY_CHUNK = 8 * 1024 * 1024
+
+
+def marker_regions(recording, recording_files):
+    """Split a recording at its markers into ``(index, start_frame, end_frame)`` regions"""
+    sample_rate = recording_files[0].sample_rate
+    length = max(f.frames for f in recording_files)
+
+    boundaries = [0]
+    for timestamp in recording.markers.order_by('timestamp').values_list('timestamp', flat=True):
+        frame = min(int(timestamp.total_seconds() * sample_rate), length)
+        if frame > boundaries[-1]:
+            boundaries.append(frame)
+    if length > boundaries[-1]:
+        boundaries.append(length)
+
+    return [(index, start, end) for index, (start, end) in enumerate(zip(boundaries, boundaries[1:]), 1)]
+
+
+def region_name(index, start, end, sample_rate):
+    def timestamp(frame):
+        seconds = frame // sample_rate
+        return f"{seconds // 3600:02d}-{seconds // 60 % 60:02d}-{seconds % 60:02d}"
+
+    return f"{index:02d}_{timestamp(start)}_{timestamp(end)}"
+
+
+def _region_files(recording, skip_silent=False):
+    """Channel files of the first segment, which markers refer to"""
+    return [f for f in recording.files.all() if f.segment == 0 and not (skip_silent and f.silent)]
+
+
+def _byte_range(recording_file, start, end):
+    """Clamp a frame range to the file and convert it to (offset, count) bytes"""
+    block_align = recording_file.sample_width
+    start = min(start, recording_file.frames)
+    end = min(end, recording_file.frames)
+    return recording_file.data_offset + start * block_align, (end - start) * block_align
+
+
+def copy_range(source, target, offset, count):
+    """Copy ``count`` bytes at ``offset`` of one open file to the end of another, in kernel if possible"""
+    if hasattr(os, 'copy_file_range'):
+        try:
+            while count > 0:
+                copied = os.copy_file_range(source.fileno(), target.fileno(), count, offset)
+                if copied == 0:
+                    return
+                offset += copied
+                count -= copied
+            return
+        except OSError:
+            pass  # e.g. cross-device copy on older kernels, fall through
+
+    if hasattr(os, 'sendfile'):
+        try:
+            while count > 0:
+                copied = os.sendfile(target.fileno(), source.fileno(), offset, count)
+                if copied == 0:
+                    return
+                offset += copied
+                count -= copied
+            return
+        except OSError:
+            pass
+
+    source.seek(offset)
+    while count > 0:
+        data = source.read(min(COPY_CHUNK, count))
+        if not data:
+            return
+        target.write(data)
+        count -= len(data)
+
+
+def export_regions_to_folder(recording, target=None, skip_silent=False):
+    """Write one folder per marker region into the regions directory; returns the folders"""
+    recording_files = _region_files(recording, skip_silent)
+    target = target or regions_directory(recording)
+    folders = []
+
+    for index, start, end in marker_regions(recording, recording_files):
+        folder = target / region_name(index, start, end, recording_files[0].sample_rate)
+        folder.mkdir(parents=True, exist_ok=True)
+
+        for recording_file in recording_files:
+            offset, count = _byte_range(recording_file, start, end)
+            with open(recording_file_path(recording_file), 'rb') as source, \
+                    open(folder / recording_file.filename, 'wb') as output:
+                output.write(wave_header(
+                    count // recording_file.sample_width, 1,
+                    recording_file.sample_width, recording_file.sample_rate,
+                ))
+                output.flush()
+                copy_range(source, output, offset, count)
+        folders.append(folder)
+
+    return folders
+
+
+def _mapped_chunks(path, header, offset, count):
+    """Yield a header and then slices of a memory-mapped byte range"""
+    yield header
+    if count == 0:
+        return
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        for position in range(offset, offset + count, COPY_CHUNK):
+            yield mapped[position:min(position + COPY_CHUNK, offset + count)]
+
+
+def region_archive_entries(recording, skip_silent=False):
+    """``(arcname, chunks)`` entries for a ZIP with one folder per marker region"""
+    recording_files = _region_files(recording, skip_silent)
+
+    for index, start, end in marker_regions(recording, recording_files):
+        folder = region_name(index, start, end, recording_files[0].sample_rate)
+        for recording_file in recording_files:
+            offset, count = _byte_range(recording_file, start, end)
+            header = wave_header(
+                count // recording_file.sample_width, 1,
+                recording_file.sample_width, recording_file.sample_rate,
+            )
+            yield f"{folder}/{recording_file.filename}", _mapped_chunks(
+                recording_file_path(recording_file), header, offset, count
+            )
@@ -0,0 +1,155 @@
+"""
+Fake audio backend
+
+Generates test tones through a subset of the sounddevice API, selected with
+``AUDIO_BACKEND = "fake"`` (see ``recorder.audio.get_backend``).
+``fake_backend.unplug(seconds)`` simulates a lost USB link: running input
+streams stall and the device cannot be opened until it is back.
+"""
+import threading
+import time
+
+import numpy as np
+
+
+FAKE_CHANNELS = 32
+FAKE_SAMPLE_RATES = (44100, 48000, 96000)
+
+
+class FakeStreamBase:
+    """Drives a stream callback from a thread at the nominal block rate"""
+
+    def __init__(self, device=None, channels=FAKE_CHANNELS, samplerate=48000,
+                 callback=None, blocksize=1024, dtype=np.float32, **kwargs):
+        self.device = device
+        self.channels = channels
+        self.samplerate = samplerate
+        self.callback = callback
+        self.blocksize = blocksize or 1024
+        self.dtype = dtype
+        self.active = False
+        self.closed = False
+        self.frames_processed = 0
+        self._thread = None
+
+    def start(self):
+        self.active = True
+        self._thread = threading.Thread(target=self._run, name="fake-audio", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self.active = False
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join()
+
+    def abort(self):
+        self.stop()
+
+    def close(self):
+        self.stop()
+        self.closed = True
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _run(self):
+        period = self.blocksize / self.samplerate
+        deadline = time.perf_counter()
+        while self.active:
+            self._process_block()
+            self.frames_processed += self.blocksize
+            deadline += period
+            delay = deadline - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+
+    def _process_block(self):
+        """Hand one block to or from the callback; the base stream only keeps time"""
+
+
+class FakeDeviceError(Exception):
+    """Stands in for ``sounddevice.PortAudioError``"""
+
+
+class FakeInputStream(FakeStreamBase):
+    """Input stream producing a quiet sine tone on every channel"""
+
+    def __init__(self, *args, **kwargs):
+        if fake_backend.unplugged:
+            raise FakeDeviceError("Device unavailable")
+        super().__init__(*args, **kwargs)
+        # Channel n carries (n + 1) * 110 Hz at -20 dBFS
+        self._frequencies = 110.0 * np.arange(1, self.channels + 1, dtype=np.float64)
+
+    def _process_block(self):
+        if fake_backend.unplugged:
+            # A dead USB link: the stream stays active but no callbacks arrive
+            return
+        t = (self.frames_processed + np.arange(self.blocksize)) / self.samplerate
+        indata = (0.1 * np.sin(2 * np.pi * np.outer(t, self._frequencies))).astype(np.float32)
+        if self.callback:
+            self.callback(indata, self.blocksize, None, None)
+
+
+class FakeOutputStream(FakeStreamBase):
+    """Output stream that pulls blocks from the callback and discards them"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.outdata = np.zeros((self.blocksize, self.channels), dtype=np.float32)
+
+    def _process_block(self):
+        if self.callback:
+            self.callback(self.outdata, self.blocksize, None, None)
+
+
+class FakeBackend:
+    """Subset of the sounddevice API used by this project"""
+
+    InputStream = FakeInputStream
+    OutputStream = FakeOutputStream
+
+    def __init__(self):
+        self.unplugged_until = 0.0
+
+    @property
+    def unplugged(self):
+        return time.monotonic() < self.unplugged_until
+
+    def unplug(self, seconds):
+        """Make the input device unavailable for ``seconds``"""
+        self.unplugged_until = time.monotonic() + seconds
+
+    def query_hostapis(self, index=None):
+        hostapis = [{'name': 'Fake', 'devices': [0], 'default_input_device': 0, 'default_output_device': 0}]
+        return hostapis if index is None else hostapis[index]
+
+    def query_devices(self, device=None, kind=None):
+        devices = [{
+            'name': 'X32 (fake)',
+            'index': 0,
+            'hostapi': 0,
+            'max_input_channels': FAKE_CHANNELS,
+            'max_output_channels': FAKE_CHANNELS,
+            'default_samplerate': 48000.0,
+            'default_low_input_latency': 0.005,
+            'default_high_input_latency': 0.02,
+            'default_low_output_latency': 0.005,
+            'default_high_output_latency': 0.02,
+        }]
+        if device is None and kind is None:
+            return devices
+        return devices[0 if device is None else device]
+
+    def check_input_settings(self, device=None, channels=None, dtype=None, samplerate=None, **kwargs):
+        if channels is not None and channels > FAKE_CHANNELS:
+            raise ValueError(f"Invalid number of channels: {channels}")
+        if samplerate is not None and samplerate not in FAKE_SAMPLE_RATES:
+            raise ValueError(f"Invalid sample rate: {samplerate}")
+
+
+fake_backend = FakeBackend()
@@ -0,0 +1,221 @@
+"""
+File index for recordings
+
+The controller describes every channel file once when a recording (or a
+segment of it) is closed. Everything that serves files afterwards reads the
+``RecordingFile`` rows instead of touching the filesystem.
+
+Files of ARCHIVED recordings are stored gzip-compressed in ``ARCHIVE_PATH``;
+``recording_file_path`` transparently decompresses them into an LRU cache
+(``REHYDRATE_CACHE_PATH``) on first access.
+"""
+import datetime
+import gzip
+import hashlib
+import os
+import re
+import shutil
+import threading
+from pathlib import Path
+
+from django.conf import settings
+from django.db import transaction
+
+from .models import MIRROR, Recording, RecordingFile
+from .wavfile import read_wave_info
+
+
+CHANNEL_FILENAME_RE = re.compile(r'^ch(\d+)')
+
+
+def recording_directory(recording):
+    """Directory holding the channel files of a recording"""
+    if recording.indexed_target == MIRROR and settings.MIRROR_RECORDING_PATH:
+        # The primary drive failed during the recording; the mirror has the complete files
+        return Path(settings.MIRROR_RECORDING_PATH) / str(recording.uuid)
+    return Path(settings.RECORDING_PATH) / str(recording.uuid)
+
+
+def recording_file_path(recording_file):
+    """Absolute path of an indexed channel file, rehydrated first if it is archived"""
+    if recording_file.recording.tier == Recording.ARCHIVED:
+        return rehydrate_file(recording_file)
+    return recording_directory(recording_file.recording) / recording_file.filename
+
+
+def archive_directory(recording):
+    """Directory holding the compressed files of an archived recording"""
+    return Path(settings.ARCHIVE_PATH) / str(recording.uuid)
+
+
+def regions_directory(recording):
+    """Directory for region exports; those of archived recordings stay out of the hot tier"""
+    if recording.tier == Recording.ARCHIVED:
+        return archive_directory(recording) / 'regions'
+    return recording_directory(recording) / 'regions'
+
+
+def archived_file_path(recording_file):
+    return archive_directory(recording_file.recording) / f"{recording_file.filename}.gz"
+
+
+def rehydrated_file_path(recording_file):
+    return Path(settings.REHYDRATE_CACHE_PATH) / str(recording_file.recording.uuid) / recording_file.filename
+
+
+def rehydrate_file(recording_file):
+    """Decompress an archived file into the rehydration cache and return its path"""
+    path = rehydrated_file_path(recording_file)
+    if path.exists():
+        touch(path)
+        return path
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # Unique temporary name, concurrent requests for the same file may race
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}-{threading.get_ident()}.tmp")
+    try:
+        with gzip.open(archived_file_path(recording_file), 'rb') as source, open(tmp_path, 'wb') as target:
+            shutil.copyfileobj(source, target, 1024 * 1024)
+        os.replace(tmp_path, path)
+    finally:
+        tmp_path.unlink(missing_ok=True)
+
+    cached = [p for p in Path(settings.REHYDRATE_CACHE_PATH).glob('*/*') if not p.name.startswith('.')]
+    for removed in evict_least_recently_used(cached, settings.REHYDRATE_CACHE_BUDGET, keep=path):
+        try:
+            removed.parent.rmdir()
+        except OSError:
+            pass
+    return path
+
+
+def touch(path):
+    """Mark a cached file as recently used for the LRU eviction"""
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+
+def evict_least_recently_used(paths, budget, keep=None):
+    """Delete the least recently used (oldest mtime) files until their total size fits the budget"""
+    entries = []
+    for path in paths:
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, path))
+
+    used = sum(size for _, size, _ in entries)
+    removed = []
+    for _, size, path in sorted(entries, key=lambda entry: entry[0]):
+        if used <= budget:
+            break
+        if path == keep:
+            continue
+        path.unlink(missing_ok=True)
+        used -= size
+        removed.append(path)
+    return removed
+
+
+def describe_wave_file(path, channel_no, segment=0):
+    """Build the RecordingFile field values for a closed WAV file"""
+    path = Path(path)
+    info = read_wave_info(path)
+    return {
+        'channel_no': channel_no,
+        'segment': segment,
+        'filename': path.name,
+        'size': info.file_size,
+        'frames': info.frames,
+        'duration': datetime.timedelta(seconds=info.frames / info.sample_rate),
+        'sample_rate': info.sample_rate,
+        'sample_width': info.sample_width,
+        'format': 'wav',
+        'data_offset': info.data_offset,
+    }
+
+
+def index_recording_files(recording, channel_files, segment=0, digests=None):
+    """
+    Store metadata for the given ``(channel_no, path)`` pairs and refresh
+    ``recording.duration`` from the indexed frame counts.
+
+    ``digests`` maps paths to the BLAKE2b digests computed while writing.
+    Fields that are not derived from the file itself (digest, analysis
+    results) are kept when an existing entry is re-indexed.
+    """
+    digests = digests or {}
+    described = []
+    for channel_no, path in channel_files:
+        fields = describe_wave_file(path, channel_no, segment)
+        if path in digests:
+            fields['blake2b'] = digests[path]
+        described.append(fields)
+    return store_recording_files(recording, described)
+
+
+def store_recording_files(recording, described):
+    """
+    Create or update ``RecordingFile`` rows from ``describe_wave_file``
+    values, e.g. as reported by a capture agent, and refresh the duration
+    """
+    existing = {f.filename: f for f in recording.files.all()}
+    rows = []
+
+    with transaction.atomic():
+        for fields in described:
+            row = existing.get(fields['filename']) or RecordingFile(recording=recording)
+            for name, value in fields.items():
+                setattr(row, name, value)
+            row.save()
+            rows.append(row)
+
+        update_duration(recording)
+
+    return rows
+
+
+def update_duration(recording):
+    """Set the recording duration to the longest channel across all segments"""
+    per_channel = {}
+    for channel_no, duration in recording.files.values_list('channel_no', 'duration'):
+        per_channel[channel_no] = per_channel.get(channel_no, datetime.timedelta()) + duration
+
+    recording.duration = max(per_channel.values()) if per_channel else None
+    recording.save(update_fields=['duration'])
+
+
+def hash_file_data(path, offset, size, chunk_size=4 * 1024 * 1024, opener=open):
+    """
+    BLAKE2b of ``size`` bytes at ``offset``; hashlib releases the GIL, so threads scale across cores.
+    Pass ``opener=gzip.open`` to hash an archived file without rehydrating it.
+    """
+    hasher = hashlib.blake2b()
+    buffer = bytearray(chunk_size)
+    view = memoryview(buffer)
+    with opener(path, 'rb') as f:
+        f.seek(offset)
+        while size > 0:
+            read = f.readinto(view[:min(chunk_size, size)])
+            if not read:
+                break
+            hasher.update(view[:read])
+            size -= read
+    return hasher.hexdigest()
+
+
+def scan_recording_directory(recording):
+    """Find channel files of a recording on disk, for rebuilding the index"""
+    directory = recording_directory(recording)
+    if not directory.is_dir():
+        return []
+
+    channel_files = []
+    for path in sorted(directory.glob('*.wav')):
+        match = CHANNEL_FILENAME_RE.match(path.name)
+        if match:
+            channel_files.append((int(match.group(1)), path))
+    return channel_files
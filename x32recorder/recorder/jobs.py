@@ -0,0 +1,175 @@
+"""
+Background job queue for post-processing
+
+Jobs are rows in the ``Job`` table, so they survive restarts and their
+progress is visible through the API. ``manage.py run_jobs`` runs a pool of
+worker threads in a separate, low-priority process (niceness and idle I/O
+class where the OS supports it). Handlers report progress through
+``JobContext.progress()``, which also pauses them for as long as a recording
+is being captured, so post-processing never competes with live capture for
+CPU or disk bandwidth.
+"""
+import logging
+import os
+import shutil
+import subprocess
+import threading
+import time
+import traceback
+
+from django.db import close_old_connections
+from django.utils import timezone
+
+from .archive_cache import build_archive
+from .models import Job, Recording
+from .tiering import apply_tiering
+
+
+log = logging.getLogger(__name__)
+
+HANDLERS = {}
+PROGRESS_SAVE_INTERVAL = 1.0
+RECORDING_CHECK_INTERVAL = 1.0
+
+
+def register(kind):
+    """Decorator registering ``handler(job, context)`` for a job kind"""
+    def decorator(handler):
+        HANDLERS[kind] = handler
+        return handler
+    return decorator
+
+
+def enqueue(kind, recording=None, priority=0, **params):
+    return Job.objects.create(kind=kind, recording=recording, priority=priority, params=params)
+
+
+def recording_in_progress():
+    return Recording.objects.filter(state=Recording.RECORD).exists()
+
+
+class JobContext:
+    """Progress reporting and throttling for a running job"""
+
+    def __init__(self, job):
+        self.job = job
+        self.last_saved = 0.0
+        self.last_recording_check = 0.0
+
+    def progress(self, fraction, message=None):
+        """Report progress (0..1); blocks while a recording is in progress"""
+        self.wait_while_recording()
+
+        now = time.monotonic()
+        self.job.progress = min(1.0, max(0.0, fraction))
+        if message is not None:
+            self.job.message = message[:512]
+        if now - self.last_saved >= PROGRESS_SAVE_INTERVAL:
+            Job.objects.filter(pk=self.job.pk).update(progress=self.job.progress, message=self.job.message)
+            self.last_saved = now
+
+    def wait_while_recording(self):
+        now = time.monotonic()
+        if now - self.last_recording_check < RECORDING_CHECK_INTERVAL:
+            return
+        self.last_recording_check = now
+
+        if recording_in_progress():
+            Job.objects.filter(pk=self.job.pk).update(message="Paused while recording")
+            while recording_in_progress():
+                time.sleep(RECORDING_CHECK_INTERVAL)
+            Job.objects.filter(pk=self.job.pk).update(message=self.job.message)
+
+
+def claim_next_job():
+    """Atomically move the most urgent queued job to RUNNING and return it"""
+    while True:
+        job = Job.objects.filter(state=Job.QUEUED).order_by('-priority', 'created_at').first()
+        if job is None:
+            return None
+        claimed = Job.objects.filter(pk=job.pk, state=Job.QUEUED).update(
+            state=Job.RUNNING, started_at=timezone.now()
+        )
+        if claimed:
+            job.refresh_from_db()
+            return job
+
+
+def run_job(job):
+    handler = HANDLERS.get(job.kind)
+    context = JobContext(job)
+    try:
+        if handler is None:
+            raise ValueError(f"Unknown job kind: {job.kind}")
+        context.wait_while_recording()
+        handler(job, context)
+    except Exception:
+        job.state = Job.FAILED
+        job.message = traceback.format_exc()[-512:]
+    else:
+        job.state = Job.DONE
+        job.progress = 1.0
+    job.finished_at = timezone.now()
+    job.save(update_fields=['state', 'progress', 'message', 'finished_at'])
+
+
+def lower_process_priority():
+    """Make this process yield CPU and disk to the controller"""
+    if hasattr(os, 'nice'):
+        os.nice(10)
+    if shutil.which('ionice'):
+        # Idle I/O class: only gets disk time nobody else wants
+        subprocess.run(['ionice', '-c', '3', '-p', str(os.getpid())], capture_output=True)
+
+
+def worker_loop(stop_event, poll_interval):
+    while not stop_event.is_set():
+        close_old_connections()
+        job = claim_next_job()
+        if job is None:
+            stop_event.wait(poll_interval)
+            continue
+        log.info("Running %s", job)
+        run_job(job)
+        log.info("Finished %s #%s: %s", job.kind, job.pk, 'done' if job.state == Job.DONE else 'failed')
+
+
+def run_workers(workers=1, poll_interval=2.0, stop_event=None):
+    """Run the worker pool until ``stop_event`` is set"""
+    stop_event = stop_event or threading.Event()
+
+    # Jobs left RUNNING by a worker that died are picked up again
+    Job.objects.filter(state=Job.RUNNING).update(state=Job.QUEUED, started_at=None)
+
+    threads = [
+        threading.Thread(target=worker_loop, args=(stop_event, poll_interval), name=f"job-worker-{n}", daemon=True)
+        for n in range(workers)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+@register('analyse_activity')
+def analyse_activity_job(job, context):
+    # NumPy-based; imported here so enqueueing from the web app stays light
+    from .analysis import analyse_activity
+    analyse_activity(job.recording, progress=context.progress)
+
+
+@register('analyse_loudness')
+def analyse_loudness_job(job, context):
+    from .analysis import analyse_loudness
+    analyse_loudness(job.recording, progress=context.progress)
+
+
+@register('build_archive')
+def build_archive_job(job, context):
+    build_archive(job.recording, progress=context.progress)
+
+
+@register('apply_tiering')
+def apply_tiering_job(job, context):
+    archived = apply_tiering(progress=context.progress)
+    job.message = f"Archived {len(archived)} recordings"
@@ -0,0 +1,238 @@
+"""
+Listen-in stream for monitoring single channels from a phone
+
+The controller feeds every captured block into a ``ListenTap``. The tap
+downsamples the channels somebody is listening to and publishes them as UDP
+datagrams on localhost. ``ListenWebSocketApp`` (mounted in ``asgi.py``)
+receives those datagrams and fans them out to WebSocket clients.
+
+Neither side ever waits on the other: the tap only appends to a deque from
+the audio callback, and both the tap and the hub drop the oldest blocks when
+a consumer falls behind. Each of the two buffers holds ``LISTEN_BUFFER_MS``
+of audio per channel (at least one block), whatever the block size and
+sample rate of the recording.
+
+Datagram / WebSocket binary message layout (little endian)::
+
+    magic "X32L" | seq u32 | channel u16 | sample_rate u32 | frames u32 | frames * s16 samples
+"""
+import asyncio
+import collections
+import json
+import socket
+import struct
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+
+
+HEADER = struct.Struct('<4sIHII')
+MAGIC = b'X32L'
+SUBSCRIPTION_TIMEOUT = 3.0
+
+
+def buffer_blocks(frames, sample_rate):
+    """Blocks of ``frames`` that fit into ``LISTEN_BUFFER_MS``, at least one"""
+    return max(1, settings.LISTEN_BUFFER_MS * sample_rate // (1000 * max(1, frames)))
+
+
+class ListenTap:
+    """Controller side: taps the capture stream for subscribed channels"""
+
+    def __init__(self, sample_rate, host=None, port=None, control_port=None, decimation=None):
+        self.host = host or settings.LISTEN_HOST
+        self.port = port or settings.LISTEN_PORT
+        self.control_port = control_port or settings.LISTEN_CONTROL_PORT
+        self.decimation = decimation or settings.LISTEN_DECIMATION
+        self.output_rate = sample_rate // self.decimation
+
+        # Device channel indices (0-based) that currently have listeners.
+        # Replaced as a whole by the control thread, read by the audio callback.
+        self.channels = ()
+        self.blocks = collections.deque()
+        self.dropped_blocks = 0
+        self.seq = 0
+        self.running = False
+
+    def set_sample_rate(self, sample_rate):
+        """Follow the sample rate of the recording being captured"""
+        self.output_rate = sample_rate // self.decimation
+
+    def start(self):
+        self.running = True
+        self.publish_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.publish_socket.setblocking(False)
+        self.control_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.control_socket.bind((self.host, self.control_port))
+        self.control_socket.settimeout(0.5)
+
+        threading.Thread(target=self._control_loop, name="listen-control", daemon=True).start()
+        threading.Thread(target=self._publish_loop, name="listen-publish", daemon=True).start()
+
+    def stop(self):
+        self.running = False
+
+    def feed(self, indata):
+        """Called from the audio callback with the float32 device block"""
+        channels = self.channels
+        if not channels:
+            return
+
+        frames = indata.shape[0] - indata.shape[0] % self.decimation
+        limit = len(channels) * buffer_blocks(frames // self.decimation, self.output_rate)
+        for channel in channels:
+            if channel >= indata.shape[1]:
+                continue
+            # Averaging adjacent samples doubles as a cheap anti-aliasing filter
+            mono = indata[:frames, channel].reshape(-1, self.decimation).mean(axis=1)
+            samples = (np.clip(mono, -1.0, 1.0) * 32767).astype('<i2')
+            while len(self.blocks) >= limit:
+                try:
+                    self.blocks.popleft()
+                except IndexError:
+                    # The publisher took it meanwhile
+                    break
+                self.dropped_blocks += 1
+            self.blocks.append((channel, samples))
+
+    def _publish_loop(self):
+        while self.running:
+            try:
+                channel, samples = self.blocks.popleft()
+            except IndexError:
+                time.sleep(0.005)
+                continue
+
+            self.seq = (self.seq + 1) & 0xFFFFFFFF
+            packet = HEADER.pack(MAGIC, self.seq, channel + 1, self.output_rate, len(samples)) + samples.tobytes()
+            try:
+                self.publish_socket.sendto(packet, (self.host, self.port))
+            except OSError:
+                # Nobody listening or socket buffer full: the block is simply lost
+                self.dropped_blocks += 1
+
+    def _control_loop(self):
+        subscriptions = {}
+        while self.running:
+            try:
+                data, _ = self.control_socket.recvfrom(4096)
+                now = time.monotonic()
+                message = json.loads(data)
+                if not isinstance(message, dict):
+                    continue
+                for channel_no in message.get('channels', []):
+                    subscriptions[int(channel_no) - 1] = now + SUBSCRIPTION_TIMEOUT
+            except socket.timeout:
+                pass
+            except (ValueError, TypeError):
+                continue
+
+            now = time.monotonic()
+            subscriptions = {ch: expiry for ch, expiry in subscriptions.items() if expiry > now}
+            self.channels = tuple(sorted(subscriptions))
+
+
+class ListenHub(asyncio.DatagramProtocol):
+    """Web side: receives tap datagrams and distributes them to WebSocket queues"""
+
+    def __init__(self):
+        self.listeners = collections.defaultdict(set)
+        self.dropped_blocks = 0
+        self.transport = None
+
+    async def start(self):
+        loop = asyncio.get_running_loop()
+        await loop.create_datagram_endpoint(
+            lambda: self, local_addr=(settings.LISTEN_HOST, settings.LISTEN_PORT)
+        )
+        loop.create_task(self._subscribe_loop())
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        if len(data) < HEADER.size or data[:4] != MAGIC:
+            return
+        _, _, channel_no, sample_rate, frames = HEADER.unpack_from(data)
+        limit = buffer_blocks(frames, sample_rate)
+        for queue in self.listeners.get(channel_no, ()):
+            while queue.qsize() >= limit:
+                queue.get_nowait()
+                self.dropped_blocks += 1
+            queue.put_nowait(data)
+
+    async def _subscribe_loop(self):
+        """Tell the controller which channels to tap, as a keepalive"""
+        while True:
+            channels = sorted(ch for ch, queues in self.listeners.items() if queues)
+            self.transport.sendto(
+                json.dumps({'channels': channels}).encode(),
+                (settings.LISTEN_HOST, settings.LISTEN_CONTROL_PORT),
+            )
+            await asyncio.sleep(1.0)
+
+    def subscribe(self, channel_no):
+        # Bounded by duration in datagram_received
+        queue = asyncio.Queue()
+        self.listeners[channel_no].add(queue)
+        return queue
+
+    def unsubscribe(self, channel_no, queue):
+        self.listeners[channel_no].discard(queue)
+
+
+class ListenWebSocketApp:
+    """ASGI wrapper serving ``/ws/listen/<channel_no>/`` next to the Django app"""
+
+    path_prefix = '/ws/listen/'
+
+    def __init__(self, django_application):
+        self.django_application = django_application
+        self.hub = None
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'websocket':
+            if scope['path'].startswith(self.path_prefix):
+                await self.listen(scope, receive, send)
+            else:
+                await send({'type': 'websocket.close', 'code': 4404})
+            return
+        await self.django_application(scope, receive, send)
+
+    async def listen(self, scope, receive, send):
+        try:
+            channel_no = int(scope['path'][len(self.path_prefix):].strip('/'))
+        except ValueError:
+            await send({'type': 'websocket.close', 'code': 4400})
+            return
+
+        if (await receive())['type'] != 'websocket.connect':
+            return
+        if self.hub is None:
+            self.hub = ListenHub()
+            await self.hub.start()
+
+        await send({'type': 'websocket.accept'})
+        await send({'type': 'websocket.send', 'text': json.dumps({
+            'channel': channel_no,
+            'format': 's16le',
+            'header': HEADER.format,
+        })})
+
+        queue = self.hub.subscribe(channel_no)
+
+        async def forward():
+            while True:
+                await send({'type': 'websocket.send', 'bytes': await queue.get()})
+
+        sender = asyncio.ensure_future(forward())
+        try:
+            while True:
+                message = await receive()
+                if message['type'] == 'websocket.disconnect':
+                    break
+        finally:
+            sender.cancel()
+            self.hub.unsubscribe(channel_no, queue)
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from recorder.models import RecordingNode
+from recorder.nodes import generate_token
+
+
+class Command(BaseCommand):
+    help = "Register a capture agent and print the token to start its controller with"
+
+    def add_arguments(self, parser):
+        parser.add_argument('name', help="Name shown in the web app")
+        parser.add_argument('url', help="Base URL of the agent's file server, e.g. http://stage-pc:9035")
+        parser.add_argument('--rotate', action='store_true', help="Issue a new token for an existing node")
+
+    def handle(self, *args, **options):
+        node = RecordingNode.objects.filter(name=options['name']).first()
+        if node and not options['rotate']:
+            raise CommandError(f"Node {node} exists; use --rotate to issue a new token")
+
+        node = node or RecordingNode(name=options['name'])
+        node.agent_url = options['url']
+        node.token = generate_token()
+        node.save()
+
+        self.stdout.write(self.style.SUCCESS(f"Node {node} ({node.agent_url})"))
+        self.stdout.write("Start its controller with:")
+        self.stdout.write(f"  X32RECORDER_SERVER_URL=<web app URL> X32RECORDER_NODE_TOKEN={node.token} python controller.py")
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from recorder.tiering import apply_tiering, hot_usage
+
+
+class Command(BaseCommand):
+    help = "Move old recordings, or the oldest beyond the hot quota, to the archive tier"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="Only list the recordings that would be archived")
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"Hot tier: {hot_usage() / 1024**3:.1f} GiB")
+        recordings = apply_tiering(dry_run=options['dry_run'])
+        for recording in recordings:
+            self.stdout.write(f"{recording.uuid}: {recording.total_size / 1024**2:.0f} MiB from {recording.date:%Y-%m-%d}")
+
+        verb = "Would archive" if options['dry_run'] else "Archived"
+        self.stdout.write(self.style.SUCCESS(f"{verb} {len(recordings)} recordings"))
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+
+from recorder.files import index_recording_files, scan_recording_directory
+from recorder.models import Recording
+
+
+class Command(BaseCommand):
+    help = "Rebuild the file index of recordings from the files on disk"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'recording_ids', nargs='*', type=int,
+            help="Recordings to reconcile (default: all stopped recordings)",
+        )
+
+    def handle(self, *args, **options):
+        # Archived recordings and those of capture agents have no files in RECORDING_PATH to scan
+        recordings = Recording.objects.filter(state=Recording.STOPPED, tier=Recording.HOT, node=None)
+        if options['recording_ids']:
+            recordings = recordings.filter(id__in=options['recording_ids'])
+
+        for recording in recordings.order_by('date'):
+            channel_files = scan_recording_directory(recording)
+            if not channel_files:
+                self.stdout.write(self.style.WARNING(f"{recording.uuid}: no channel files found"))
+                continue
+
+            stale = recording.files.exclude(
+                filename__in=[path.name for _, path in channel_files]
+            ).delete()[0]
+            rows = index_recording_files(recording, channel_files)
+            self.stdout.write(
+                f"{recording.uuid}: indexed {len(rows)} files"
+                + (f", removed {stale} stale entries" if stale else "")
+                + f", duration {recording.duration}"
+            )
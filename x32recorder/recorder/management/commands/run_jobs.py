@@ -0,0 +1,26 @@
+import logging
+
+from django.core.management.base import BaseCommand
+
+from recorder.jobs import lower_process_priority, run_workers
+from recorder.rtlog import TextFormatter
+
+
+class Command(BaseCommand):
+    help = "Run the background post-processing worker pool"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=2, help="Jobs processed in parallel")
+        parser.add_argument('--poll-interval', type=float, default=2.0, help="Seconds between queue checks")
+
+    def handle(self, *args, **options):
+        # Job progress goes to stdout, which manage_services.py writes to logs/worker.log
+        handler = logging.StreamHandler(self.stdout)
+        handler.setFormatter(TextFormatter())
+        logging.basicConfig(level=logging.INFO, handlers=[handler])
+        lower_process_priority()
+        self.stdout.write(f"Job worker started with {options['workers']} workers")
+        try:
+            run_workers(options['workers'], options['poll_interval'])
+        except KeyboardInterrupt:
+            pass
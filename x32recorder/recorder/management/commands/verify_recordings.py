@@ -0,0 +1,61 @@
+import gzip
+import os
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+
+from recorder.files import archived_file_path, hash_file_data, recording_file_path
+from recorder.models import Recording, RecordingFile
+
+
+class Command(BaseCommand):
+    help = "Check recording files against the BLAKE2b digests computed during capture"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'recording_ids', nargs='*', type=int,
+            help="Recordings to verify (default: all)",
+        )
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count(),
+            help="Files hashed in parallel (default: number of CPUs)",
+        )
+
+    def handle(self, *args, **options):
+        # Files of capture agents are not stored here
+        recording_files = RecordingFile.objects.exclude(blake2b='').filter(recording__node=None).select_related('recording')
+        if options['recording_ids']:
+            recording_files = recording_files.filter(recording_id__in=options['recording_ids'])
+        recording_files = list(recording_files.order_by('recording_id', 'segment', 'channel_no'))
+
+        def verify(recording_file):
+            try:
+                if recording_file.recording.tier == Recording.ARCHIVED:
+                    # Streamed from the archive: rehydrating would push working files out of the cache
+                    path, opener = archived_file_path(recording_file), gzip.open
+                else:
+                    path, opener = recording_file_path(recording_file), open
+                digest = hash_file_data(
+                    path,
+                    recording_file.data_offset,
+                    recording_file.frames * recording_file.sample_width,
+                    opener=opener,
+                )
+            except (OSError, EOFError, zlib.error) as e:
+                return recording_file, f"unreadable ({e})"
+            return recording_file, "ok" if digest == recording_file.blake2b else "MISMATCH"
+
+        failures = 0
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            for recording_file, result in pool.map(verify, recording_files):
+                line = f"{recording_file.recording.uuid}/{recording_file.filename}: {result}"
+                if result == "ok":
+                    self.stdout.write(line)
+                else:
+                    failures += 1
+                    self.stdout.write(self.style.ERROR(line))
+
+        if failures:
+            raise CommandError(f"{failures} of {len(recording_files)} files failed verification")
+        self.stdout.write(self.style.SUCCESS(f"All {len(recording_files)} files verified"))
@@ -0,0 +1,102 @@
+"""
+Request metrics and timing for the web app
+"""
+import time
+
+from django.db import connection
+
+from .metrics import Counter, Histogram
+from .profiling import add_timing
+
+
+REQUEST_DURATION = Histogram(
+    'x32recorder_http_request_duration_seconds',
+    "Time until the response (or the first byte of a streamed one) is ready, per DRF action",
+    ['view', 'method', 'status'],
+)
+REQUEST_DB_DURATION = Histogram(
+    'x32recorder_http_db_duration_seconds',
+    "Time spent in database queries per request",
+    ['view'],
+)
+DB_QUERIES = Counter(
+    'x32recorder_db_queries_total',
+    "Database queries executed while handling requests",
+    ['view'],
+)
+
+
+class MetricsMiddleware:
+    """Records latency and database time of every request, labelled by URL name (e.g. recording-download)"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        db = {'time': 0.0, 'queries': 0}
+
+        def timed_execute(execute, sql, params, many, context):
+            started = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                db['time'] += time.perf_counter() - started
+                db['queries'] += 1
+
+        started = time.perf_counter()
+        with connection.execute_wrapper(timed_execute):
+            response = self.get_response(request)
+        elapsed = time.perf_counter() - started
+
+        match = request.resolver_match
+        view = match.url_name if match and match.url_name else 'unmatched'
+        REQUEST_DURATION.observe(elapsed, view=view, method=request.method, status=response.status_code)
+        REQUEST_DB_DURATION.observe(db['time'], view=view)
+        DB_QUERIES.inc(db['queries'], view=view)
+        return response
+
+
+class ServerTimingMiddleware:
+    """
+    Reports where a request spent its time in a Server-Timing header
+    (db, serialize, render, total), visible in the browser dev tools.
+    Enabled with SERVER_TIMING / X32RECORDER_SERVER_TIMING=1.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.server_timing = timings = {}
+        queries = [0]
+
+        def timed_execute(execute, sql, params, many, context):
+            started = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                add_timing(request, 'db', time.perf_counter() - started)
+                queries[0] += 1
+
+        started = time.perf_counter()
+        with connection.execute_wrapper(timed_execute):
+            response = self.get_response(request)
+        timings['total'] = time.perf_counter() - started
+
+        entries = []
+        for name in ('db', 'serialize', 'render', 'total'):
+            if name in timings:
+                entry = f"{name};dur={timings[name] * 1000:.2f}"
+                if name == 'db':
+                    entry += f';desc="{queries[0]} queries"'
+                entries.append(entry)
+        response['Server-Timing'] = ', '.join(entries)
+        return response
+
+    def process_template_response(self, request, response):
+        # DRF responses are rendered right after this hook
+        started = time.perf_counter()
+        response.add_post_render_callback(
+            lambda rendered: add_timing(request, 'render', time.perf_counter() - started)
+        )
+        return response
@@ -0,0 +1,55 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:28
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("recorder", "0003_recording_started_at_recordingmarker"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RecordingFile",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("channel_no", models.IntegerField()),
+                ("segment", models.IntegerField(default=0)),
+                ("filename", models.CharField(max_length=256)),
+                ("size", models.BigIntegerField()),
+                ("frames", models.BigIntegerField()),
+                ("duration", models.DurationField()),
+                ("sample_rate", models.IntegerField()),
+                ("sample_width", models.IntegerField()),
+                ("format", models.CharField(default="wav", max_length=16)),
+                ("data_offset", models.IntegerField(default=44)),
+                (
+                    "recording",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="files",
+                        to="recorder.recording",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["segment", "channel_no"],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("recording", "filename"),
+                        name="filename_unique_in_recording",
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("recorder", "0004_recordingfile"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="MixerChannelName",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("channel_no", models.IntegerField(unique=True)),
+                ("name", models.CharField(blank=True, default="", max_length=256)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("recorder", "0005_mixerchannelname"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="recording",
+            name="playback_request",
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name="recording",
+            name="playback_status",
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
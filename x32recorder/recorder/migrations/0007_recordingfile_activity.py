@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("recorder", "0006_recording_playback"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="recordingfile",
+            name="activity",
+            field=models.JSONField(
+                blank=True,
+                default=list,
+                help_text="Non-silent regions as [start, end] seconds",
+            ),
+        ),
+        migrations.AddField(
+            model_name="recordingfile",
+            name="silent",
+            field=models.BooleanField(default=None, null=True),
+        ),
+    ]
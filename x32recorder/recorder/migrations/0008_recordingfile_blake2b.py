@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("recorder", "0007_recordingfile_activity"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="recordingfile",
+            name="blake2b",
+            field=models.CharField(blank=True, default="", max_length=128),
+        ),
+    ]
@@ -0,0 +1,67 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:43
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("recorder", "0008_recordingfile_blake2b"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Job",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("kind", models.CharField(max_length=64)),
+                ("params", models.JSONField(blank=True, default=dict)),
+                (
+                    "priority",
+                    models.IntegerField(
+                        default=0, help_text="Higher priorities run first"
+                    ),
+                ),
+                ("state", models.IntegerField(default=0)),
+                ("progress", models.FloatField(default=0.0)),
+                ("message", models.CharField(blank=True, default="", max_length=512)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "started_at",
+                    models.DateTimeField(blank=True, default=None, null=True),
+                ),
+                (
+                    "finished_at",
+                    models.DateTimeField(blank=True, default=None, null=True),
+                ),
+                (
+                    "recording",
+                    models.ForeignKey(
+                        blank=True,
+                        default=None,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="jobs",
+                        to="recorder.recording",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["state", "-priority", "created_at"],
+                        name="job_queue_order",
+                    )
+                ],
+            },
+        ),
+    ]
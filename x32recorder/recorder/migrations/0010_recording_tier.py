@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("recorder", "0009_job"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="recording",
+            name="tier",
+            field=models.IntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:03
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("recorder", "0011_changeversion"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RecordingNode",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.CharField(max_length=256, unique=True)),
+                (
+                    "agent_url",
+                    models.URLField(
+                        help_text="Base URL of the agent's file server, e.g. http://stage-pc:9035"
+                    ),
+                ),
+                ("token", models.CharField(max_length=64, unique=True)),
+                (
+                    "last_seen",
+                    models.DateTimeField(blank=True, default=None, null=True),
+                ),
+            ],
+        ),
+        migrations.AddField(
+            model_name="recording",
+            name="node",
+            field=models.ForeignKey(
+                blank=True,
+                default=None,
+                null=True,
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="recordings",
+                to="recorder.recordingnode",
+            ),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("recorder", "0012_recordingnode"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="recording",
+            name="indexed_target",
+            field=models.CharField(default="primary", max_length=16),
+        ),
+        migrations.AddField(
+            model_name="recording",
+            name="storage_targets",
+            field=models.JSONField(blank=True, default=list),
+        ),
+    ]
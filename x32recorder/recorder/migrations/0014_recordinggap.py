@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:15
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("recorder", "0013_recording_storage_targets"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RecordingGap",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("position", models.DurationField()),
+                ("length", models.DurationField()),
+                ("padded", models.BooleanField(default=True)),
+                ("reason", models.CharField(blank=True, default="", max_length=64)),
+                (
+                    "recording",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="gaps",
+                        to="recorder.recording",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["position"],
+            },
+        ),
+    ]
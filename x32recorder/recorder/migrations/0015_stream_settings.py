@@ -0,0 +1,88 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:19
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("recorder", "0014_recordinggap"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="recording",
+            name="block_size",
+            field=models.IntegerField(
+                default=1024, help_text="Frames per audio callback"
+            ),
+        ),
+        migrations.AddField(
+            model_name="recording",
+            name="latency",
+            field=models.FloatField(
+                blank=True,
+                default=None,
+                help_text="PortAudio input latency in seconds; empty for the device's default high latency",
+                null=True,
+            ),
+        ),
+        migrations.AddField(
+            model_name="recording",
+            name="sample_rate",
+            field=models.IntegerField(default=48000),
+        ),
+        migrations.AddField(
+            model_name="recordingtemplate",
+            name="block_size",
+            field=models.IntegerField(blank=True, default=None, null=True),
+        ),
+        migrations.AddField(
+            model_name="recordingtemplate",
+            name="latency",
+            field=models.FloatField(blank=True, default=None, null=True),
+        ),
+        migrations.AddField(
+            model_name="recordingtemplate",
+            name="sample_rate",
+            field=models.IntegerField(blank=True, default=None, null=True),
+        ),
+        migrations.CreateModel(
+            name="AudioDevice",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("index", models.IntegerField()),
+                ("name", models.CharField(max_length=256)),
+                ("hostapi", models.CharField(max_length=128)),
+                ("max_input_channels", models.IntegerField()),
+                ("default_samplerate", models.FloatField()),
+                ("default_low_input_latency", models.FloatField()),
+                ("default_high_input_latency", models.FloatField()),
+                ("sample_rates", models.JSONField(blank=True, default=list)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "node",
+                    models.ForeignKey(
+                        blank=True,
+                        default=None,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="audio_devices",
+                        to="recorder.recordingnode",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["node_id", "index"],
+            },
+        ),
+    ]
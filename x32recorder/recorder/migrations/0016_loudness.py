@@ -0,0 +1,45 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("recorder", "0015_stream_settings"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="recordingfile",
+            name="clip_count",
+            field=models.BigIntegerField(
+                default=None, help_text="Samples at full scale", null=True
+            ),
+        ),
+        migrations.AddField(
+            model_name="recordingfile",
+            name="dc_offset",
+            field=models.FloatField(
+                default=None,
+                help_text="Mean sample value as a fraction of full scale",
+                null=True,
+            ),
+        ),
+        migrations.AddField(
+            model_name="recordingfile",
+            name="loudness",
+            field=models.FloatField(
+                default=None,
+                help_text="Integrated loudness in LUFS (ITU-R BS.1770)",
+                null=True,
+            ),
+        ),
+        migrations.AddField(
+            model_name="recordingfile",
+            name="true_peak",
+            field=models.FloatField(
+                default=None, help_text="4x oversampled peak in dBTP", null=True
+            ),
+        ),
+    ]
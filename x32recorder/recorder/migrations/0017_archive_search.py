@@ -0,0 +1,57 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:29
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+def fill_channel_count(apps, schema_editor):
+    Recording = apps.get_model("recorder", "Recording")
+    batch = []
+    for recording in Recording.objects.only("pk", "channels").iterator(chunk_size=1000):
+        recording.channel_count = len(recording.channels) if recording.channels else 0
+        batch.append(recording)
+        if len(batch) == 1000:
+            Recording.objects.bulk_update(batch, ["channel_count"])
+            batch = []
+    Recording.objects.bulk_update(batch, ["channel_count"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("recorder", "0016_loudness"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="recording",
+            name="channel_count",
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(fill_channel_count, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="recording",
+            index=models.Index(fields=["-date", "-id"], name="recording_date"),
+        ),
+        migrations.AddIndex(
+            model_name="recording",
+            index=models.Index(fields=["state", "-date"], name="recording_state_date"),
+        ),
+        migrations.AddIndex(
+            model_name="recording",
+            index=models.Index(fields=["duration"], name="recording_duration"),
+        ),
+        migrations.AddIndex(
+            model_name="recording",
+            index=models.Index(
+                fields=["channel_count"], name="recording_channel_count"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="recording",
+            index=models.Index(
+                django.db.models.functions.text.Lower("name"),
+                name="recording_name_lower",
+            ),
+        ),
+    ]
@@ -1,7 +1,17 @@
 from django.db import models
+from django.db.models.functions import Lower
 import uuid
 
 
+# Storage targets of a recording and their health, written by the controller (recorder.targets)
+PRIMARY = 'primary'
+MIRROR = 'mirror'
+
+OK = 'ok'
+DEGRADED = 'degraded'
+FAILED = 'failed'
+
+
 class Recording(models.Model):
     NEW = 0
     RECORD = 1
@@ -11,14 +21,30 @@ class Recording(models.Model):
 
     PLAYING = 4
 
+    # Storage tier: HOT files live in RECORDING_PATH, ARCHIVED ones gzip-compressed in ARCHIVE_PATH
+    HOT = 0
+    ARCHIVED = 1
+
+    DEFAULT_SAMPLE_RATE = 48000
+    DEFAULT_BLOCK_SIZE = 1024
+
     date = models.DateTimeField(auto_now_add=True)#
     started_at = models.DateTimeField(blank=True, null=True, default=None)
     uuid = models.UUIDField(unique=True, editable=False, auto_created=True, default=uuid.uuid4)
     name = models.CharField(max_length=256, blank=True, default="")
     channels = models.JSONField(default=list, help_text="List of integer channel numbers")
+    # len(channels), kept by save() so the archive can be filtered on it in the database
+    channel_count = models.IntegerField(default=0, editable=False)
     duration = models.DurationField(default=None, blank=True, null=True)
     state = models.IntegerField(default=NEW)
     audiodevice_index = models.IntegerField(default=0)
+    # Stream settings, validated against the cached AudioDevice when the recording is started
+    sample_rate = models.IntegerField(default=DEFAULT_SAMPLE_RATE)
+    block_size = models.IntegerField(default=DEFAULT_BLOCK_SIZE, help_text="Frames per audio callback")
+    latency = models.FloatField(
+        blank=True, null=True, default=None,
+        help_text="PortAudio input latency in seconds; empty for the device's default high latency",
+    )
     template = models.ForeignKey(
         "RecordingTemplate",
         related_name="recordings",
@@ -27,27 +53,108 @@ class Recording(models.Model):
         blank=True,
         default=None
     )
+    # Written by the API: {"loop": bool, "seek": seconds}
+    playback_request = models.JSONField(default=dict, blank=True)
+    # Written by the controller while playing: {"position": seconds, "underruns": int}
+    playback_status = models.JSONField(default=dict, blank=True)
+    tier = models.IntegerField(default=HOT)
+    # Capture agent holding the files; None for the controller next to the web app
+    node = models.ForeignKey(
+        "RecordingNode",
+        related_name="recordings",
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        default=None
+    )
+    # Written by the controller: health of the primary and mirror directory (recorder.targets)
+    storage_targets = models.JSONField(default=list, blank=True)
+    # Directory the indexed channel files were taken from: "primary" or "mirror"
+    indexed_target = models.CharField(max_length=16, default=PRIMARY)
+
+    class Meta:
+        # Archive search (recorder.search): every filter and ordering has an index
+        indexes = [
+            models.Index(fields=["-date", "-id"], name="recording_date"),
+            models.Index(fields=["state", "-date"], name="recording_state_date"),
+            models.Index(fields=["duration"], name="recording_duration"),
+            models.Index(fields=["channel_count"], name="recording_channel_count"),
+            models.Index(Lower("name"), name="recording_name_lower"),
+        ]
+
+    def save(self, *args, **kwargs):
+        self.channel_count = len(self.channels) if self.channels else 0
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'channels' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'channel_count'}
+        super().save(*args, **kwargs)
 
     @classmethod
-    def get_active(cls):
-        active_recordings = cls.objects.exclude(state=cls.STOPPED)
+    def get_active(cls, node=None):
+        """The recording a controller is working on; at most one per node"""
+        active_recordings = cls.objects.exclude(state=cls.STOPPED).filter(node=node)
         try:
             return active_recordings.get()
         except cls.DoesNotExist:
             return None
 
-    @property
-    def channel_count(self):
-        """Backward compatibility property to get the number of channels"""
-        return len(self.channels) if self.channels else 0
+    def template_channel_names(self):
+        """``{channel_no: name}`` from the template of the recording"""
+        if self.template_id is None:
+            return {}
+        return dict(self.template.channels.values_list('channel_no', 'name'))
 
     def __str__(self) -> str:
         return f"Recorded on {self.date} - {self.duration}"
 
 
+class RecordingNode(models.Model):
+    """A controller running as capture agent on another machine"""
+    name = models.CharField(max_length=256, unique=True)
+    agent_url = models.URLField(help_text="Base URL of the agent's file server, e.g. http://stage-pc:9035")
+    token = models.CharField(max_length=64, unique=True)
+    last_seen = models.DateTimeField(blank=True, null=True, default=None)
+
+    def __str__(self) -> str:
+        return self.name
+
+
+class AudioDevice(models.Model):
+    """Capabilities of an input device, cached whenever the devices are listed"""
+    # None for the controller next to the web app
+    node = models.ForeignKey(
+        "RecordingNode",
+        related_name="audio_devices",
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        default=None
+    )
+    index = models.IntegerField()
+    name = models.CharField(max_length=256)
+    hostapi = models.CharField(max_length=128)
+    max_input_channels = models.IntegerField()
+    default_samplerate = models.FloatField()
+    default_low_input_latency = models.FloatField()
+    default_high_input_latency = models.FloatField()
+    # Probed with check_input_settings
+    sample_rates = models.JSONField(default=list, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ["node_id", "index"]
+
+    def __str__(self) -> str:
+        return f"{self.name} ({self.node or 'local'})"
+
+
 class RecordingTemplate(models.Model):
     name = models.CharField(max_length=256)
     channel_count = models.IntegerField()
+    # Stream settings for recordings started with this template; empty for the defaults
+    sample_rate = models.IntegerField(blank=True, null=True, default=None)
+    block_size = models.IntegerField(blank=True, null=True, default=None)
+    latency = models.FloatField(blank=True, null=True, default=None)
 
 
 class RecordingTemplateChannel(models.Model):
@@ -70,3 +177,105 @@ class RecordingMarker(models.Model):
         "Recording", related_name="markers", on_delete=models.CASCADE
     )
     timestamp = models.DurationField()
+
+
+class RecordingGap(models.Model):
+    """Audio lost while the input device was gone, written by the controller"""
+    recording = models.ForeignKey(
+        "Recording", related_name="gaps", on_delete=models.CASCADE
+    )
+    # Offset in the channel files where the audio is missing
+    position = models.DurationField()
+    length = models.DurationField()
+    # Whether the files contain silence for the gap, keeping them aligned with wall-clock time;
+    # False when the recording was stopped before the device came back
+    padded = models.BooleanField(default=True)
+    reason = models.CharField(max_length=64, blank=True, default="")
+
+    class Meta:
+        ordering = ["position"]
+
+
+class RecordingFile(models.Model):
+    """Metadata of one channel file, written by the controller when it is closed"""
+    recording = models.ForeignKey(
+        "Recording", related_name="files", on_delete=models.CASCADE
+    )
+    channel_no = models.IntegerField()
+    segment = models.IntegerField(default=0)
+    filename = models.CharField(max_length=256)
+    size = models.BigIntegerField()
+    frames = models.BigIntegerField()
+    duration = models.DurationField()
+    sample_rate = models.IntegerField()
+    sample_width = models.IntegerField()
+    format = models.CharField(max_length=16, default="wav")
+    data_offset = models.IntegerField(default=44)
+    # BLAKE2b of the sample data, computed by the controller while writing
+    blake2b = models.CharField(max_length=128, blank=True, default="")
+    # Filled in by the activity analysis after the recording stopped
+    silent = models.BooleanField(default=None, null=True)
+    activity = models.JSONField(default=list, blank=True, help_text="Non-silent regions as [start, end] seconds")
+    # Filled in by the loudness analysis
+    loudness = models.FloatField(default=None, null=True, help_text="Integrated loudness in LUFS (ITU-R BS.1770)")
+    true_peak = models.FloatField(default=None, null=True, help_text="4x oversampled peak in dBTP")
+    clip_count = models.BigIntegerField(default=None, null=True, help_text="Samples at full scale")
+    dc_offset = models.FloatField(default=None, null=True, help_text="Mean sample value as a fraction of full scale")
+
+    class Meta:
+        ordering = ["segment", "channel_no"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["recording", "filename"], name="filename_unique_in_recording"
+            )
+        ]
+
+
+class MixerChannelName(models.Model):
+    """Channel name as last reported by the mixer over OSC"""
+    channel_no = models.IntegerField(unique=True)
+    name = models.CharField(max_length=256, blank=True, default="")
+    updated_at = models.DateTimeField(auto_now=True)
+
+
+class Job(models.Model):
+    """Post-processing task run by the background worker (manage.py run_jobs)"""
+    QUEUED = 0
+    RUNNING = 1
+    DONE = 2
+    FAILED = 3
+
+    kind = models.CharField(max_length=64)
+    recording = models.ForeignKey(
+        "Recording",
+        related_name="jobs",
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        default=None
+    )
+    params = models.JSONField(default=dict, blank=True)
+    priority = models.IntegerField(default=0, help_text="Higher priorities run first")
+    state = models.IntegerField(default=QUEUED)
+    progress = models.FloatField(default=0.0)
+    message = models.CharField(max_length=512, blank=True, default="")
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(blank=True, null=True, default=None)
+    finished_at = models.DateTimeField(blank=True, null=True, default=None)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["state", "-priority", "created_at"], name="job_queue_order"),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.kind} #{self.pk} ({self.progress:.0%})"
+
+
+class ChangeVersion(models.Model):
+    """
+    Single row counting writes to recordings, markers and templates; list
+    endpoints derive their ETag from it (see ``recorder.changes``)
+    """
+    version = models.BigIntegerField(default=0)
+    changed_at = models.DateTimeField(auto_now=True)
@@ -0,0 +1,93 @@
+"""
+Recording nodes: controllers running as capture agents on other machines
+
+The agent authenticates against the web app's agent API with the token of
+its ``RecordingNode``, and the web app uses the same token to fetch files
+and device lists from the agent's file server (``recorder.agent``).
+"""
+import json
+import secrets
+import urllib.error
+import urllib.parse
+import urllib.request
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from rest_framework import authentication, exceptions, permissions
+
+from .models import RecordingNode
+
+
+READ_CHUNK_SIZE = 1024 * 1024
+
+
+def generate_token():
+    return secrets.token_urlsafe(32)
+
+
+class NodeTokenAuthentication(authentication.BaseAuthentication):
+    """``Authorization: Token <token>`` of a RecordingNode; ``request.auth`` is the node"""
+    keyword = 'Token'
+
+    def authenticate(self, request):
+        header = request.headers.get('Authorization', '').split()
+        if not header or header[0] != self.keyword:
+            return None
+        if len(header) != 2:
+            raise exceptions.AuthenticationFailed("Invalid token header")
+        try:
+            node = RecordingNode.objects.get(token=header[1])
+        except RecordingNode.DoesNotExist:
+            raise exceptions.AuthenticationFailed("Invalid token")
+        return AnonymousUser(), node
+
+    def authenticate_header(self, request):
+        return self.keyword
+
+
+class IsNode(permissions.BasePermission):
+    def has_permission(self, request, view):
+        return isinstance(request.auth, RecordingNode)
+
+
+class NodeUnavailable(Exception):
+    pass
+
+
+def node_request(node, path):
+    """Open ``path`` on the node's file server; the caller closes the response"""
+    request = urllib.request.Request(
+        node.agent_url.rstrip('/') + '/' + path,
+        headers={'Authorization': f'Token {node.token}'},
+    )
+    try:
+        return urllib.request.urlopen(request, timeout=settings.NODE_TIMEOUT)
+    except (urllib.error.URLError, OSError) as e:
+        raise NodeUnavailable(f"{node}: {e}") from e
+
+
+def node_devices(node):
+    """``(devices, hostapis)`` as reported by the node's audio backend"""
+    with node_request(node, 'devices') as response:
+        data = json.load(response)
+    return data['devices'], data['hostapis']
+
+
+def remote_file_chunks(recording_file):
+    recording = recording_file.recording
+    path = (
+        f"recordings/{recording.uuid}/{urllib.parse.quote(recording_file.filename)}"
+        f"?target={recording.indexed_target}"
+    )
+    with node_request(recording.node, path) as response:
+        while True:
+            chunk = response.read(READ_CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
+
+
+def remote_archive_entries(recording_files):
+    """Like ``archive_entries``, with the channel files fetched from the node"""
+    for recording_file in recording_files:
+        yield recording_file.filename, remote_file_chunks(recording_file)
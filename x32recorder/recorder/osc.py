@@ -0,0 +1,193 @@
+"""
+Minimal OSC (Open Sound Control) support for talking to the X32
+
+Only the parts of OSC 1.0 the console uses are implemented: messages and
+bundles with int, float, string, blob and boolean arguments.
+"""
+import logging
+import socket
+import struct
+import threading
+import time
+
+from django.conf import settings
+
+
+
+log = logging.getLogger(__name__)
+
+CHANNEL_NAME_PREFIX = '/ch/'
+CHANNEL_NAME_SUFFIX = '/config/name'
+XREMOTE_INTERVAL = 9.0  # the X32 drops /xremote subscribers after 10 s
+MAX_BUNDLE_DEPTH = 8  # the console never nests bundles; deeper packets are rejected, not recursed into
+
+
+def _pad(data):
+    return data + b'\0' * (4 - len(data) % 4)
+
+
+def encode_message(address, *args):
+    """Encode an OSC message"""
+    typetags = ','
+    payload = b''
+    for arg in args:
+        if isinstance(arg, bool):
+            typetags += 'T' if arg else 'F'
+        elif isinstance(arg, int):
+            typetags += 'i'
+            payload += struct.pack('>i', arg)
+        elif isinstance(arg, float):
+            typetags += 'f'
+            payload += struct.pack('>f', arg)
+        elif isinstance(arg, str):
+            typetags += 's'
+            payload += _pad(arg.encode())
+        elif isinstance(arg, bytes):
+            typetags += 'b'
+            payload += struct.pack('>i', len(arg)) + arg + b'\0' * (-len(arg) % 4)
+        else:
+            raise TypeError(f"Unsupported OSC argument type: {type(arg).__name__}")
+    return _pad(address.encode()) + _pad(typetags.encode()) + payload
+
+
+def _read_string(data, offset):
+    end = data.index(b'\0', offset)
+    return data[offset:end].decode(errors='replace'), (end + 4) & ~3
+
+
+def decode_packet(data, depth=0):
+    """Decode an OSC packet into a list of ``(address, args)`` messages"""
+    if data.startswith(b'#bundle\0'):
+        if depth >= MAX_BUNDLE_DEPTH:
+            raise ValueError("OSC bundles nested too deeply")
+        messages = []
+        offset = 16  # '#bundle\0' + 8 byte timetag
+        while offset + 4 <= len(data):
+            (size,) = struct.unpack_from('>i', data, offset)
+            messages.extend(decode_packet(data[offset + 4:offset + 4 + size], depth + 1))
+            offset += 4 + size
+        return messages
+
+    address, offset = _read_string(data, 0)
+    if offset >= len(data):
+        return [(address, [])]
+    typetags, offset = _read_string(data, offset)
+
+    args = []
+    for tag in typetags[1:]:
+        if tag == 'i':
+            args.append(struct.unpack_from('>i', data, offset)[0])
+            offset += 4
+        elif tag == 'f':
+            args.append(struct.unpack_from('>f', data, offset)[0])
+            offset += 4
+        elif tag == 's':
+            value, offset = _read_string(data, offset)
+            args.append(value)
+        elif tag == 'b':
+            (size,) = struct.unpack_from('>i', data, offset)
+            args.append(data[offset + 4:offset + 4 + size])
+            offset += 4 + size + (-size % 4)
+        elif tag in 'TF':
+            args.append(tag == 'T')
+        elif tag == 'N':
+            args.append(None)
+        else:
+            raise ValueError(f"Unsupported OSC type tag: {tag}")
+    return [(address, args)]
+
+
+class OscControlServer:
+    """
+    Receives OSC control messages for the controller
+
+    Messages listed in ``settings.OSC_ACTIONS`` are turned into
+    ``(action, received_at)`` tuples on ``command_queue``; the controller's
+    main loop blocks on that queue, so a trigger is handled as soon as it
+    arrives instead of on the next poll. If a mixer is configured, the
+    server keeps an ``/xremote`` subscription alive and caches the console's
+    channel names.
+    """
+
+    def __init__(self, command_queue, host=None, port=None, mixer_host=None, mixer_port=None, save_channel_name=None):
+        self.command_queue = command_queue
+        # Called with (channel_no, name) when the mixer reports a new channel name
+        self.save_channel_name = save_channel_name
+        self.host = host or settings.OSC_HOST
+        self.port = port or settings.OSC_PORT
+        self.mixer_host = settings.OSC_MIXER_HOST if mixer_host is None else mixer_host
+        self.mixer_port = mixer_port or settings.OSC_MIXER_PORT
+        self.actions = settings.OSC_ACTIONS
+        self.channel_names = {}
+        self.running = False
+
+    def start(self):
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.bind((self.host, self.port))
+        self.socket.settimeout(0.5)
+        self.running = True
+
+        threading.Thread(target=self._receive_loop, name="osc-receive", daemon=True).start()
+        if self.mixer_host:
+            threading.Thread(target=self._mixer_loop, name="osc-mixer", daemon=True).start()
+
+    def stop(self):
+        self.running = False
+
+    def send_to_mixer(self, address, *args):
+        self.socket.sendto(encode_message(address, *args), (self.mixer_host, self.mixer_port))
+
+    def request_channel_names(self):
+        for channel_no in range(1, settings.OSC_MIXER_CHANNELS + 1):
+            self.send_to_mixer(f'{CHANNEL_NAME_PREFIX}{channel_no:02d}{CHANNEL_NAME_SUFFIX}')
+
+    def _mixer_loop(self):
+        next_name_refresh = 0
+        while self.running:
+            self.send_to_mixer('/xremote')
+            if time.monotonic() >= next_name_refresh:
+                self.request_channel_names()
+                next_name_refresh = time.monotonic() + settings.OSC_NAME_REFRESH_INTERVAL
+            time.sleep(XREMOTE_INTERVAL)
+
+    def _receive_loop(self):
+        while self.running:
+            try:
+                data, _ = self.socket.recvfrom(65536)
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            received_at = time.monotonic()
+
+            try:
+                messages = decode_packet(data)
+            except (ValueError, struct.error, IndexError):
+                log.warning("Ignoring malformed OSC packet (%d bytes)", len(data))
+                continue
+
+            for address, args in messages:
+                self.handle_message(address, args, received_at)
+
+    def handle_message(self, address, args, received_at):
+        action = self.actions.get(address)
+        if action:
+            # Buttons send 1 on press and 0 on release; only react to the press
+            if not args or args[0]:
+                self.command_queue.put((action, received_at))
+            return
+
+        if address.startswith(CHANNEL_NAME_PREFIX) and address.endswith(CHANNEL_NAME_SUFFIX) and args:
+            try:
+                channel_no = int(address[len(CHANNEL_NAME_PREFIX):-len(CHANNEL_NAME_SUFFIX)])
+            except ValueError:
+                return
+            name = str(args[0]).strip()
+            if self.channel_names.get(channel_no) != name and self.save_channel_name:
+                try:
+                    self.save_channel_name(channel_no, name)
+                except Exception as e:
+                    # Not cached, so the next name refresh tries again
+                    log.warning("Could not store the name of channel %d: %s", channel_no, e)
+                    return
+                self.channel_names[channel_no] = name
@@ -0,0 +1,160 @@
+"""
+Multitrack playback for virtual soundcheck
+
+``MultiChannelPlayer`` streams the per-channel files of a recording to the
+output channels of an audio device. The files are memory-mapped; a prefetch
+thread decodes them into a preallocated ring buffer and the output callback
+only copies from that ring, so the realtime path never touches the disk or
+allocates memory.
+
+The ring is single-producer/single-consumer: the prefetch thread only
+advances ``write_pos`` and the callback only advances ``read_pos``.
+"""
+import threading
+import time
+
+import numpy as np
+
+from .wavfile import map_wave_data, pcm24_to_int32, read_wave_info
+
+
+class MultiChannelPlayer:
+    def __init__(self, channel_files, sample_rate, device=None, blocksize=1024,
+                 output_channels=None, ring_seconds=2.0, prefetch_frames=8192,
+                 loop=False, stream_factory=None):
+        """
+        ``channel_files`` is a list of ``(output_channel, path)`` pairs with
+        0-based output channel indices. ``stream_factory`` defaults to the
+        configured backend's ``OutputStream``; tests can pass a fake.
+        """
+        self.sample_rate = sample_rate
+        self.device = device
+        self.blocksize = blocksize
+        self.loop = loop
+        self.prefetch_frames = prefetch_frames
+        self.stream_factory = stream_factory
+
+        self.tracks = []
+        for output_channel, path in channel_files:
+            info = read_wave_info(path)
+            if info.sample_width != 3 or info.channels != 1:
+                raise ValueError(f"{path}: only mono 24-bit files can be played back")
+            self.tracks.append((output_channel, map_wave_data(path, info)))
+
+        self.length = max((len(data) for _, data in self.tracks), default=0)
+        self.output_channels = output_channels or max((ch for ch, _ in self.tracks), default=0) + 1
+
+        ring_frames = int(ring_seconds * sample_rate)
+        self.ring = np.zeros((ring_frames, self.output_channels), dtype=np.float32)
+        self.write_pos = 0
+        self.read_pos = 0
+        self.discard_until = 0
+
+        self.source_pos = 0
+        self.seek_request = None
+        self.end_of_data = False
+        self.finished = False
+        self.underruns = 0
+        self.running = False
+        self.stream = None
+
+    @property
+    def position(self):
+        """Approximate playback position in seconds"""
+        buffered = self.write_pos - max(self.read_pos, self.discard_until)
+        frames = self.source_pos - buffered
+        if self.loop and self.length:
+            frames %= self.length
+        return max(0, frames) / self.sample_rate
+
+    def seek(self, seconds):
+        """Jump to a position; takes effect with the next prefetched chunk"""
+        self.seek_request = int(max(0.0, seconds) * self.sample_rate)
+
+    def start(self):
+        if self.stream_factory is None:
+            from .audio import get_backend
+            self.stream_factory = get_backend().OutputStream
+
+        self.running = True
+        self._fill()  # prime the ring before the first callback
+        self.prefetch_thread = threading.Thread(target=self._prefetch_loop, name="playback-prefetch", daemon=True)
+        self.prefetch_thread.start()
+
+        self.stream = self.stream_factory(
+            device=self.device,
+            channels=self.output_channels,
+            samplerate=self.sample_rate,
+            blocksize=self.blocksize,
+            dtype=np.float32,
+            callback=self._callback,
+        )
+        self.stream.start()
+
+    def stop(self):
+        self.running = False
+        if self.stream:
+            self.stream.stop()
+            self.stream.close()
+            self.stream = None
+        if hasattr(self, 'prefetch_thread'):
+            self.prefetch_thread.join()
+
+    def _prefetch_loop(self):
+        while self.running:
+            if not self._fill():
+                time.sleep(0.005)
+
+    def _fill(self):
+        """Decode the next chunk into the ring; returns False if there was nothing to do"""
+        if self.seek_request is not None:
+            self.source_pos, self.seek_request = self.seek_request, None
+            self.end_of_data = False
+            # Everything already in the ring belongs to the old position
+            self.discard_until = self.write_pos
+
+        ring_frames = len(self.ring)
+        # The callback skips everything before discard_until, so it may be overwritten
+        free = ring_frames - (self.write_pos - max(self.read_pos, self.discard_until))
+        if self.end_of_data or free < self.prefetch_frames:
+            return False
+
+        if self.source_pos >= self.length:
+            if not self.loop or not self.length:
+                self.end_of_data = True
+                return False
+            self.source_pos = 0
+
+        frames = min(self.prefetch_frames, self.length - self.source_pos)
+        start = self.write_pos % ring_frames
+        first = min(frames, ring_frames - start)
+
+        chunk = np.zeros((frames, self.output_channels), dtype=np.float32)
+        for output_channel, data in self.tracks:
+            samples = data[self.source_pos:self.source_pos + frames]
+            chunk[:len(samples), output_channel] = pcm24_to_int32(samples) / float(2**23)
+
+        self.ring[start:start + first] = chunk[:first]
+        self.ring[:frames - first] = chunk[first:]
+        self.source_pos += frames
+        self.write_pos += frames
+        return True
+
+    def _callback(self, outdata, frames, time_info, status):
+        ring_frames = len(self.ring)
+        if self.read_pos < self.discard_until:
+            self.read_pos = self.discard_until
+
+        available = min(frames, self.write_pos - self.read_pos)
+        start = self.read_pos % ring_frames
+        first = min(available, ring_frames - start)
+        outdata[:first] = self.ring[start:start + first]
+        outdata[first:available] = self.ring[:available - first]
+        outdata[available:] = 0
+        self.read_pos += available
+
+        if available < frames:
+            if self.end_of_data:
+                self.finished = True
+            else:
+                self.underruns += 1
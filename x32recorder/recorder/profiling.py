@@ -0,0 +1,117 @@
+"""
+Profiling hooks
+
+- ``ServerTimingMixin`` adds the time spent serializing to the per-request
+  timings collected by ``ServerTimingMiddleware`` (enabled with
+  ``SERVER_TIMING``), which reports them in a ``Server-Timing`` header.
+- ``SamplingProfiler`` samples the stacks of all threads of a running
+  process for a few seconds and writes them as folded stacks (one
+  ``thread;frame;frame count`` line per stack), the input format of
+  flamegraph.pl, speedscope and inferno. The controller starts one on SIGUSR2.
+"""
+import collections
+import logging
+import os
+import sys
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+
+log = logging.getLogger(__name__)
+
+
+def add_timing(request, name, seconds):
+    """Accumulate a duration for the Server-Timing header, if enabled for this request"""
+    timings = getattr(request, 'server_timing', None)
+    if timings is not None:
+        timings[name] = timings.get(name, 0.0) + seconds
+
+
+class ServerTimingMixin:
+    """ViewSet mixin timing ``serializer.data`` for the Server-Timing header"""
+
+    def get_serializer(self, *args, **kwargs):
+        serializer = super().get_serializer(*args, **kwargs)
+        if getattr(self.request, 'server_timing', None) is None:
+            return serializer
+
+        to_representation = serializer.to_representation
+        request = self.request
+
+        def timed_to_representation(instance):
+            started = time.perf_counter()
+            try:
+                return to_representation(instance)
+            finally:
+                add_timing(request, 'serialize', time.perf_counter() - started)
+
+        serializer.to_representation = timed_to_representation
+        return serializer
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    """Samples every thread's stack at a fixed interval and writes folded stacks"""
+
+    def __init__(self, output_dir, duration=10.0, interval=0.005, thread_names=None, prefix='profile'):
+        self.output_dir = Path(output_dir)
+        self.duration = duration
+        self.interval = interval
+        # Callable returning {thread ident: name} for threads not known to ``threading``
+        self.thread_names = thread_names
+        self.prefix = prefix
+        self.thread = None
+
+    @property
+    def running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def start(self):
+        """Start a sampling run in the background; ignored while one is running"""
+        if self.running:
+            return False
+        self.thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+        self.thread.start()
+        return True
+
+    def _names(self):
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        if self.thread_names:
+            names.update(self.thread_names())
+        return names
+
+    def sample(self, stacks):
+        own = threading.get_ident()
+        names = self._names()
+        for ident, frame in sys._current_frames().items():
+            if ident == own:
+                continue
+            labels = []
+            while frame is not None:
+                labels.append(_frame_label(frame))
+                frame = frame.f_back
+            labels.append(names.get(ident, f"thread-{ident}"))
+            stacks[';'.join(reversed(labels))] += 1
+
+    def _run(self):
+        stacks = collections.Counter()
+        deadline = time.monotonic() + self.duration
+        samples = 0
+        while time.monotonic() < deadline:
+            self.sample(stacks)
+            samples += 1
+            time.sleep(self.interval)
+
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        path = self.output_dir / f"{self.prefix}-{datetime.now():%Y%m%d-%H%M%S}.folded"
+        with open(path, 'w') as f:
+            for stack, count in stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        log.info("Profile with %d samples written to %s", samples, path)
+        self.path = path
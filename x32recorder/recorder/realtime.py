@@ -0,0 +1,88 @@
+"""
+Opt-in realtime hardening for the capture path
+
+Everything here is best effort: each helper returns False (and the caller
+prints why) when the platform or the process permissions do not allow it,
+so the hardened mode degrades gracefully on Windows/macOS or without
+CAP_SYS_NICE / a sufficient RLIMIT_MEMLOCK.
+"""
+import ctypes
+import ctypes.util
+import gc
+import os
+
+
+_libc = None
+
+
+def _get_libc():
+    global _libc
+    if _libc is None:
+        name = ctypes.util.find_library('c')
+        _libc = ctypes.CDLL(name, use_errno=True) if name else False
+    return _libc
+
+
+def pin_current_thread(cpus):
+    """Restrict the calling thread to the given CPU numbers (Linux)"""
+    if not cpus or not hasattr(os, 'sched_setaffinity'):
+        return False
+    try:
+        # pid 0 addresses the calling thread, not the whole process
+        os.sched_setaffinity(0, set(cpus))
+        return True
+    except OSError:
+        return False
+
+
+def set_realtime_priority(priority):
+    """Switch the calling thread to SCHED_FIFO with the given priority"""
+    if not hasattr(os, 'sched_setscheduler'):
+        return False
+    try:
+        os.sched_setscheduler(0, os.SCHED_FIFO, os.sched_param(priority))
+        return True
+    except OSError:
+        return False
+
+
+def lock_memory(array):
+    """mlock() the memory of a NumPy array so it is never paged out"""
+    libc = _get_libc()
+    if not libc or not hasattr(libc, 'mlock'):
+        return False
+    address, _ = array.__array_interface__['data']
+    return libc.mlock(ctypes.c_void_p(address), ctypes.c_size_t(array.nbytes)) == 0
+
+
+def unlock_memory(array):
+    libc = _get_libc()
+    if not libc or not hasattr(libc, 'munlock'):
+        return False
+    address, _ = array.__array_interface__['data']
+    return libc.munlock(ctypes.c_void_p(address), ctypes.c_size_t(array.nbytes)) == 0
+
+
+def pause_gc():
+    """
+    Stop automatic cyclic garbage collection
+
+    Everything alive now is moved to the permanent generation, so the
+    explicit young-generation collections done by ``collect_young()``
+    only have to look at objects created since.
+    """
+    gc.collect()
+    if hasattr(gc, 'freeze'):
+        gc.freeze()
+    gc.disable()
+
+
+def resume_gc():
+    if hasattr(gc, 'unfreeze'):
+        gc.unfreeze()
+    gc.enable()
+
+
+def collect_young():
+    """Collect only the youngest generation; called from the main loop at a time of our choosing"""
+    return gc.collect(0)
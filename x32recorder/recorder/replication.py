@@ -0,0 +1,535 @@
+"""
+Network replication of recordings to a standby recorder
+
+With ``REPLICATION_TARGET`` set, the controller streams every captured
+block over TCP to a second x32-recorder whose controller runs a
+``ReplicationReceiver`` (``REPLICATION_LISTEN``). The standby writes the
+same channel files, byte for byte.
+
+Every message starts with a ``!BI`` header (type, payload length):
+
+- HELLO (JSON): token and the recording: uuid, file names, channel
+  numbers, sample rate, channels, audio device and start time
+- RESUME (standby, JSON): ``last_seq`` the standby already has of this
+  recording, -1 for none; the sender continues after it
+- BLOCK: ``!QQI`` sequence number, frame offset and frame count, then the
+  packed 24-bit samples, one row per channel
+- STOP (JSON): sequence number of the last block and the BLAKE2b digest
+  per file name
+- CLOSED (standby, JSON): whether the standby's files match the digests
+
+Blocks are sent in batches of everything pending, one ``sendall`` per
+batch. The sender keeps the last ``REPLICATION_BACKLOG_SECONDS`` of blocks:
+after a dropped connection it reconnects with backoff and backfills from
+the standby's ``last_seq``. Blocks that fell out of the backlog meanwhile
+are padded with silence on the standby, whose files then no longer match.
+
+If the connection of the primary drops during a recording and does not
+come back within ``REPLICATION_TAKEOVER_SECONDS``, the standby closes its
+copy and hands it to ``on_closed`` (indexed as a stopped recording), then
+calls ``on_takeover`` (the controller starts recording itself).
+"""
+import collections
+import datetime
+import hashlib
+import hmac
+import itertools
+import json
+import logging
+import math
+import socket
+import struct
+import threading
+import uuid as uuid_module
+import wave
+from pathlib import Path
+
+from .targets import DEGRADED, FAILED, OK, WriterTarget
+
+
+log = logging.getLogger(__name__)
+
+REPLICA = 'replica'
+
+HELLO = 1
+RESUME = 2
+BLOCK = 3
+STOP = 4
+CLOSED = 5
+
+HEADER = struct.Struct('!BI')
+BLOCK_HEADER = struct.Struct('!QQI')
+
+# Blocks per sendall; bounds the memory of one batch
+BATCH_BLOCKS = 32
+# Read before the token is checked, so an unauthenticated peer cannot make the standby allocate more
+MAX_HELLO_SIZE = 64 * 1024
+RETRY_INTERVAL = 0.5
+MAX_RETRY_INTERVAL = 5.0
+
+
+def parse_address(address):
+    """``"host:port"`` to a ``(host, port)`` tuple"""
+    host, _, port = address.rpartition(':')
+    return host or '0.0.0.0', int(port)
+
+
+def encode_message(kind, payload):
+    if not isinstance(payload, (bytes, bytearray)):
+        payload = json.dumps(payload).encode()
+    return HEADER.pack(kind, len(payload)) + payload
+
+
+def valid_hello(hello):
+    """Whether a HELLO payload describes a recording the standby can write"""
+    if not isinstance(hello, dict):
+        return False
+    try:
+        uuid_module.UUID(str(hello['uuid']))
+        filenames = hello['filenames']
+        channel_numbers = hello['channel_numbers']
+        sample_rate = hello['sample_rate']
+    except (KeyError, ValueError):
+        return False
+    return (
+        isinstance(filenames, list)
+        and isinstance(channel_numbers, list)
+        and len(filenames) == len(channel_numbers)
+        # Plain file names only, so nothing is written outside the recording directory
+        and all(isinstance(name, str) and name and Path(name).name == name for name in filenames)
+        and all(isinstance(channel_no, int) for channel_no in channel_numbers)
+        and isinstance(sample_rate, int)
+        and sample_rate > 0
+    )
+
+
+def valid_stop(stop):
+    """Whether a STOP payload carries the digests the standby checks its files against"""
+    return (
+        isinstance(stop, dict)
+        and isinstance(stop.get('digests'), dict)
+        and all(isinstance(digest, str) for digest in stop['digests'].values())
+    )
+
+
+def read_exactly(stream, size):
+    data = stream.read(size)
+    if len(data) < size:
+        raise ConnectionError("connection closed")
+    return data
+
+
+def read_message(stream, max_length=None):
+    """``(type, payload)`` of the next message on a buffered socket file"""
+    kind, length = HEADER.unpack(read_exactly(stream, HEADER.size))
+    if max_length is not None and length > max_length:
+        raise ValueError(f"message of {length} bytes exceeds {max_length}")
+    return kind, read_exactly(stream, length)
+
+
+class ReplicationTarget(WriterTarget):
+    """
+    Storage target streaming the blocks to a standby recorder. Its writer
+    thread packs the blocks into the backlog, a second thread sends them, so
+    a stalled connection never backs up into the capture ring.
+    """
+    local = False
+
+    def __init__(self, address, token, info, backlog_seconds, timeout):
+        super().__init__(REPLICA, address)
+        self.address = address
+        self.token = token
+        # channels and audiodevice_index of the recording, for the standby's index
+        self.info = info
+        self.backlog_seconds = backlog_seconds
+        self.timeout = timeout
+        self.backlog = collections.deque()
+        self.backlog_cond = threading.Condition()
+        self.backlog_lost = 0
+        self.next_seq = 0
+        self.frames_sent = 0
+        self.next_to_send = 0
+        self.stop_message = None
+        self.connected = False
+        self.verified = None
+        self.abandoned = threading.Event()
+        self.sender = None
+
+    @property
+    def state(self):
+        if self.error:
+            return FAILED
+        if self.dropped_blocks or self.verified is False:
+            return DEGRADED
+        if self.sender is not None and self.verified is None and not self.connected:
+            return DEGRADED
+        return OK
+
+    @property
+    def dropped_blocks(self):
+        return super().dropped_blocks + self.backlog_lost
+
+    def open(self, uuid, filenames, sample_rate):
+        self.uuid = str(uuid)
+        self.filenames = list(filenames)
+        self.sample_rate = sample_rate
+        self.started_at = datetime.datetime.now().astimezone().isoformat()
+        self.hashers = [hashlib.blake2b() for _ in self.filenames]
+
+    def start(self, slots, frames, channel_numbers, pin=None):
+        self.channel_numbers = list(channel_numbers)
+        self.backlog_blocks = math.ceil(self.backlog_seconds * self.sample_rate / frames)
+        super().start(slots, frames, channel_numbers, pin)
+        self.sender = threading.Thread(target=self._send_loop, name="replica-sender", daemon=True)
+        self.sender.start()
+
+    def write_block(self, pcm, frames):
+        header = BLOCK_HEADER.pack(self.next_seq, self.frames_sent, frames)
+        message = encode_message(BLOCK, header + pcm.tobytes())
+        with self.backlog_cond:
+            if len(self.backlog) >= self.backlog_blocks:
+                seq, _ = self.backlog.popleft()
+                if seq >= self.next_to_send:
+                    # Never reached the standby
+                    self.backlog_lost += 1
+            self.backlog.append((self.next_seq, message))
+            self.next_seq += 1
+            self.frames_sent += frames
+            self.backlog_cond.notify()
+
+    def close(self):
+        digests = {filename: hasher.hexdigest() for filename, hasher in zip(self.filenames, self.hashers)}
+        with self.backlog_cond:
+            self.stop_message = encode_message(STOP, {'last_seq': self.next_seq - 1, 'digests': digests})
+            self.backlog_cond.notify()
+
+    def fail(self, error, close=True):
+        super().fail(error, close)
+        # Nothing more will be sent
+        self.abandoned.set()
+        with self.backlog_cond:
+            self.backlog_cond.notify()
+
+    def finish(self, timeout):
+        super().finish(timeout)
+        if self.sender is None:
+            return
+        self.sender.join(self.timeout)
+        if self.sender.is_alive() or self.verified is None:
+            self.fail(f"standby {self.address} did not confirm the recording")
+        elif not self.verified:
+            log.warning("Standby copy of %s differs from the primary (blocks lost while disconnected)", self.uuid)
+
+    def digests(self):
+        return {}
+
+    def health(self):
+        health = super().health()
+        health.update(connected=self.connected, verified=self.verified)
+        return health
+
+    def _hello(self):
+        return encode_message(HELLO, {
+            'token': self.token,
+            'uuid': self.uuid,
+            'filenames': self.filenames,
+            'channel_numbers': self.channel_numbers,
+            'sample_rate': self.sample_rate,
+            'started_at': self.started_at,
+            **self.info,
+        })
+
+    def _send_loop(self):
+        """Connect, backfill and stream until the standby confirmed the stop"""
+        interval = RETRY_INTERVAL
+        while not self.abandoned.is_set():
+            try:
+                sock = socket.create_connection(parse_address(self.address), timeout=self.timeout)
+            except OSError as e:
+                log.warning("Standby %s unreachable: %s", self.address, e)
+                self.abandoned.wait(interval)
+                interval = min(interval * 2, MAX_RETRY_INTERVAL)
+                continue
+
+            interval = RETRY_INTERVAL
+            try:
+                with sock:
+                    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                    if self._stream(sock):
+                        return
+            except (OSError, ValueError) as e:
+                log.warning("Replication to %s interrupted: %s", self.address, e)
+            finally:
+                self.connected = False
+
+    def _stream(self, sock):
+        stream = sock.makefile('rb')
+        sock.sendall(self._hello())
+        kind, payload = read_message(stream)
+        if kind != RESUME:
+            raise ValueError(f"unexpected message {kind} instead of RESUME")
+        resume_at = json.loads(payload)['last_seq'] + 1
+        self.connected = True
+        if resume_at < self.next_to_send:
+            log.info("Backfilling %d blocks to %s", self.next_to_send - resume_at, self.address)
+        self.next_to_send = resume_at
+
+        while not self.abandoned.is_set():
+            with self.backlog_cond:
+                while (
+                    self.next_to_send >= self.next_seq
+                    and self.stop_message is None
+                    and not self.abandoned.is_set()
+                ):
+                    self.backlog_cond.wait(0.5)
+                if self.next_to_send < self.next_seq:
+                    first_seq = self.backlog[0][0]
+                    # Blocks older than the backlog are gone; the standby pads them
+                    start = max(0, self.next_to_send - first_seq)
+                    batch = list(itertools.islice(self.backlog, start, start + BATCH_BLOCKS))
+                    stop_message = None
+                else:
+                    batch = []
+                    stop_message = self.stop_message
+
+            if batch:
+                sock.sendall(b''.join(message for _, message in batch))
+                self.next_to_send = batch[-1][0] + 1
+            elif stop_message is not None:
+                sock.sendall(stop_message)
+                kind, payload = read_message(stream)
+                if kind != CLOSED:
+                    raise ValueError(f"unexpected message {kind} instead of CLOSED")
+                self.verified = json.loads(payload)['verified']
+                return True
+        return False
+
+
+class _Session:
+    """The standby copy of one recording"""
+
+    def __init__(self, root, hello):
+        self.hello = hello
+        self.uuid = hello['uuid']
+        self.channel_numbers = hello['channel_numbers']
+        self.directory = Path(root) / self.uuid
+        self.lock = threading.Lock()
+        self.last_seq = -1
+        self.frames = 0
+        self.padded_frames = 0
+        self.error = ''
+        self.closed = False
+        self.verified = False
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.paths = [self.directory / filename for filename in hello['filenames']]
+        self.wave_files = []
+        for path in self.paths:
+            wave_file = wave.open(str(path), 'wb')
+            wave_file.setnchannels(1)
+            wave_file.setsampwidth(3)
+            wave_file.setframerate(hello['sample_rate'])
+            self.wave_files.append(wave_file)
+        self.hashers = [hashlib.blake2b() for _ in self.paths]
+
+    def write_block(self, seq, offset, frames, samples):
+        if seq <= self.last_seq or self.error or self.closed:
+            # Already written before a reconnect
+            return
+        if offset < self.frames:
+            log.warning("Replica %s: block %d overlaps written frames, skipped", self.uuid, seq)
+            return
+        try:
+            if offset > self.frames:
+                missing = offset - self.frames
+                log.warning("Replica %s: %d frames lost before block %d, padded with silence", self.uuid, missing, seq)
+                self._write_rows([bytes(missing * 3)] * len(self.wave_files))
+                self.padded_frames += missing
+            row = frames * 3
+            self._write_rows([samples[idx * row:(idx + 1) * row] for idx in range(len(self.wave_files))])
+        except OSError as e:
+            self.error = str(e)
+            log.error("Replica %s: writing failed, copy stopped: %s", self.uuid, e)
+            return
+        self.frames = offset + frames
+        self.last_seq = seq
+
+    def _write_rows(self, rows):
+        for wave_file, hasher, row in zip(self.wave_files, self.hashers, rows):
+            wave_file.writeframesraw(row)
+            hasher.update(row)
+
+    def close(self, digests=None):
+        """Finalize the files; ``digests`` are the primary's, None when it was lost"""
+        self.closed = True
+        try:
+            for wave_file in self.wave_files:
+                wave_file.close()
+        except OSError as e:
+            self.error = self.error or str(e)
+        self.verified = (
+            digests is not None
+            and not self.error
+            and all(
+                digests.get(path.name) == hasher.hexdigest()
+                for path, hasher in zip(self.paths, self.hashers)
+            )
+        )
+
+    def channel_files(self):
+        return [(channel_no, str(path)) for channel_no, path in zip(self.channel_numbers, self.paths)]
+
+    def digests(self):
+        return {str(path): hasher.hexdigest() for path, hasher in zip(self.paths, self.hashers)}
+
+
+class ReplicationReceiver:
+    """
+    Standby side: accepts the primary's connection and writes its
+    recordings to ``recording_path``. ``on_closed(session)`` runs once per
+    recording with the closed copy, ``on_takeover(session)`` after the
+    primary was lost in the middle of one.
+    """
+
+    def __init__(self, host, port, token, recording_path, on_closed, on_takeover, takeover_seconds):
+        self.token = token
+        self.recording_path = recording_path
+        self.on_closed = on_closed
+        self.on_takeover = on_takeover
+        self.takeover_seconds = takeover_seconds
+        self.lock = threading.Lock()
+        self.session = None
+        self.connection = None
+        self.takeover_timer = None
+        self.listener = socket.create_server((host, port))
+        self.thread = threading.Thread(target=self._serve, name="replica-receiver", daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.listener.close()
+
+    def _serve(self):
+        while True:
+            try:
+                sock, address = self.listener.accept()
+            except OSError:
+                return
+            threading.Thread(
+                target=self._handle, args=(sock, address), name="replica-connection", daemon=True
+            ).start()
+
+    def _authorized(self, token):
+        return bool(self.token) and hmac.compare_digest(str(token), self.token)
+
+    def _handle(self, sock, address):
+        # The primary streams continuously while recording; silence means it is gone
+        sock.settimeout(self.takeover_seconds)
+        attached = False
+        try:
+            # The file keeps the socket open until it is closed itself
+            with sock, sock.makefile('rb') as stream:
+                kind, payload = read_message(stream, MAX_HELLO_SIZE)
+                hello = json.loads(payload) if kind == HELLO else {}
+                if not isinstance(hello, dict) or not self._authorized(hello.get('token', '')):
+                    log.warning("Rejected replication connection from %s", address[0])
+                    return
+                if not valid_hello(hello):
+                    log.warning("Rejected replication connection from %s: malformed HELLO", address[0])
+                    return
+                session = self._attach(sock, hello)
+                attached = True
+                # Waits until a previous connection of this session has let go
+                with session.lock:
+                    sock.sendall(encode_message(RESUME, {'last_seq': session.last_seq}))
+                    self._receive(sock, stream, session)
+        except (OSError, ValueError, struct.error) as e:
+            log.warning("Replication connection from %s ended: %s", address[0], e)
+        finally:
+            if attached:
+                self._detach(sock)
+
+    def _attach(self, sock, hello):
+        with self.lock:
+            if self.connection is not None:
+                # A reconnect while the old connection has not timed out yet
+                try:
+                    self.connection.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+            self.connection = sock
+            if self.takeover_timer is not None:
+                self.takeover_timer.cancel()
+                self.takeover_timer = None
+
+            previous = self.session
+            if previous is not None and previous.uuid == hello['uuid']:
+                return previous
+            self.session = _Session(self.recording_path, hello)
+            log.info("Receiving recording %s from %s", hello['uuid'], sock.getpeername()[0])
+
+        if previous is not None and not previous.closed:
+            # The primary started over before the takeover timeout
+            with previous.lock:
+                previous.close()
+            self._closed(previous)
+        return self.session
+
+    def _detach(self, sock):
+        with self.lock:
+            if self.connection is not sock:
+                return
+            self.connection = None
+            session = self.session
+            if session is not None and not session.closed:
+                self.takeover_timer = threading.Timer(self.takeover_seconds, self._take_over, args=(session,))
+                self.takeover_timer.name = "replica-takeover"
+                self.takeover_timer.daemon = True
+                self.takeover_timer.start()
+
+    def _receive(self, sock, stream, session):
+        while True:
+            kind, payload = read_message(stream)
+            if kind == BLOCK:
+                seq, offset, frames = BLOCK_HEADER.unpack_from(payload)
+                session.write_block(seq, offset, frames, memoryview(payload)[BLOCK_HEADER.size:])
+            elif kind == STOP:
+                stop = json.loads(payload)
+                if not valid_stop(stop):
+                    raise ValueError("malformed STOP")
+                first = not session.closed
+                if first:
+                    session.close(stop['digests'])
+                sock.sendall(encode_message(CLOSED, {
+                    'verified': session.verified,
+                    'padded_frames': session.padded_frames,
+                }))
+                if first:
+                    log.info("Recording %s replicated, %d frames, verified=%s",
+                             session.uuid, session.frames, session.verified)
+                    self._closed(session)
+                return
+            else:
+                raise ValueError(f"unexpected message {kind}")
+
+    def _take_over(self, session):
+        with self.lock:
+            if self.session is not session or self.connection is not None:
+                return
+            self.takeover_timer = None
+        log.warning("Primary lost during recording %s, closing the standby copy after %d frames",
+                    session.uuid, session.frames)
+        with session.lock:
+            session.close()
+        self._closed(session)
+        try:
+            self.on_takeover(session)
+        except Exception:
+            log.exception("Takeover after recording %s failed", session.uuid)
+
+    def _closed(self, session):
+        try:
+            self.on_closed(session)
+        except Exception:
+            log.exception("Could not index the standby copy of %s", session.uuid)
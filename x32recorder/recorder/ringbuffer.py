@@ -0,0 +1,66 @@
+"""
+Preallocated block pool for handing audio from the realtime callback to
+worker threads
+
+The callback acquires a free slot, fills it in place and commits it; a
+worker takes committed slots in order and releases them when done. Slot
+bookkeeping uses ``collections.deque`` append/popleft, which are atomic
+and never block, so the callback cannot be held up by a slow consumer:
+when no slot is free the block is dropped and counted as an overflow. The
+producer reports the frames it dropped with ``skip``; they are handed to
+the consumer with the next committed block (or ``skipped`` once the
+producer is done), so it can keep its output aligned by writing silence.
+"""
+import collections
+
+import numpy as np
+
+
+class BlockRing:
+    def __init__(self, slots, frames, channels, dtype=np.int32):
+        self.frames = frames
+        self.blocks = np.zeros((slots, frames, channels), dtype=dtype)
+        self.lengths = np.zeros(slots, dtype=np.int64)
+        # Frames dropped right before the block in each slot
+        self.leading = np.zeros(slots, dtype=np.int64)
+        self.skipped = 0
+        self.free = collections.deque(range(slots))
+        self.filled = collections.deque()
+        self.overflows = 0
+
+    @property
+    def depth(self):
+        """Number of committed blocks waiting for the consumer"""
+        return len(self.filled)
+
+    def acquire(self):
+        """Get a free slot index, or None (counted as overflow) if the consumer is behind"""
+        try:
+            return self.free.popleft()
+        except IndexError:
+            self.overflows += 1
+            return None
+
+    def skip(self, frames):
+        """Record ``frames`` dropped by the producer since its last commit"""
+        self.skipped += frames
+
+    def commit(self, slot, frames):
+        self.lengths[slot] = frames
+        self.leading[slot] = self.skipped
+        self.skipped = 0
+        self.filled.append(slot)
+
+    def get(self):
+        """
+        Oldest committed ``(slot, block, skipped)`` or None if nothing is
+        waiting; ``skipped`` frames were dropped right before the block
+        """
+        try:
+            slot = self.filled.popleft()
+        except IndexError:
+            return None
+        return slot, self.blocks[slot, :self.lengths[slot]], int(self.leading[slot])
+
+    def release(self, slot):
+        self.free.append(slot)
@@ -0,0 +1,212 @@
+"""
+Logging for the controller
+
+Nothing that logs ever writes to a file or stdout itself:
+
+- Ordinary threads use the standard ``logging`` API. ``setup_logging``
+  rate-limits repeated messages and routes every record through a
+  ``QueueHandler`` into a ``QueueListener`` thread, which does the
+  formatting and I/O.
+- The audio callback must not even allocate log records or take locks. It
+  writes fixed-size numeric records into a preallocated ``RealtimeLog``
+  ring (single producer, single consumer, no locks); a background thread
+  turns them into ordinary log records. When the ring is full, records
+  are counted as dropped instead of blocking.
+
+Records go to a size-rotated file in JSON lines (or plain text) and, in
+text form, to stdout.
+"""
+import collections
+import datetime
+import json
+import logging
+import logging.handlers
+import queue
+import threading
+import time
+
+import numpy as np
+
+
+RECORD_DTYPE = np.dtype([
+    ('time', 'f8'),
+    ('level', 'i2'),
+    ('message', 'i2'),
+    ('args', 'f8', (4,)),
+])
+
+# Attributes every LogRecord has; everything else was passed via ``extra``
+_STANDARD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime'}
+
+
+class RealtimeLog:
+    """Lock-free SPSC ring of fixed-size log records for the audio callback"""
+
+    def __init__(self, logger, capacity=1024, poll_interval=0.1):
+        self.logger = logger
+        self.records = np.zeros(capacity, dtype=RECORD_DTYPE)
+        self.capacity = capacity
+        self.poll_interval = poll_interval
+        self.messages = []
+        self.written = 0
+        self.read = 0
+        self.dropped = 0
+        self.reported_dropped = 0
+        self.thread = None
+        self.stop_event = threading.Event()
+
+    def message(self, template):
+        """Register a ``str.format`` template (positional numeric args) and return its id"""
+        self.messages.append(template)
+        return len(self.messages) - 1
+
+    def log(self, level, message_id, a=0.0, b=0.0, c=0.0, d=0.0):
+        """Producer side: never blocks, never allocates a LogRecord"""
+        if self.written - self.read >= self.capacity:
+            self.dropped += 1
+            return
+        index = self.written % self.capacity
+        self.records['time'][index] = time.time()
+        self.records['level'][index] = level
+        self.records['message'][index] = message_id
+        args = self.records['args'][index]
+        args[0] = a
+        args[1] = b
+        args[2] = c
+        args[3] = d
+        # Publish the slot only after it is complete
+        self.written += 1
+
+    def drain(self):
+        """Consumer side: hand pending records to the logger"""
+        while self.read < self.written:
+            record = self.records[self.read % self.capacity]
+            created, level, message_id = float(record['time']), int(record['level']), int(record['message'])
+            args = [int(value) if float(value).is_integer() else float(value) for value in record['args']]
+            self.read += 1
+
+            log_record = self.logger.makeRecord(
+                self.logger.name, level, '(audio callback)', 0,
+                self.messages[message_id].format(*args), None, None,
+                extra={'realtime': True},
+            )
+            log_record.created = created
+            log_record.msecs = (created % 1) * 1000
+            self.logger.handle(log_record)
+
+        if self.dropped != self.reported_dropped:
+            self.logger.warning("Realtime log ring full, %d records dropped", self.dropped - self.reported_dropped)
+            self.reported_dropped = self.dropped
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, name="rtlog", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread:
+            self.thread.join()
+        self.drain()
+
+    def _run(self):
+        while not self.stop_event.wait(self.poll_interval):
+            self.drain()
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Let an identical message through at most once per ``interval`` seconds;
+    the next one that passes reports how many were suppressed in between.
+
+    Messages are forgotten once their interval is over (or beyond
+    ``max_entries``), so distinct messages do not pile up in a long-running
+    controller; a suppressed count is lost if the message does not recur
+    before that.
+    """
+
+    def __init__(self, interval=60.0, max_entries=1024):
+        super().__init__()
+        self.interval = interval
+        self.max_entries = max_entries
+        # key -> (time it last passed, suppressed since), oldest first
+        self.seen = collections.OrderedDict()
+
+    def filter(self, record):
+        key = (record.name, record.levelno, record.getMessage())
+        now = record.created
+        last, suppressed = self.seen.get(key, (None, 0))
+        if last is not None and now - last < self.interval:
+            self.seen[key] = (last, suppressed + 1)
+            return False
+        self.seen.pop(key, None)
+        self._prune(now)
+        self.seen[key] = (now, 0)
+        if suppressed:
+            record.suppressed = suppressed
+        return True
+
+    def _prune(self, now):
+        while self.seen:
+            key, (last, _) = next(iter(self.seen.items()))
+            if now - last < self.interval and len(self.seen) < self.max_entries:
+                break
+            del self.seen[key]
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, including fields passed via ``extra``"""
+
+    def format(self, record):
+        entry = {
+            'time': datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'thread': record.threadName,
+            'message': record.getMessage(),
+        }
+        for name, value in vars(record).items():
+            if name not in _STANDARD_ATTRIBUTES and name not in entry:
+                entry[name] = value if isinstance(value, (int, float, bool, str, type(None))) else str(value)
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__('%(asctime)s %(levelname)-7s %(threadName)s: %(message)s')
+
+    def format(self, record):
+        text = super().format(record)
+        if getattr(record, 'suppressed', 0):
+            text += f" ({record.suppressed} similar messages suppressed)"
+        return text
+
+
+def setup_logging(path, json_format=True, max_bytes=10 * 1024**2, backup_count=5,
+                  rate_limit_interval=60.0, level=logging.INFO, console=True):
+    """
+    Route all logging through a background listener thread writing a rotated
+    file (and stdout); returns the started ``QueueListener``
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    file_handler = logging.handlers.RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backup_count)
+    file_handler.setFormatter(JsonFormatter() if json_format else TextFormatter())
+    handlers = [file_handler]
+    if console:
+        console_handler = logging.StreamHandler()
+        console_handler.setFormatter(TextFormatter())
+        handlers.append(console_handler)
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    # Filtered before enqueueing, once per record rather than once per handler
+    queue_handler.addFilter(RateLimitFilter(rate_limit_interval))
+    root = logging.getLogger()
+    root.handlers = [queue_handler]
+    root.setLevel(level)
+    logging.captureWarnings(True)
+
+    listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    return listener
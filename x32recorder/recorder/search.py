@@ -0,0 +1,197 @@
+"""
+Server-side search and statistics for the recording archive
+
+``filter_recordings`` turns the query parameters of the recordings list into
+database filters. Every filter maps onto an index of ``Recording`` (see its
+``Meta``); name prefixes are matched as a range on ``LOWER(name)`` so they
+can use the expression index, while substring matches scan the table.
+``archive_stats`` aggregates hours and bytes per month in the database.
+"""
+import datetime
+import math
+
+from django.db.models import Case, CharField, Count, Max, Min, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Lower
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .models import RecordingFile
+
+
+ORDERINGS = ('date', '-date', 'duration', '-duration', 'name', '-name', 'channel_count', '-channel_count')
+# Upper bound for a prefix range: sorts after every character that can follow the prefix
+PREFIX_END = '\U0010ffff'
+# SQLite integers are 64-bit; larger query values raise OverflowError
+MAX_INTEGER = 2**63 - 1
+
+
+class InvalidFilter(ValueError):
+    pass
+
+
+def _int(params, name):
+    try:
+        value = int(params[name])
+    except ValueError:
+        raise InvalidFilter(f"{name} must be an integer")
+    if abs(value) > MAX_INTEGER:
+        raise InvalidFilter(f"{name} is out of range")
+    return value
+
+
+def _seconds(params, name):
+    try:
+        seconds = float(params[name])
+    except ValueError:
+        raise InvalidFilter(f"{name} must be seconds")
+    # Durations are stored as microseconds
+    if not math.isfinite(seconds) or abs(seconds) * 1e6 > MAX_INTEGER:
+        raise InvalidFilter(f"{name} is out of range")
+    return datetime.timedelta(seconds=seconds)
+
+
+def _moment(params, name):
+    """``(datetime, whole_day)`` of a date or ISO datetime parameter"""
+    try:
+        moment = parse_datetime(params[name])
+        whole_day = moment is None
+        if whole_day:
+            day = parse_date(params[name])
+            moment = datetime.datetime.combine(day, datetime.time()) if day else None
+    except ValueError:
+        moment = None
+    if moment is None:
+        raise InvalidFilter(f"{name} must be a date (YYYY-MM-DD) or an ISO datetime")
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment, whole_day
+
+
+def filter_recordings(queryset, params):
+    """
+    Apply the archive filters in ``params`` (request query parameters):
+
+    - ``name``: substring, ``name_prefix``: prefix of the name, both case-insensitive
+    - ``date_from``, ``date_to``: dates or ISO datetimes, ``date_to`` inclusive
+    - ``template``: template id, ``state``: one or more states, e.g. ``3`` or ``0,1,2``
+    - ``min_duration``, ``max_duration``: seconds
+    - ``min_channels``, ``max_channels``: channel count
+    - ``ordering``: one of ``ORDERINGS``, newest first by default
+
+    Raises ``InvalidFilter`` for malformed values.
+    """
+    if params.get('name'):
+        queryset = queryset.filter(name__icontains=params['name'])
+    if params.get('name_prefix'):
+        prefix = params['name_prefix'].lower()
+        queryset = queryset.alias(name_lower=Lower('name')).filter(
+            name_lower__gte=prefix, name_lower__lt=prefix + PREFIX_END
+        )
+
+    if params.get('date_from'):
+        moment, _ = _moment(params, 'date_from')
+        queryset = queryset.filter(date__gte=moment)
+    if params.get('date_to'):
+        moment, whole_day = _moment(params, 'date_to')
+        if whole_day:
+            queryset = queryset.filter(date__lt=moment + datetime.timedelta(days=1))
+        else:
+            queryset = queryset.filter(date__lte=moment)
+
+    if params.get('template'):
+        queryset = queryset.filter(template=_int(params, 'template'))
+    if params.get('state'):
+        try:
+            states = [int(state) for state in params['state'].split(',')]
+        except ValueError:
+            raise InvalidFilter("state must be a comma-separated list of integers")
+        queryset = queryset.filter(state__in=states)
+
+    if params.get('min_duration'):
+        queryset = queryset.filter(duration__gte=_seconds(params, 'min_duration'))
+    if params.get('max_duration'):
+        queryset = queryset.filter(duration__lte=_seconds(params, 'max_duration'))
+    if params.get('min_channels'):
+        queryset = queryset.filter(channel_count__gte=_int(params, 'min_channels'))
+    if params.get('max_channels'):
+        queryset = queryset.filter(channel_count__lte=_int(params, 'max_channels'))
+
+    ordering = params.get('ordering') or '-date'
+    if ordering not in ORDERINGS:
+        raise InvalidFilter(f"ordering must be one of {', '.join(ORDERINGS)}")
+    # The id keeps pages stable when the ordering field has ties
+    return queryset.order_by(ordering, '-id' if ordering.startswith('-') else 'id')
+
+
+def _month_of(starts, labels):
+    """
+    ``CASE`` expression mapping ``date`` to the label of its month
+
+    ``starts`` are the local month starts; the cases split the list in
+    half at every level, so a row is compared about log2(months) times.
+    """
+    if len(labels) == 1:
+        return Value(labels[0])
+    middle = len(labels) // 2
+    return Case(
+        When(date__lt=starts[middle], then=_month_of(starts[:middle], labels[:middle])),
+        default=_month_of(starts[middle:], labels[middle:]),
+        output_field=CharField(),
+    )
+
+
+def _month_starts(first, last):
+    """Aware local month starts and their ``YYYY-MM`` labels from ``first`` to ``last``"""
+    month = timezone.localtime(first).date().replace(day=1)
+    last = timezone.localtime(last).date()
+    starts, labels = [], []
+    while month <= last:
+        starts.append(timezone.make_aware(datetime.datetime.combine(month, datetime.time())))
+        labels.append(month.strftime('%Y-%m'))
+        month = (month + datetime.timedelta(days=32)).replace(day=1)
+    return starts, labels
+
+
+def archive_stats(queryset):
+    """
+    Number of recordings, hours and bytes of the given recordings, in total
+    and per month of their date
+
+    Months are assigned with plain date comparisons (``_month_of``) rather
+    than ``TruncMonth``, which SQLite evaluates through a Python function
+    per row. File sizes are summed per recording in a subquery so a
+    recording's duration is not counted once per file.
+    """
+    queryset = queryset.order_by()
+    bounds = queryset.aggregate(first=Min('date'), last=Max('date'))
+    months = []
+    total = datetime.timedelta()
+    if bounds['first'] is not None:
+        starts, labels = _month_starts(bounds['first'], bounds['last'])
+        sizes = (
+            RecordingFile.objects.filter(recording=OuterRef('pk'))
+            .order_by()
+            .values('recording')
+            .annotate(size=Sum('size'))
+            .values('size')
+        )
+        rows = (
+            queryset.annotate(month=_month_of(starts, labels), size=Subquery(sizes))
+            .values('month')
+            .annotate(recordings=Count('id'), duration=Sum('duration'), bytes=Sum('size'))
+        )
+        for row in sorted(rows, key=lambda row: row['month']):
+            duration = row['duration'] or datetime.timedelta()
+            total += duration
+            months.append({
+                'month': row['month'],
+                'recordings': row['recordings'],
+                'hours': round(duration.total_seconds() / 3600, 3),
+                'bytes': row['bytes'] or 0,
+            })
+    return {
+        'recordings': sum(month['recordings'] for month in months),
+        'hours': round(total.total_seconds() / 3600, 3),
+        'bytes': sum(month['bytes'] for month in months),
+        'months': months,
+    }
@@ -1,10 +1,60 @@
 from rest_framework import serializers
-from .models import Recording, RecordingTemplate, RecordingTemplateChannel
+from .models import (
+    MIRROR,
+    PRIMARY,
+    Job,
+    MixerChannelName,
+    Recording,
+    RecordingFile,
+    RecordingGap,
+    RecordingNode,
+    RecordingTemplate,
+    RecordingTemplateChannel,
+)
+from .devices import validate_stream_settings
+
+
+class RecordingFileSerializer(serializers.ModelSerializer):
+    """Serializer for the indexed channel files of a recording"""
+
+    class Meta:
+        model = RecordingFile
+        fields = [
+            'channel_no',
+            'segment',
+            'filename',
+            'size',
+            'frames',
+            'duration',
+            'sample_rate',
+            'sample_width',
+            'format',
+            'silent',
+            'activity',
+            'loudness',
+            'true_peak',
+            'clip_count',
+            'dc_offset',
+            'blake2b',
+        ]
+        read_only_fields = fields
+
+
+class RecordingGapSerializer(serializers.ModelSerializer):
+    """Audio lost while the input device was gone"""
+
+    class Meta:
+        model = RecordingGap
+        fields = ['position', 'length', 'padded', 'reason']
+        read_only_fields = fields
 
 
 class RecordingSerializer(serializers.HyperlinkedModelSerializer):
     """Serializer for Recording model with all fields and hyperlinked URLs"""
-    channel_count = serializers.ReadOnlyField()  # Computed property for backward compatibility
+    channel_count = serializers.ReadOnlyField()  # Stored by Recording.save()
+    files = RecordingFileSerializer(many=True, read_only=True)
+    gaps = RecordingGapSerializer(many=True, read_only=True)
+    node = serializers.PrimaryKeyRelatedField(read_only=True)
     
     class Meta:
         model = Recording
@@ -17,9 +67,22 @@ class RecordingSerializer(serializers.HyperlinkedModelSerializer):
             'channels',
             'channel_count',
             'duration',
+            'sample_rate',
+            'block_size',
+            'latency',
             'state',
+            'files',
+            'gaps',
+            'playback_status',
+            'tier',
+            'node',
+            'storage_targets',
+            'indexed_target',
+        ]
+        read_only_fields = [
+            'id', 'date', 'channel_count', 'sample_rate', 'block_size', 'latency',
+            'playback_status', 'tier', 'node', 'storage_targets', 'indexed_target',
         ]
-        read_only_fields = ['id', 'date', 'channel_count']
 
 
 class RecordingTemplateChannelSerializer(serializers.HyperlinkedModelSerializer):
@@ -48,6 +111,127 @@ class RecordingTemplateSerializer(serializers.HyperlinkedModelSerializer):
             'id',
             'name',
             'channel_count',
+            'sample_rate',
+            'block_size',
+            'latency',
             'channels',
         ]
         read_only_fields = ['id']
+
+    def validate(self, attrs):
+        # Not tied to a device yet; checked against it when a recording is started
+        errors = validate_stream_settings(attrs.get('sample_rate'), attrs.get('block_size'), attrs.get('latency'))
+        if errors:
+            raise serializers.ValidationError(errors)
+        return attrs
+
+
+class MixerChannelNameSerializer(serializers.ModelSerializer):
+    """Serializer for the channel names cached from the mixer"""
+
+    class Meta:
+        model = MixerChannelName
+        fields = [
+            'channel_no',
+            'name',
+            'updated_at',
+        ]
+        read_only_fields = fields
+
+
+class JobSerializer(serializers.HyperlinkedModelSerializer):
+    """Serializer for background post-processing jobs"""
+
+    class Meta:
+        model = Job
+        fields = [
+            'url',
+            'id',
+            'kind',
+            'recording',
+            'params',
+            'priority',
+            'state',
+            'progress',
+            'message',
+            'created_at',
+            'started_at',
+            'finished_at',
+        ]
+        read_only_fields = fields
+
+
+class RecordingNodeSerializer(serializers.HyperlinkedModelSerializer):
+    """Serializer for capture agents; the token is never exposed"""
+
+    class Meta:
+        model = RecordingNode
+        fields = [
+            'url',
+            'id',
+            'name',
+            'last_seen',
+        ]
+        read_only_fields = fields
+
+
+class AgentRecordingFileSerializer(serializers.ModelSerializer):
+    """File metadata as reported by a capture agent"""
+
+    class Meta:
+        model = RecordingFile
+        fields = [
+            'channel_no',
+            'segment',
+            'filename',
+            'size',
+            'frames',
+            'duration',
+            'sample_rate',
+            'sample_width',
+            'format',
+            'data_offset',
+            'blake2b',
+        ]
+
+
+class AgentRecordingSerializer(serializers.ModelSerializer):
+    """
+    A recording as seen by a capture agent; the agent may only report
+    state changes, playback status and storage health
+    """
+    channel_names = serializers.SerializerMethodField()
+    files = AgentRecordingFileSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = Recording
+        fields = [
+            'uuid',
+            'state',
+            'channels',
+            'audiodevice_index',
+            'sample_rate',
+            'block_size',
+            'latency',
+            'started_at',
+            'playback_request',
+            'playback_status',
+            'storage_targets',
+            'indexed_target',
+            'channel_names',
+            'files',
+        ]
+        read_only_fields = ['uuid', 'channels', 'audiodevice_index', 'sample_rate', 'block_size', 'latency']
+
+    def get_channel_names(self, recording):
+        return recording.template_channel_names()
+
+    def validate_state(self, value):
+        if value not in (Recording.RECORD, Recording.STOP, Recording.STOPPED):
+            raise serializers.ValidationError("Agents can only report RECORD, STOP or STOPPED")
+        return value
+
+    def validate_indexed_target(self, value):
+        if value not in (PRIMARY, MIRROR):
+            raise serializers.ValidationError(f"Must be '{PRIMARY}' or '{MIRROR}'")
+        return value
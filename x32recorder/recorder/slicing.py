@@ -0,0 +1,83 @@
+"""
+Time-range slices of a recording as a single interleaved WAV
+
+The slice is assembled from byte offsets into the memory-mapped channel
+files. Samples are only rearranged (interleaved), never decoded, and only
+the requested range is read, so the cost depends on the slice length and
+not on the recording length.
+"""
+import numpy as np
+
+from .files import recording_file_path
+from .wavfile import wave_header
+
+
+CHUNK_FRAMES = 65536
+
+
+def parse_channel_selection(value):
+    """
+    Parse "3", "1-4" or "1,2,7" into a sorted list of 1-based channel
+    numbers; an empty value selects nothing. Raises ValueError for anything
+    else, including reversed ranges like "4-1".
+    """
+    channels = set()
+    for part in value.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        first, _, last = part.partition('-')
+        try:
+            first = int(first)
+            last = int(last) if last else first
+        except ValueError:
+            raise ValueError(f"invalid channel selection {part!r}")
+        if first < 1 or last < first:
+            raise ValueError(f"invalid channel range {part!r}")
+        channels.update(range(first, last + 1))
+    return sorted(channels)
+
+
+def map_recording_file(recording_file):
+    """Memory-map an indexed channel file's samples using only the index, no header parsing"""
+    if recording_file.frames == 0:
+        return np.zeros((0, recording_file.sample_width), dtype=np.uint8)
+    return np.memmap(
+        recording_file_path(recording_file), dtype=np.uint8, mode='r',
+        offset=recording_file.data_offset,
+        shape=(recording_file.frames, recording_file.sample_width),
+    )
+
+
+class RecordingSlice:
+    """Channels ``recording_files`` between ``start`` and ``end`` seconds"""
+
+    def __init__(self, recording_files, start, end):
+        self.recording_files = recording_files
+        self.sample_rate = recording_files[0].sample_rate
+        self.sample_width = recording_files[0].sample_width
+        length = min(f.frames for f in recording_files)
+
+        # Clamped before int(): a huge number of seconds overflows to inf frames
+        self.start_frame = max(0, int(min(start * self.sample_rate, length)))
+        self.end_frame = length if end is None else max(self.start_frame, int(min(end * self.sample_rate, length)))
+        self.frames = self.end_frame - self.start_frame
+
+    @property
+    def size(self):
+        return 44 + self.frames * len(self.recording_files) * self.sample_width
+
+    def header(self):
+        return wave_header(self.frames, len(self.recording_files), self.sample_width, self.sample_rate)
+
+    def chunks(self):
+        """Yield the WAV header followed by interleaved sample data"""
+        yield self.header()
+
+        sources = [map_recording_file(f) for f in self.recording_files]
+        interleaved = np.empty((CHUNK_FRAMES, len(sources), self.sample_width), dtype=np.uint8)
+        for position in range(self.start_frame, self.end_frame, CHUNK_FRAMES):
+            frames = min(CHUNK_FRAMES, self.end_frame - position)
+            for index, source in enumerate(sources):
+                interleaved[:frames, index] = source[position:position + frames]
+            yield interleaved[:frames].tobytes()
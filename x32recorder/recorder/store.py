@@ -0,0 +1,270 @@
+"""
+Where the controller reads commands from and reports state to
+
+- ``DatabaseStore`` uses the ORM directly; the controller shares the
+  database and the recording directory with the web app.
+- ``RemoteStore`` runs the controller as a capture agent on another
+  machine: commands and state go through the web app's agent API
+  (``/api/agent/``, authenticated with the token of a ``RecordingNode``),
+  the agent never opens the database, and its recordings stay on its own
+  disk, served to the web app by ``recorder.agent.AgentServer``.
+
+Both hand the main loop ``Recording`` instances; the remote ones are
+unsaved snapshots built from the API response.
+"""
+import datetime
+import json
+import logging
+import time
+import urllib.error
+import urllib.request
+import uuid as uuid_module
+
+from django.conf import settings
+from django.utils.dateparse import parse_datetime
+
+from .changes import bump_version
+from .files import describe_wave_file, index_recording_files, recording_directory, recording_file_path
+from .models import MixerChannelName, Recording, RecordingGap, RecordingMarker
+
+
+log = logging.getLogger(__name__)
+
+RETRY_INTERVAL = 1.0
+MAX_RETRY_INTERVAL = 30.0
+
+
+def create_triggered_recording(node=None):
+    """Create a NEW recording for an OSC start trigger"""
+    if settings.OSC_START_CHANNELS:
+        return Recording.objects.create(
+            channels=[channel - 1 for channel in settings.OSC_START_CHANNELS],
+            state=Recording.NEW,
+            node=node,
+        )
+
+    last = Recording.objects.filter(node=node).order_by('-date').first()
+    return Recording.objects.create(
+        channels=last.channels if last else [0, 1],
+        audiodevice_index=last.audiodevice_index if last else 0,
+        sample_rate=last.sample_rate if last else Recording.DEFAULT_SAMPLE_RATE,
+        block_size=last.block_size if last else Recording.DEFAULT_BLOCK_SIZE,
+        latency=last.latency if last else None,
+        template=last.template if last else None,
+        state=Recording.NEW,
+        node=node,
+    )
+
+
+def clear_applied_seek(recording_pk, playback_request):
+    """
+    Drop the seek from a playback request the controller has applied.
+    Only if the request is still the one it read: a seek or loop change
+    the API stored meanwhile is kept for the next poll.
+    """
+    cleared = {key: value for key, value in playback_request.items() if key != 'seek'}
+    if Recording.objects.filter(pk=recording_pk, playback_request=playback_request).update(playback_request=cleared):
+        bump_version()
+
+
+class DatabaseStore:
+    """The controller and the web app share the database"""
+
+    def active(self):
+        return Recording.get_active()
+
+    def update(self, recording, **fields):
+        for name, value in fields.items():
+            setattr(recording, name, value)
+        # Only the given fields, so concurrent API writes to others are kept
+        recording.save(update_fields=list(fields))
+
+    def channel_names(self, recording):
+        return recording.template_channel_names()
+
+    def seek_applied(self, recording, playback_request):
+        clear_applied_seek(recording.pk, playback_request)
+
+    def playback_files(self, recording):
+        """``(channel_no, path, sample_rate)`` of the first segment"""
+        return [
+            (f.channel_no, recording_file_path(f), f.sample_rate)
+            for f in recording.files.filter(segment=0)
+        ]
+
+    def recording_stopped(self, recording, channel_files, digests):
+        from .jobs import enqueue
+
+        index_recording_files(recording, channel_files, digests=digests)
+        enqueue('analyse_activity', recording)
+        enqueue('analyse_loudness', recording)
+        enqueue('build_archive', recording)
+        enqueue('apply_tiering', priority=-1)
+
+    def create_recording(self):
+        return create_triggered_recording()
+
+    def import_replica(self, info, channel_files, digests):
+        """Index a recording replicated to this standby (``ReplicationReceiver``)"""
+        started_at = parse_datetime(info['started_at']) if info.get('started_at') else None
+        recording, _ = Recording.objects.get_or_create(
+            uuid=info['uuid'],
+            defaults={
+                'channels': info['channels'],
+                'audiodevice_index': info['audiodevice_index'],
+                'sample_rate': info['sample_rate'],
+                'started_at': started_at,
+                'state': Recording.STOPPED,
+            },
+        )
+        self.recording_stopped(recording, channel_files, digests)
+        return recording
+
+    def add_marker(self, recording, seconds):
+        RecordingMarker.objects.create(recording=recording, timestamp=datetime.timedelta(seconds=seconds))
+
+    def add_gap(self, recording, position, length, padded, reason):
+        """Record audio lost while the input device was gone; positions in seconds"""
+        RecordingGap.objects.create(
+            recording=recording,
+            position=datetime.timedelta(seconds=position),
+            length=datetime.timedelta(seconds=length),
+            padded=padded,
+            reason=reason,
+        )
+
+    def save_channel_name(self, channel_no, name):
+        MixerChannelName.objects.update_or_create(channel_no=channel_no, defaults={'name': name})
+
+
+class RemoteStoreError(Exception):
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        # HTTP status of a rejected request, None if the web app was not reached
+        self.status = status
+
+
+class RemoteStore:
+    """The controller is a capture agent talking to the web app over HTTP"""
+
+    def __init__(self, server_url, token, timeout=None):
+        self.base_url = server_url.rstrip('/') + '/api/agent/'
+        self.token = token
+        self.timeout = timeout or settings.NODE_TIMEOUT
+        # Last API payload per recording, for channel names and files
+        self.snapshots = {}
+
+    def request(self, method, path, data=None):
+        body = json.dumps(data, default=str).encode() if data is not None else None
+        request = urllib.request.Request(
+            self.base_url + path,
+            data=body,
+            method=method,
+            headers={
+                'Authorization': f'Token {self.token}',
+                'Content-Type': 'application/json',
+                'Accept': 'application/json',
+            },
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                content = response.read()
+        except urllib.error.HTTPError as e:
+            raise RemoteStoreError(f"{method} {path}: HTTP {e.code} {e.read()[:200]!r}", e.code) from e
+        except (urllib.error.URLError, OSError) as e:
+            raise RemoteStoreError(f"{method} {path}: {e}") from e
+        return json.loads(content) if content else None
+
+    def request_with_retry(self, method, path, data=None):
+        """
+        State changes must not get lost: retry with backoff until the web app
+        accepts them. Capture runs on its own threads and is not held up.
+        """
+        interval = RETRY_INTERVAL
+        while True:
+            try:
+                return self.request(method, path, data)
+            except RemoteStoreError as e:
+                if e.status is not None and e.status < 500:
+                    raise
+                log.warning("Web app unreachable, retrying in %.0f s: %s", interval, e)
+                time.sleep(interval)
+                interval = min(interval * 2, MAX_RETRY_INTERVAL)
+
+    def _recording(self, payload):
+        if payload is None:
+            return None
+        self.snapshots = {payload['uuid']: payload}
+        recording = Recording(
+            uuid=uuid_module.UUID(payload['uuid']),
+            state=payload['state'],
+            channels=payload['channels'],
+            audiodevice_index=payload['audiodevice_index'],
+            sample_rate=payload['sample_rate'],
+            block_size=payload['block_size'],
+            latency=payload['latency'],
+            playback_request=payload['playback_request'],
+            indexed_target=payload['indexed_target'],
+        )
+        recording.started_at = parse_datetime(payload['started_at']) if payload['started_at'] else None
+        return recording
+
+    def active(self):
+        try:
+            return self._recording(self.request('GET', 'active/'))
+        except RemoteStoreError as e:
+            # Polled again shortly; a running recording is not affected
+            log.warning("Could not poll the web app: %s", e)
+            return None
+
+    def update(self, recording, **fields):
+        for name, value in fields.items():
+            setattr(recording, name, value)
+        self.request_with_retry('PATCH', f'recordings/{recording.uuid}/', fields)
+
+    def channel_names(self, recording):
+        payload = self.snapshots.get(str(recording.uuid), {})
+        return {int(channel_no): name for channel_no, name in payload.get('channel_names', {}).items()}
+
+    def seek_applied(self, recording, playback_request):
+        self.request_with_retry('POST', f'recordings/{recording.uuid}/seek-applied/', {
+            'playback_request': playback_request,
+        })
+
+    def playback_files(self, recording):
+        payload = self.snapshots.get(str(recording.uuid), {})
+        directory = recording_directory(recording)
+        return [
+            (f['channel_no'], directory / f['filename'], f['sample_rate'])
+            for f in payload.get('files', [])
+            if f['segment'] == 0
+        ]
+
+    def recording_stopped(self, recording, channel_files, digests):
+        files = []
+        for channel_no, path in channel_files:
+            fields = describe_wave_file(path, channel_no)
+            fields['blake2b'] = digests.get(path, '')
+            files.append(fields)
+        self.request_with_retry('POST', f'recordings/{recording.uuid}/files/', {'files': files})
+
+    def create_recording(self):
+        return self._recording(self.request_with_retry('POST', 'recordings/', {}))
+
+    def add_marker(self, recording, seconds):
+        self.request_with_retry('POST', f'recordings/{recording.uuid}/markers/', {'seconds': seconds})
+
+    def add_gap(self, recording, position, length, padded, reason):
+        self.request_with_retry('POST', f'recordings/{recording.uuid}/gaps/', {
+            'position': position, 'length': length, 'padded': padded, 'reason': reason,
+        })
+
+    def save_channel_name(self, channel_no, name):
+        self.request('POST', 'channel-names/', {'channel_no': channel_no, 'name': name})
+
+
+def get_store():
+    """The store configured for this controller"""
+    if settings.CONTROLLER_SERVER_URL:
+        return RemoteStore(settings.CONTROLLER_SERVER_URL, settings.CONTROLLER_NODE_TOKEN)
+    return DatabaseStore()
@@ -0,0 +1,202 @@
+"""
+Storage targets of a recording
+
+The channel files can be written to a primary directory and, with
+``MIRROR_RECORDING_PATH`` set, to a mirror at the same time. Every target
+has its own block ring and writer thread, so a slow or failing drive only
+costs that target: when its writer falls behind, its ring overflows and
+blocks are dropped for it alone (*degraded*); the writer fills them with
+silence so its files stay aligned in time. A write error stops its writer
+(*failed*). Capture and the other target carry on either way.
+"""
+import hashlib
+import logging
+import threading
+import time
+import wave
+from pathlib import Path
+
+import numpy as np
+
+from .models import DEGRADED, FAILED, OK, PRIMARY
+from .ringbuffer import BlockRing
+from .wavfile import int32_to_pcm24
+
+
+log = logging.getLogger(__name__)
+
+class WriterTarget:
+    """One directory receiving a complete set of channel files"""
+    # Whether the files end up on this machine and can be indexed
+    local = True
+
+    def __init__(self, role, root):
+        self.role = role
+        self.root = Path(root)
+        self.paths = []
+        self.wave_files = []
+        self.hashers = []
+        self.ring = None
+        self.thread = None
+        self.error = ''
+        self.capture_closed = False
+        self.bytes_written = {}
+        self.last_write = None
+        self.frames_written = 0
+        # (position, length) in frames of dropped blocks replaced by silence
+        self.overruns = []
+
+    @property
+    def state(self):
+        if self.error:
+            return FAILED
+        if self.ring is not None and self.ring.overflows:
+            return DEGRADED
+        return OK
+
+    @property
+    def writing(self):
+        """Whether the capture callback should still feed this target"""
+        return not self.error
+
+    @property
+    def dropped_blocks(self):
+        return self.ring.overflows if self.ring is not None else 0
+
+    def open(self, uuid, filenames, sample_rate):
+        directory = self.root / str(uuid)
+        try:
+            directory.mkdir(parents=True)
+            for filename in filenames:
+                path = directory / filename
+                wave_file = wave.open(str(path), 'wb')
+                wave_file.setnchannels(1)  # Mono file per channel
+                wave_file.setsampwidth(3)  # 24-bit = 3 bytes
+                wave_file.setframerate(sample_rate)
+                self.wave_files.append(wave_file)
+                self.paths.append(str(path))
+        except OSError as e:
+            self.fail(e)
+        self.hashers = [hashlib.blake2b() for _ in self.paths]
+
+    def start(self, slots, frames, channel_numbers, pin=None):
+        """Preallocate the ring and start the writer; ``pin`` runs first in the writer thread"""
+        self.ring = BlockRing(slots, frames, len(channel_numbers))
+        self.thread = threading.Thread(
+            target=self._run, args=(channel_numbers, pin), name=f"writer-{self.role}", daemon=True
+        )
+        self.thread.start()
+
+    def fail(self, error, close=True):
+        if self.error:
+            return
+        self.error = str(error) or type(error).__name__
+        log.error("Storage target %s (%s) failed: %s", self.role, self.root, self.error)
+        if close:
+            self._close_files()
+
+    def _close_files(self):
+        for wave_file in self.wave_files:
+            try:
+                wave_file.close()
+            except OSError:
+                pass
+        self.wave_files = []
+
+    def _run(self, channel_numbers, pin):
+        """Write buffered blocks to the wave files and hash them on the way"""
+        if pin:
+            pin()
+        silence = int32_to_pcm24(np.zeros((len(channel_numbers), self.ring.frames), dtype=np.int32))
+        while True:
+            item = self.ring.get()
+            if item is None:
+                if self.capture_closed or self.error:
+                    break
+                time.sleep(0.005)
+                continue
+
+            slot, block, skipped = item
+            frames = len(block)
+            # One contiguous row of packed 24-bit samples per channel
+            pcm = int32_to_pcm24(block.T)
+            self.ring.release(slot)
+            if self.error:
+                # Keep releasing slots until capture notices the failure
+                continue
+
+            self._pad(skipped, silence, channel_numbers)
+            self._write(pcm, frames, channel_numbers)
+
+        if not self.error:
+            # Blocks dropped after the last one that made it into the ring
+            self._pad(self.ring.skipped, silence, channel_numbers)
+        if not self.error:
+            try:
+                self.close()
+            except OSError as e:
+                self.fail(e)
+
+    def _pad(self, frames, silence, channel_numbers):
+        """Write ``frames`` of silence in place of dropped blocks"""
+        if not frames:
+            return
+        self.overruns.append((self.frames_written, frames))
+        for start in range(0, frames, self.ring.frames):
+            length = min(self.ring.frames, frames - start)
+            if not self._write(silence[:, :length * 3], length, channel_numbers):
+                return
+
+    def _write(self, pcm, frames, channel_numbers):
+        try:
+            self.write_block(pcm, frames)
+        except OSError as e:
+            self.fail(e)
+            return False
+        for idx, channel_no in enumerate(channel_numbers):
+            self.hashers[idx].update(pcm[idx])
+            self.bytes_written[channel_no] = self.bytes_written.get(channel_no, 0) + len(pcm[idx])
+        self.frames_written += frames
+        self.last_write = time.time()
+        return True
+
+    def write_block(self, pcm, frames):
+        for idx, wave_file in enumerate(self.wave_files):
+            wave_file.writeframesraw(pcm[idx])
+
+    def close(self):
+        # Writes the final frame counts into the headers
+        for wave_file in self.wave_files:
+            wave_file.close()
+
+    def finish(self, timeout):
+        """Let the writer drain its ring and close the files; a hung drive counts as failed"""
+        self.capture_closed = True
+        if self.thread is None:
+            return
+        self.thread.join(timeout)
+        if self.thread.is_alive():
+            # Closing the files could hang as well; leave them to the writer thread
+            self.fail(f"writer did not finish within {timeout:g} s", close=False)
+
+    def digests(self):
+        return {path: hasher.hexdigest() for path, hasher in zip(self.paths, self.hashers)}
+
+    def health(self):
+        return {
+            'role': self.role,
+            'path': str(self.root),
+            'state': self.state,
+            'dropped_blocks': self.dropped_blocks,
+            'bytes_written': sum(self.bytes_written.values()),
+            'error': self.error,
+        }
+
+
+def best_target(targets):
+    """The target whose files should be indexed: the primary unless a mirror fared better"""
+    ranked = sorted(
+        (target for target in targets if target.local),
+        key=lambda target: (target.state == FAILED, target.dropped_blocks, target.role != PRIMARY),
+    )
+    return ranked[0]
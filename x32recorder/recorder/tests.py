@@ -1,3 +1,506 @@
-from django.test import TestCase
+import queue
+import shutil
+import socket
+import struct
+import tempfile
+import datetime
+import time
+import uuid
+import wave
+from pathlib import Path
 
-# Create your tests here.
+import numpy as np
+from django.test import LiveServerTestCase, SimpleTestCase
+
+from .models import PRIMARY, MixerChannelName, Recording, RecordingNode
+from .osc import OscControlServer, decode_packet, encode_message
+from .playback import MultiChannelPlayer
+from .replication import (
+    HELLO, STOP, ReplicationReceiver, ReplicationTarget, encode_message as encode_replication_message, read_message,
+)
+from .store import RemoteStore, RemoteStoreError
+from .targets import WriterTarget
+from .wavfile import int32_to_pcm24
+
+
+def write_channel_file(path, samples, sample_rate):
+    """Write int32 samples holding 24-bit values as a mono 24-bit WAV file"""
+    with wave.open(str(path), 'wb') as wave_file:
+        wave_file.setnchannels(1)
+        wave_file.setsampwidth(3)
+        wave_file.setframerate(sample_rate)
+        wave_file.writeframesraw(int32_to_pcm24(np.asarray(samples, dtype=np.int32)[None, :])[0].tobytes())
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("condition not met in time")
+        time.sleep(0.001)
+
+
+def free_port(kind=socket.SOCK_DGRAM):
+    with socket.socket(socket.AF_INET, kind) as probe:
+        probe.bind(('127.0.0.1', 0))
+        return probe.getsockname()[1]
+
+
+class TempDirMixin:
+    def setUp(self):
+        super().setUp()
+        self.directory = Path(tempfile.mkdtemp(prefix="x32recorder-test-"))
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+
+
+class ManualOutputStream:
+    """Output stream whose callback only runs when the test pulls a block"""
+
+    def __init__(self, channels, callback, **kwargs):
+        self.channels = channels
+        self.callback = callback
+        self.active = False
+
+    def start(self):
+        self.active = True
+
+    def stop(self):
+        self.active = False
+
+    def close(self):
+        pass
+
+    def pull(self, frames):
+        outdata = np.full((frames, self.channels), np.nan, dtype=np.float32)
+        self.callback(outdata, frames, None, None)
+        return outdata
+
+
+class MultiChannelPlayerTests(TempDirMixin, SimpleTestCase):
+    sample_rate = 8000
+
+    def make_player(self, channels, **kwargs):
+        """``channels`` maps output channels to int32 sample arrays"""
+        channel_files = []
+        for output_channel, samples in channels.items():
+            path = self.directory / f"ch{output_channel + 1:02d}.wav"
+            write_channel_file(path, samples, self.sample_rate)
+            channel_files.append((output_channel, path))
+        streams = []
+
+        def stream_factory(**stream_kwargs):
+            streams.append(ManualOutputStream(**stream_kwargs))
+            return streams[-1]
+
+        player = MultiChannelPlayer(channel_files, self.sample_rate, stream_factory=stream_factory, **kwargs)
+        player.start()
+        self.addCleanup(player.stop)
+        return player, streams[0]
+
+    @staticmethod
+    def expected(samples):
+        return (np.asarray(samples) / float(2**23)).astype(np.float32)
+
+    def test_plays_files_on_their_output_channels(self):
+        first = np.arange(4000) * 1000
+        second = -np.arange(3000) * 500
+        player, stream = self.make_player({0: first, 2: second}, prefetch_frames=512)
+        wait_for(lambda: player.end_of_data)
+
+        output = np.concatenate([stream.pull(256) for _ in range(16)])
+        self.assertEqual(output.shape, (4096, 3))
+        np.testing.assert_array_equal(output[:4000, 0], self.expected(first))
+        np.testing.assert_array_equal(output[:3000, 2], self.expected(second))
+        np.testing.assert_array_equal(output[3000:4000, 2], 0)
+        np.testing.assert_array_equal(output[:, 1], 0)
+        # The end of the data pads with silence and finishes, it is no underrun
+        np.testing.assert_array_equal(output[4000:], 0)
+        self.assertTrue(player.finished)
+        self.assertEqual(player.underruns, 0)
+
+    def test_seek_discards_what_is_buffered(self):
+        samples = np.arange(16000) * 100
+        player, stream = self.make_player({0: samples}, prefetch_frames=512)
+        wait_for(lambda: player.write_pos >= 2048)
+        stream.pull(256)
+
+        player.seek(1.5)
+        wait_for(lambda: player.seek_request is None and player.write_pos - player.discard_until >= 512)
+        output = stream.pull(512)
+        np.testing.assert_array_equal(output[:, 0], self.expected(samples[12000:12512]))
+        self.assertEqual(player.underruns, 0)
+        self.assertAlmostEqual(player.position, 12512 / self.sample_rate, delta=player.prefetch_frames / self.sample_rate)
+
+    def test_loop_wraps_to_the_start(self):
+        samples = np.arange(1000) * 1000
+        player, stream = self.make_player({0: samples}, prefetch_frames=256, loop=True)
+
+        output = []
+        for _ in range(10):
+            wait_for(lambda: player.write_pos - player.read_pos >= 256)
+            output.append(stream.pull(256))
+        output = np.concatenate(output)[:, 0]
+        np.testing.assert_array_equal(output, self.expected(np.tile(samples, 3)[:2560]))
+        self.assertFalse(player.finished)
+        self.assertEqual(player.underruns, 0)
+
+    def test_underrun_is_counted_and_filled_with_silence(self):
+        samples = np.full(16000, 1000)
+        # The ring holds 800 frames, a callback asking for more always runs dry
+        player, stream = self.make_player({0: samples}, ring_seconds=0.1, prefetch_frames=100)
+        wait_for(lambda: player.write_pos - player.read_pos >= 700)
+
+        output = stream.pull(1000)[:, 0]
+        self.assertEqual(player.underruns, 1)
+        self.assertFalse(player.finished)
+        buffered = int(np.count_nonzero(output))
+        self.assertGreaterEqual(buffered, 700)
+        np.testing.assert_array_equal(output[:buffered], self.expected(samples[:buffered]))
+        np.testing.assert_array_equal(output[buffered:], 0)
+
+
+class OscParserTests(SimpleTestCase):
+    def test_message_round_trip(self):
+        args = [42, -7, 0.5, 'Lead Vox', b'\x01\x02\x03', True, False]
+        self.assertEqual(decode_packet(encode_message('/ch/01/config/name', *args)), [('/ch/01/config/name', args)])
+
+    def test_arguments_are_aligned_to_four_bytes(self):
+        packet = encode_message('/abc', 'abcd', b'\x01')
+        self.assertEqual(len(packet) % 4, 0)
+        self.assertEqual(decode_packet(packet), [('/abc', ['abcd', b'\x01'])])
+
+    def test_message_without_type_tags(self):
+        self.assertEqual(decode_packet(b'/xremote\0\0\0\0'), [('/xremote', [])])
+
+    def test_bundle_yields_its_messages_in_order(self):
+        elements = [encode_message('/x32recorder/marker'), encode_message('/ch/02/config/name', 'Kick')]
+        bundle = b'#bundle\0' + struct.pack('>Q', 1)
+        for element in elements:
+            bundle += struct.pack('>i', len(element)) + element
+        self.assertEqual(decode_packet(bundle), [('/x32recorder/marker', []), ('/ch/02/config/name', ['Kick'])])
+
+    def test_deeply_nested_bundles_are_rejected(self):
+        packet = encode_message('/x32recorder/marker')
+        for _ in range(1000):
+            packet = b'#bundle\0' + struct.pack('>Qi', 1, len(packet)) + packet
+        with self.assertRaises(ValueError):
+            decode_packet(packet)
+
+    def test_unsupported_type_tag(self):
+        with self.assertRaises(ValueError):
+            decode_packet(b'/a\0\0,d\0\0' + struct.pack('>d', 1.0))
+
+    def test_unsupported_argument(self):
+        with self.assertRaises(TypeError):
+            encode_message('/a', [1])
+
+
+class OscControlServerTests(SimpleTestCase):
+    def setUp(self):
+        self.commands = queue.Queue()
+        self.saved_names = []
+        self.server = OscControlServer(
+            self.commands, host='127.0.0.1', port=free_port(), mixer_host='',
+            save_channel_name=lambda channel_no, name: self.saved_names.append((channel_no, name)),
+        )
+        self.server.start()
+        self.addCleanup(self.server.socket.close)
+        self.addCleanup(self.server.stop)
+        self.client = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.addCleanup(self.client.close)
+
+    def send(self, packet):
+        self.client.sendto(packet, ('127.0.0.1', self.server.port))
+
+    def test_button_press_queues_the_action(self):
+        self.send(encode_message('/x32recorder/start', 1))
+        action, received_at = self.commands.get(timeout=2)
+        self.assertEqual(action, 'start')
+        self.assertLessEqual(received_at, time.monotonic())
+
+    def test_button_release_and_unknown_addresses_are_ignored(self):
+        self.send(encode_message('/x32recorder/stop', 0))
+        self.send(encode_message('/x32recorder/unknown', 1))
+        self.send(encode_message('/x32recorder/marker'))
+        self.assertEqual(self.commands.get(timeout=2)[0], 'marker')
+        self.assertTrue(self.commands.empty())
+
+    def test_malformed_packet_does_not_stop_the_server(self):
+        with self.assertLogs('recorder.osc', 'WARNING') as logs:
+            self.send(b'/x32recorder/start\0\0,q\0\0')
+            self.send(b'#bundle\0' + struct.pack('>Qi', 1, 64) + b'/x')
+            self.send(encode_message('/x32recorder/stop'))
+            self.assertEqual(self.commands.get(timeout=2)[0], 'stop')
+        self.assertEqual(len(logs.records), 2)
+        self.assertTrue(self.commands.empty())
+
+    def test_channel_names_are_saved_once_per_change(self):
+        for name in ('Kick', 'Kick', 'Kick In'):
+            self.send(encode_message('/ch/01/config/name', name))
+        self.send(encode_message('/ch/xx/config/name', 'Snare'))
+        self.send(encode_message('/x32recorder/marker'))
+        self.commands.get(timeout=2)
+        self.assertEqual(self.saved_names, [(1, 'Kick'), (1, 'Kick In')])
+        self.assertEqual(self.server.channel_names, {1: 'Kick In'})
+
+
+class ReplicationTests(TempDirMixin, SimpleTestCase):
+    token = 'secret'
+    sample_rate = 48000
+    frames = 256
+    channel_numbers = [1, 2, 5]
+
+    def setUp(self):
+        super().setUp()
+        self.closed = []
+        self.takeovers = []
+
+    def start_receiver(self, takeover_seconds=5.0):
+        self.receiver = ReplicationReceiver(
+            '127.0.0.1', 0, self.token, self.directory / 'standby',
+            on_closed=self.closed.append, on_takeover=self.takeovers.append, takeover_seconds=takeover_seconds,
+        )
+        self.receiver.start()
+        self.addCleanup(self.receiver.stop)
+        return self.receiver.listener.getsockname()[1]
+
+    def start_targets(self, port):
+        """A local primary and a replica of the same recording, fed like the capture callback feeds them"""
+        recording_uuid = uuid.uuid4()
+        filenames = [f"ch{channel_no:02d}.wav" for channel_no in self.channel_numbers]
+        primary = WriterTarget(PRIMARY, self.directory / 'primary')
+        replica = ReplicationTarget(
+            f"127.0.0.1:{port}", self.token, {'channels': self.channel_numbers, 'audiodevice_index': 0},
+            backlog_seconds=10, timeout=5,
+        )
+        for target in (primary, replica):
+            target.open(recording_uuid, filenames, self.sample_rate)
+            target.start(16, self.frames, self.channel_numbers)
+        self.rng = np.random.default_rng(0)
+        return primary, replica
+
+    def feed(self, targets, blocks):
+        for _ in range(blocks):
+            block = self.rng.integers(-2**23, 2**23, size=(self.frames, len(self.channel_numbers)), dtype=np.int32)
+            for target in targets:
+                wait_for(lambda: target.ring.free)
+                slot = target.ring.acquire()
+                target.ring.blocks[slot, :self.frames] = block
+                target.ring.commit(slot, self.frames)
+
+    def assertSameFiles(self, primary, session):
+        self.assertEqual([Path(path).name for path in primary.paths], [path.name for path in session.paths])
+        for primary_path, standby_path in zip(primary.paths, session.paths):
+            self.assertEqual(Path(primary_path).read_bytes(), standby_path.read_bytes())
+
+    def test_standby_files_are_byte_identical(self):
+        with self.assertLogs('recorder.replication', 'INFO') as logs:
+            primary, replica = self.start_targets(self.start_receiver())
+            self.feed([primary, replica], 40)
+            for target in (primary, replica):
+                target.finish(5)
+            # The standby confirms before it hands the copy on
+            wait_for(lambda: self.closed)
+
+        self.assertEqual([record.levelname for record in logs.records], ['INFO', 'INFO'])
+        self.assertIs(replica.verified, True)
+        self.assertEqual(replica.state, 'ok')
+        self.assertEqual(len(self.closed), 1)
+        session = self.closed[0]
+        self.assertTrue(session.verified)
+        self.assertEqual(session.frames, 40 * self.frames)
+        self.assertEqual(session.channel_files()[2][0], 5)
+        self.assertSameFiles(primary, session)
+        self.assertEqual(self.takeovers, [])
+
+    def test_blocks_sent_while_disconnected_are_backfilled(self):
+        with self.assertLogs('recorder.replication', 'INFO') as logs:
+            primary, replica = self.start_targets(self.start_receiver())
+            self.feed([primary, replica], 20)
+            wait_for(lambda: self.receiver.session is not None and self.receiver.session.last_seq == 19)
+
+            self.receiver.connection.shutdown(socket.SHUT_RDWR)
+            wait_for(lambda: self.receiver.connection is None)
+            self.feed([primary, replica], 20)
+            for target in (primary, replica):
+                target.finish(5)
+            wait_for(lambda: self.closed)
+
+        # At least the block that went into the closed connection is sent again
+        self.assertTrue(any("Backfilling" in message for message in logs.output))
+        self.assertIs(replica.verified, True)
+        self.assertEqual(replica.dropped_blocks, 0)
+        self.assertEqual(len(self.closed), 1)
+        session = self.closed[0]
+        self.assertEqual(session.padded_frames, 0)
+        self.assertSameFiles(primary, session)
+        self.assertEqual(self.takeovers, [])
+
+    def test_standby_takes_over_when_the_primary_is_lost(self):
+        primary, replica = self.start_targets(self.start_receiver(takeover_seconds=0.3))
+        self.feed([primary, replica], 10)
+        wait_for(lambda: self.receiver.session is not None and self.receiver.session.last_seq == 9)
+
+        # The primary dies in the middle of the recording
+        with self.assertLogs('recorder', 'WARNING') as logs:
+            replica.fail("primary gone")
+            replica.finish(5)
+            wait_for(lambda: self.takeovers)
+        self.assertTrue(any("Primary lost during recording" in message for message in logs.output))
+
+        session = self.takeovers[0]
+        self.assertEqual(self.closed, [session])
+        self.assertTrue(session.closed)
+        self.assertFalse(session.verified)
+        for path in session.paths:
+            with wave.open(str(path), 'rb') as wave_file:
+                self.assertEqual(wave_file.getnframes(), 10 * self.frames)
+
+    def test_malformed_hello_is_rejected(self):
+        port = self.start_receiver()
+        hello = {
+            'token': self.token, 'uuid': str(uuid.uuid4()), 'filenames': ['../ch01.wav'],
+            'channel_numbers': [1], 'sample_rate': self.sample_rate,
+        }
+        with self.assertLogs('recorder.replication', 'WARNING'):
+            with socket.create_connection(('127.0.0.1', port), timeout=5) as sock:
+                sock.sendall(encode_replication_message(HELLO, hello))
+                # Closed without a RESUME
+                self.assertEqual(sock.recv(1), b'')
+        self.assertIsNone(self.receiver.session)
+        self.assertFalse((self.directory / 'standby').exists())
+
+    def test_oversized_hello_is_rejected_before_reading_it(self):
+        port = self.start_receiver()
+        with self.assertLogs('recorder.replication', 'WARNING') as logs:
+            with socket.create_connection(('127.0.0.1', port), timeout=5) as sock:
+                sock.sendall(struct.pack('!BI', HELLO, 2**31))
+                self.assertEqual(sock.recv(1), b'')
+            # Logged once the connection is closed
+            wait_for(lambda: logs.records)
+        self.assertIn("exceeds", logs.output[0])
+        self.assertIsNone(self.receiver.session)
+
+    def test_malformed_stop_ends_the_connection(self):
+        port = self.start_receiver()
+        hello = {
+            'token': self.token, 'uuid': str(uuid.uuid4()), 'filenames': ['ch01.wav'],
+            'channel_numbers': [1], 'sample_rate': self.sample_rate,
+        }
+        with self.assertLogs('recorder.replication', 'INFO') as logs:
+            with socket.create_connection(('127.0.0.1', port), timeout=5) as sock:
+                sock.sendall(encode_replication_message(HELLO, hello))
+                self.assertEqual(read_message(sock.makefile('rb'))[1], b'{"last_seq": -1}')
+                sock.sendall(encode_replication_message(STOP, [1]))
+                self.assertEqual(sock.recv(1), b'')
+            wait_for(lambda: len(logs.records) == 2)
+        self.assertIn("malformed STOP", logs.output[-1])
+        self.assertFalse(self.receiver.session.closed)
+        self.assertEqual(self.closed, [])
+
+
+class RemoteStoreTests(TempDirMixin, LiveServerTestCase):
+    """A capture agent's store talking to the agent API of a live web app"""
+
+    def setUp(self):
+        super().setUp()
+        self.node = RecordingNode.objects.create(name="stage", agent_url="http://127.0.0.1:9035", token="stage-token")
+        self.store = RemoteStore(self.live_server_url, self.node.token, timeout=5)
+
+    def test_create_and_poll_recording(self):
+        self.assertIsNone(self.store.active())
+
+        recording = self.store.create_recording()
+        row = Recording.objects.get(uuid=recording.uuid)
+        self.assertEqual(row.node, self.node)
+        self.assertEqual(row.state, Recording.NEW)
+
+        active = self.store.active()
+        self.assertEqual(active.uuid, recording.uuid)
+        self.assertEqual(active.channels, row.channels)
+        self.assertEqual(active.sample_rate, row.sample_rate)
+        self.assertIsNotNone(RecordingNode.objects.get(pk=self.node.pk).last_seen)
+
+        # Only one active recording per node
+        with self.assertRaises(RemoteStoreError) as raised:
+            self.store.create_recording()
+        self.assertEqual(raised.exception.status, 400)
+
+    def test_reports_reach_the_database(self):
+        recording = self.store.create_recording()
+        started_at = datetime.datetime(2026, 1, 1, 20, 0, tzinfo=datetime.timezone.utc)
+        self.store.update(recording, state=Recording.RECORD, started_at=started_at)
+        self.store.add_marker(recording, 12.5)
+        self.store.add_gap(recording, 3.0, 0.5, True, "writer overrun")
+        self.store.save_channel_name(4, "Vocals")
+
+        row = Recording.objects.get(uuid=recording.uuid)
+        self.assertEqual(row.state, Recording.RECORD)
+        self.assertEqual(row.started_at, started_at)
+        self.assertEqual(
+            list(row.markers.values_list('timestamp', flat=True)), [datetime.timedelta(seconds=12.5)]
+        )
+        gap = row.gaps.get()
+        self.assertEqual(gap.position, datetime.timedelta(seconds=3))
+        self.assertEqual(gap.length, datetime.timedelta(seconds=0.5))
+        self.assertTrue(gap.padded)
+        self.assertEqual(gap.reason, "writer overrun")
+        self.assertEqual(MixerChannelName.objects.get(channel_no=4).name, "Vocals")
+
+    def test_seek_applied_keeps_newer_requests(self):
+        recording = self.store.create_recording()
+        playback_request = {'seek': 10.0, 'loop': False}
+        Recording.objects.filter(uuid=recording.uuid).update(playback_request=playback_request)
+
+        self.store.seek_applied(recording, playback_request)
+        self.assertEqual(Recording.objects.get(uuid=recording.uuid).playback_request, {'loop': False})
+
+        # A seek stored after the agent read the request stays for the next poll
+        Recording.objects.filter(uuid=recording.uuid).update(playback_request={'seek': 20.0})
+        self.store.seek_applied(recording, {'seek': 10.0})
+        self.assertEqual(Recording.objects.get(uuid=recording.uuid).playback_request, {'seek': 20.0})
+
+    def test_recording_stopped_indexes_the_agent_files(self):
+        recording = self.store.create_recording()
+        sample_rate = 8000
+        channel_files = []
+        for channel_no in (1, 2):
+            path = self.directory / f"ch{channel_no:02d}.wav"
+            write_channel_file(path, np.arange(sample_rate * 2) * 100, sample_rate)
+            channel_files.append((channel_no, path))
+        digests = {channel_files[0][1]: 'ab' * 32}
+
+        self.store.recording_stopped(recording, channel_files, digests)
+
+        row = Recording.objects.get(uuid=recording.uuid)
+        self.assertEqual(row.duration, datetime.timedelta(seconds=2))
+        files = {f.channel_no: f for f in row.files.all()}
+        self.assertEqual(sorted(files), [1, 2])
+        self.assertEqual(files[1].filename, "ch01.wav")
+        self.assertEqual(files[1].frames, sample_rate * 2)
+        self.assertEqual(files[1].sample_width, 3)
+        self.assertEqual(files[1].blake2b, 'ab' * 32)
+        self.assertEqual(files[2].blake2b, '')
+
+        # The next poll lists the files for playback on the agent
+        self.store.active()
+        playback_files = self.store.playback_files(recording)
+        self.assertEqual(sorted(name.name for _, name, _ in playback_files), ["ch01.wav", "ch02.wav"])
+        self.assertEqual({rate for _, _, rate in playback_files}, {sample_rate})
+
+    def test_wrong_token_is_rejected(self):
+        store = RemoteStore(self.live_server_url, "not-a-token", timeout=5)
+        with self.assertRaises(RemoteStoreError) as raised:
+            store.create_recording()
+        self.assertIn(raised.exception.status, (401, 403))
+        self.assertFalse(Recording.objects.exists())
+
+    def test_agent_only_sees_its_own_recordings(self):
+        other = RecordingNode.objects.create(name="foyer", agent_url="http://127.0.0.1:9036", token="foyer-token")
+        recording = Recording.objects.create(channels=[0, 1], node=other)
+
+        self.assertIsNone(self.store.active())
+        with self.assertRaises(RemoteStoreError) as raised:
+            self.store.update(recording, state=Recording.RECORD)
+        self.assertEqual(raised.exception.status, 404)
+        self.assertEqual(Recording.objects.get(pk=recording.pk).state, Recording.NEW)
@@ -0,0 +1,107 @@
+"""
+Retention and storage tiering
+
+Stopped recordings older than ``TIERING_MAX_AGE_DAYS``, and beyond that the
+oldest ones while the hot tier exceeds ``TIERING_HOT_QUOTA`` bytes, are moved
+gzip-compressed from ``RECORDING_PATH`` to ``ARCHIVE_PATH``. Reads go
+through ``recording_file_path``, which rehydrates archived files on demand.
+"""
+import datetime
+import gzip
+import os
+import shutil
+
+from django.conf import settings
+from django.db.models import Sum
+from django.utils import timezone
+
+from .archive_cache import discard_archives
+from .changes import bump_version
+from .files import archive_directory, archived_file_path, recording_directory, regions_directory
+from .models import Job, Recording, RecordingFile
+
+
+COMPRESSLEVEL = 6
+
+
+def hot_usage():
+    """Bytes of indexed channel files in the local hot tier"""
+    return RecordingFile.objects.filter(recording__tier=Recording.HOT, recording__node=None).aggregate(total=Sum('size'))['total'] or 0
+
+
+def tiering_candidates(now=None):
+    """Recordings due for archiving, oldest first; files on capture agents are not tiered"""
+    now = now or timezone.now()
+    busy = Job.objects.filter(state__in=[Job.QUEUED, Job.RUNNING], recording__isnull=False).values('recording')
+    hot = list(
+        Recording.objects.filter(state=Recording.STOPPED, tier=Recording.HOT, node=None, files__isnull=False)
+        .exclude(pk__in=busy)
+        .annotate(total_size=Sum('files__size'))
+        .order_by('date')
+    )
+
+    selected = []
+    if settings.TIERING_MAX_AGE_DAYS is not None:
+        cutoff = now - datetime.timedelta(days=settings.TIERING_MAX_AGE_DAYS)
+        selected = [recording for recording in hot if recording.date < cutoff]
+
+    if settings.TIERING_HOT_QUOTA is not None:
+        usage = hot_usage() - sum(recording.total_size for recording in selected)
+        for recording in hot:
+            if usage <= settings.TIERING_HOT_QUOTA:
+                break
+            if recording not in selected:
+                selected.append(recording)
+                usage -= recording.total_size
+
+    return selected
+
+
+def archive_recording(recording, progress=None):
+    """Compress the files of a recording into the archive tier and remove them from the hot tier"""
+    recording_files = list(recording.files.all())
+    source_directory = recording_directory(recording)
+    archive_directory(recording).mkdir(parents=True, exist_ok=True)
+
+    for index, recording_file in enumerate(recording_files):
+        target = archived_file_path(recording_file)
+        tmp_path = target.with_name(f".{target.name}.tmp")
+        try:
+            with open(source_directory / recording_file.filename, 'rb') as source, \
+                    gzip.open(tmp_path, 'wb', compresslevel=COMPRESSLEVEL) as compressed:
+                shutil.copyfileobj(source, compressed, 1024 * 1024)
+            os.replace(tmp_path, target)
+        finally:
+            tmp_path.unlink(missing_ok=True)
+        if progress:
+            progress((index + 1) / len(recording_files), f"{recording.uuid}: {recording_file.filename}")
+
+    # Switch readers over before the hot copies disappear
+    Recording.objects.filter(pk=recording.pk).update(tier=Recording.ARCHIVED)
+    bump_version()
+    recording.tier = Recording.ARCHIVED
+
+    for recording_file in recording_files:
+        (source_directory / recording_file.filename).unlink(missing_ok=True)
+    exported_regions = source_directory / 'regions'
+    if exported_regions.is_dir():
+        # Earlier region exports move along, later ones are written there directly
+        shutil.move(exported_regions, regions_directory(recording))
+    try:
+        source_directory.rmdir()
+    except OSError:
+        # Other files stay where they are
+        pass
+    discard_archives(recording)
+
+
+def apply_tiering(dry_run=False, progress=None):
+    """Archive all due recordings and return them"""
+    candidates = tiering_candidates()
+    if not dry_run:
+        for index, recording in enumerate(candidates):
+            def recording_progress(fraction, message=None, index=index):
+                if progress:
+                    progress((index + fraction) / len(candidates), message)
+            archive_recording(recording, progress=recording_progress)
+    return candidates
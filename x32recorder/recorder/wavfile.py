@@ -0,0 +1,132 @@
+"""
+Helpers for the per-channel WAV files written by the controller
+
+NumPy is imported by the sample conversion helpers only, so the header
+helpers stay cheap to import for the web app.
+"""
+import struct
+from collections import namedtuple
+
+
+WaveInfo = namedtuple(
+    "WaveInfo",
+    ["channels", "sample_width", "sample_rate", "frames", "data_offset", "data_size", "file_size"],
+)
+
+
+def read_wave_info(path):
+    """Parse the RIFF header of a PCM WAV file without reading the sample data"""
+    with open(path, 'rb') as f:
+        file_size = f.seek(0, 2)
+        f.seek(0)
+
+        riff, _, wave_id = struct.unpack('<4sI4s', f.read(12))
+        if riff != b'RIFF' or wave_id != b'WAVE':
+            raise ValueError(f"{path} is not a RIFF/WAVE file")
+
+        fmt = None
+        while True:
+            header = f.read(8)
+            if len(header) < 8:
+                raise ValueError(f"{path} has no data chunk")
+            chunk_id, chunk_size = struct.unpack('<4sI', header)
+
+            if chunk_id == b'fmt ':
+                fmt = struct.unpack('<HHIIHH', f.read(16))
+                f.seek(chunk_size - 16 + (chunk_size & 1), 1)
+            elif chunk_id == b'data':
+                if fmt is None:
+                    raise ValueError(f"{path} has a data chunk before the fmt chunk")
+                data_offset = f.tell()
+                break
+            else:
+                f.seek(chunk_size + (chunk_size & 1), 1)
+
+    _, channels, sample_rate, _, block_align, bits = fmt
+    # A recording that was interrupted may carry a stale (or still zero)
+    # size in its header, so fall back to what is actually on disk.
+    data_size = file_size - data_offset
+    if 0 < chunk_size < data_size:
+        data_size = chunk_size
+    frames = data_size // block_align
+
+    return WaveInfo(
+        channels=channels,
+        sample_width=bits // 8,
+        sample_rate=sample_rate,
+        frames=frames,
+        data_offset=data_offset,
+        data_size=frames * block_align,
+        file_size=file_size,
+    )
+
+
+def pcm24_to_int32(raw):
+    """Convert packed little-endian 24-bit samples (n x 3 bytes) to int32"""
+    import numpy as np
+
+    raw = np.asarray(raw, dtype=np.uint8).reshape(-1, 3)
+    padded = np.zeros((raw.shape[0], 4), dtype=np.uint8)
+    padded[:, 1:] = raw
+    # The sample now sits in the upper 24 bits; the arithmetic shift sign-extends it
+    return padded.view('<i4').reshape(-1) >> 8
+
+
+def map_wave_data(path, info=None):
+    """Memory-map the sample data of a mono 24-bit WAV file as an (frames, 3) uint8 array"""
+    import numpy as np
+
+    info = info or read_wave_info(path)
+    if info.frames == 0:
+        return np.zeros((0, info.sample_width * info.channels), dtype=np.uint8)
+    return np.memmap(
+        path, dtype=np.uint8, mode='r', offset=info.data_offset,
+        shape=(info.frames, info.sample_width * info.channels),
+    )
+
+
+def map_wave_samples(path, info=None):
+    """
+    Memory-map a mono 24-bit WAV file as int32 samples scaled by 256
+
+    Element n is the 4 bytes ending with sample n: the sample sits in the
+    upper 24 bits and the low byte belongs to the previous sample (or the
+    header). Masking the low byte (``& -256``) or shifting (``>> 8``) decodes
+    a chunk without the copy ``pcm24_to_int32`` makes.
+    """
+    import numpy as np
+
+    info = info or read_wave_info(path)
+    if info.frames == 0:
+        return np.zeros(0, dtype='<i4')
+    data = np.memmap(
+        path, dtype=np.uint8, mode='r', offset=info.data_offset - 1,
+        shape=(info.frames * info.sample_width + 1,),
+    )
+    return np.ndarray((info.frames,), dtype='<i4', buffer=data, strides=(info.sample_width,))
+
+
+def wave_header(frames, channels=1, sample_width=3, sample_rate=48000):
+    """Canonical 44 byte PCM WAV header for the given amount of sample data"""
+    block_align = channels * sample_width
+    data_size = frames * block_align
+    return struct.pack(
+        '<4sI4s4sIHHIIHH4sI',
+        b'RIFF', 36 + data_size, b'WAVE',
+        b'fmt ', 16, 1, channels, sample_rate, sample_rate * block_align, block_align, sample_width * 8,
+        b'data', data_size,
+    )
+
+
+def int32_to_pcm24(samples):
+    """
+    Pack int32 samples holding 24-bit values into little-endian 24-bit PCM
+
+    Works on the last axis: an ``(channels, frames)`` array becomes
+    ``(channels, frames * 3)`` uint8, one contiguous row per channel.
+    """
+    import numpy as np
+
+    samples = np.ascontiguousarray(samples, dtype='<i4')
+    packed = samples.view(np.uint8).reshape(samples.shape + (4,))[..., :3]
+    return np.ascontiguousarray(packed).reshape(samples.shape[:-1] + (-1,))
@@ -13,4 +13,9 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'x32recorder.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# WebSocket listen-in stream (/ws/listen/<channel_no>/), everything else goes to Django
+from recorder.listen import ListenWebSocketApp
+
+application = ListenWebSocketApp(django_application)
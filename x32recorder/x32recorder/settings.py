@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.1/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -72,6 +73,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "recorder.middleware.MetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "whitenoise.middleware.WhiteNoiseMiddleware",
     "corsheaders.middleware.CorsMiddleware",
@@ -82,6 +84,11 @@ MIDDLEWARE = [
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
 
+# Server-Timing headers (db, serialize, render, total) on every response
+SERVER_TIMING = os.environ.get("X32RECORDER_SERVER_TIMING", "") == "1"
+if SERVER_TIMING:
+    MIDDLEWARE.insert(0, "recorder.middleware.ServerTimingMiddleware")
+
 ROOT_URLCONF = "x32recorder.urls"
 
 TEMPLATES = [
@@ -109,7 +116,7 @@ WSGI_APPLICATION = "x32recorder.wsgi.application"
 DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
-        "NAME": BASE_DIR / "db.sqlite3",
+        "NAME": os.environ.get("X32RECORDER_DB", BASE_DIR / "db.sqlite3"),
     }
 }
 
@@ -159,7 +166,6 @@ STATICFILES_DIRS = [
 ]
 
 # Use ManifestStaticFilesStorage in production, fallback to default in development
-import os
 if os.path.exists(BASE_DIR / "staticfiles"):
     STATICFILES_STORAGE = "whitenoise.storage.CompressedManifestStaticFilesStorage"
 else:
@@ -190,5 +196,117 @@ REST_FRAMEWORK = {
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
-RECORDING_PATH = "recordings/"
+RECORDING_PATH = os.environ.get("X32RECORDER_RECORDING_PATH", "recordings/")
+
+# Second directory (another drive) receiving a copy of every channel file while recording; empty to disable
+MIRROR_RECORDING_PATH = os.environ.get("X32RECORDER_MIRROR_PATH", "") or None
+
+# Audio backend for the API and the controller: "sounddevice" or "fake" (test tones, no hardware)
+AUDIO_BACKEND = os.environ.get("X32RECORDER_AUDIO_BACKEND", "sounddevice")
+# /api/audiodevice/ serves the cached devices for this long before probing again (?refresh=1 forces it)
+AUDIO_DEVICE_CACHE_SECONDS = int(os.environ.get("X32RECORDER_AUDIO_DEVICE_CACHE_SECONDS", 300))
+
+# Prebuilt download archives, evicted least recently used beyond the budget (bytes)
+ARCHIVE_CACHE_PATH = os.environ.get("X32RECORDER_ARCHIVE_CACHE_PATH", "archive-cache/")
+ARCHIVE_CACHE_BUDGET = int(os.environ.get("X32RECORDER_ARCHIVE_CACHE_BUDGET", 20 * 1024**3))
+
+# Storage tiering: stopped recordings older than TIERING_MAX_AGE_DAYS, or the
+# oldest ones while the hot tier exceeds TIERING_HOT_QUOTA bytes, are moved
+# gzip-compressed to ARCHIVE_PATH (None disables the respective rule).
+# Archived files are decompressed on demand into REHYDRATE_CACHE_PATH.
+ARCHIVE_PATH = os.environ.get("X32RECORDER_ARCHIVE_PATH", "archive/")
+TIERING_MAX_AGE_DAYS = 30
+TIERING_HOT_QUOTA = None
+REHYDRATE_CACHE_PATH = os.environ.get("X32RECORDER_REHYDRATE_CACHE_PATH", "rehydrate-cache/")
+REHYDRATE_CACHE_BUDGET = int(os.environ.get("X32RECORDER_REHYDRATE_CACHE_BUDGET", 20 * 1024**3))
+
+# Prometheus metrics: the web app serves /metrics, the controller its own
+# endpoint on localhost (X32RECORDER_CONTROLLER_METRICS_PORT=0 disables it)
+CONTROLLER_METRICS_HOST = "127.0.0.1"
+CONTROLLER_METRICS_PORT = int(os.environ.get("X32RECORDER_CONTROLLER_METRICS_PORT", 9034)) or None
+
+# Logs and on-demand profiles (kill -USR2 <controller pid>)
+LOG_DIR = Path(os.environ.get("X32RECORDER_LOG_DIR", BASE_DIR.parent / "logs"))
+# Controller log: rotated, JSON lines ("json") or plain text ("text");
+# identical messages are logged at most once per LOG_RATE_LIMIT_SECONDS
+CONTROLLER_LOG_FILE = LOG_DIR / "controller.jsonl"
+LOG_FORMAT = os.environ.get("X32RECORDER_LOG_FORMAT", "json")
+LOG_MAX_BYTES = 10 * 1024**2
+LOG_BACKUP_COUNT = 5
+LOG_RATE_LIMIT_SECONDS = 60
+PROFILE_SECONDS = 10
+PROFILE_INTERVAL = 0.005
+
+# Capture agent mode: with CONTROLLER_SERVER_URL set (the web app's base URL),
+# the controller does not open the database but polls the web app's agent
+# API with the token of its node (manage.py add_node), keeps its recordings
+# on its own disk and serves them to the web app from AGENT_HOST:AGENT_PORT
+CONTROLLER_SERVER_URL = os.environ.get("X32RECORDER_SERVER_URL", "")
+CONTROLLER_NODE_TOKEN = os.environ.get("X32RECORDER_NODE_TOKEN", "")
+AGENT_HOST = os.environ.get("X32RECORDER_AGENT_HOST", "0.0.0.0")
+AGENT_PORT = int(os.environ.get("X32RECORDER_AGENT_PORT", 9035))
+NODE_TIMEOUT = 10  # seconds, for requests between the web app and agents
+
+# Replication to a standby recorder (recorder.replication): the primary
+# streams every captured block to REPLICATION_TARGET ("host:port"), a
+# standby controller listens on REPLICATION_LISTEN and writes the same files.
+# Both need the same REPLICATION_TOKEN. With REPLICATION_TAKEOVER the standby
+# starts recording itself when the primary is lost in the middle of a recording.
+REPLICATION_TARGET = os.environ.get("X32RECORDER_REPLICATE_TO", "")
+REPLICATION_LISTEN = os.environ.get("X32RECORDER_REPLICATION_LISTEN", "")
+REPLICATION_TOKEN = os.environ.get("X32RECORDER_REPLICATION_TOKEN", "")
+REPLICATION_TAKEOVER = os.environ.get("X32RECORDER_REPLICATION_TAKEOVER", "") == "1"
+REPLICATION_BACKLOG_SECONDS = 10  # kept for backfill after a dropped connection
+REPLICATION_TAKEOVER_SECONDS = 5
+REPLICATION_TIMEOUT = 5  # seconds, connecting and confirming the end of a recording
+
+# Created by the controller once it is ready to record; manage_services.py waits for it
+CONTROLLER_READY_FILE = Path(os.environ.get("X32RECORDER_READY_FILE", BASE_DIR.parent / "pids" / "controller.ready"))
+
+# Realtime hardening for the controller (opt-in): pins the capture and
+# writer threads to CPUs, requests SCHED_FIFO for the capture thread, locks
+# the capture buffers in RAM and pauses the cyclic GC while recording
+REALTIME_HARDENED = os.environ.get("X32RECORDER_HARDENED", "") == "1"
+REALTIME_CAPTURE_CPUS = None  # e.g. [2]
+REALTIME_WRITER_CPUS = None  # e.g. [3]
+REALTIME_PRIORITY = 70
+
+# Activity analysis: a window is silent when its peak stays below the threshold
+SILENCE_THRESHOLD_DB = -60
+SILENCE_WINDOW_SECONDS = 0.5
+SILENCE_HOLD_SECONDS = 2.0  # gaps shorter than this do not split a region
+
+# Loudness analysis: channel files measured in parallel (None for one per CPU)
+LOUDNESS_WORKERS = None
+
+# Listen-in stream: the controller publishes tapped channels as UDP datagrams
+# on LISTEN_PORT, the ASGI app sends channel subscriptions to LISTEN_CONTROL_PORT
+LISTEN_ENABLED = os.environ.get("X32RECORDER_LISTEN", "1") == "1"
+LISTEN_HOST = "127.0.0.1"
+LISTEN_PORT = int(os.environ.get("X32RECORDER_LISTEN_PORT", 9032))
+LISTEN_CONTROL_PORT = int(os.environ.get("X32RECORDER_LISTEN_CONTROL_PORT", 9033))
+LISTEN_DECIMATION = 2  # 48 kHz capture -> 24 kHz monitoring stream
+LISTEN_BUFFER_MS = 100  # audio buffered by the tap and per listener before the oldest block is dropped
+
+# OSC control: the controller listens on OSC_PORT for record triggers and,
+# if OSC_MIXER_HOST is set, subscribes to the X32 to cache its channel names
+OSC_ENABLED = os.environ.get("X32RECORDER_OSC", "1") == "1"
+OSC_HOST = "0.0.0.0"
+OSC_PORT = int(os.environ.get("X32RECORDER_OSC_PORT", 10024))
+OSC_MIXER_HOST = os.environ.get("X32RECORDER_MIXER_HOST", "")
+OSC_MIXER_PORT = 10023
+OSC_MIXER_CHANNELS = 32
+OSC_NAME_REFRESH_INTERVAL = 60
+
+# OSC address -> controller action ("start", "stop" or "marker"). Add the
+# address your console sends for a user button to trigger it from the desk.
+OSC_ACTIONS = {
+    "/x32recorder/start": "start",
+    "/x32recorder/stop": "stop",
+    "/x32recorder/marker": "marker",
+}
+
+# Channels (1-based) for recordings started over OSC; None reuses the
+# channels, template and device of the most recent recording
+OSC_START_CHANNELS = None
 
@@ -17,11 +17,13 @@ from django.contrib import admin
 from django.urls import include, path, re_path
 from django.conf import settings
 from django.views.static import serve
+from recorder.metrics import metrics_view
 from .views import FrontendView
 
 urlpatterns = [
     path('api/', include('recorder.api_urls')),
     path('admin/', admin.site.urls),
+    path('metrics', metrics_view, name='metrics'),
 ]
 
 # Serve frontend assets directly from frontend_build
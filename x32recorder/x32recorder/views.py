@@ -1,19 +1,38 @@
 from django.views.generic import View
 from django.http import HttpResponse
 from django.conf import settings
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
 import os
+import threading
 
 
 class FrontendView(View):
     """
     Serves the compiled frontend single page application
     """
+    # (path, mtime_ns, size, content) of the last index.html read, shared by all requests
+    _cache = None
+    _cache_lock = threading.Lock()
+
+    @classmethod
+    def load_index(cls, frontend_path):
+        """Return ``(content, stat)``, rereading the file only when it changed on disk"""
+        stat = os.stat(frontend_path)
+        cached = cls._cache
+        if cached and cached[:3] == (frontend_path, stat.st_mtime_ns, stat.st_size):
+            return cached[3], stat
+        with open(frontend_path, 'rb') as f:
+            content = f.read()
+        with cls._cache_lock:
+            cls._cache = (frontend_path, stat.st_mtime_ns, stat.st_size, content)
+        return content, stat
+
     def get(self, request, *args, **kwargs):
         try:
             # Try to serve from the built frontend
             frontend_path = os.path.join(settings.BASE_DIR, 'frontend_build', 'index.html')
-            with open(frontend_path) as f:
-                return HttpResponse(f.read(), content_type='text/html')
+            content, stat = self.load_index(frontend_path)
         except FileNotFoundError:
             return HttpResponse(
                 """
@@ -31,3 +50,14 @@ class FrontendView(View):
                 content_type='text/html',
                 status=503
             )
+
+        etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+        last_modified = int(stat.st_mtime)
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = HttpResponse(content, content_type='text/html')
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        # The shell references hashed assets; revalidate it so a rebuild shows up immediately
+        patch_cache_control(response, no_cache=True)
+        return response